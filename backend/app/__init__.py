@@ -1,10 +1,34 @@
 from flask import Flask, send_from_directory
 from flask_cors import CORS
+from sqlalchemy import text
 from .models.models import db
+from .utils.serialization import OrjsonProvider, orjson
+from .utils.db_routing import init_db_routing, use_primary
 from dotenv import load_dotenv
 import os
 
 
+def _engine_options(db_uri):
+    """Pool settings for an engine, from DB_POOL_* and DB_STATEMENT_TIMEOUT"""
+    options = {
+        'pool_pre_ping': os.environ.get('DB_POOL_PRE_PING', 'true').lower() == 'true',
+        'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', 1800)),  # Seconds; drop connections before server-side idle timeouts do
+    }
+    if db_uri.startswith('sqlite') and (':memory:' in db_uri or db_uri.rstrip('/') == 'sqlite:'):
+        # In-memory SQLite uses a single static connection, so there's no pool to size
+        return options
+    if os.environ.get('DB_POOL_SIZE'):
+        options['pool_size'] = int(os.environ['DB_POOL_SIZE'])
+    if os.environ.get('DB_MAX_OVERFLOW'):
+        options['max_overflow'] = int(os.environ['DB_MAX_OVERFLOW'])
+    options['pool_timeout'] = int(os.environ.get('DB_POOL_TIMEOUT', 30))
+
+    statement_timeout = int(os.environ.get('DB_STATEMENT_TIMEOUT', 0))  # Milliseconds, 0 for none
+    if statement_timeout and db_uri.startswith('postgres'):
+        options['connect_args'] = {'options': f'-c statement_timeout={statement_timeout}'}
+    return options
+
+
 def create_app():
     # Load variables from backend/.env
     load_dotenv()
@@ -25,6 +49,15 @@ def create_app():
     app.config['SQLALCHEMY_DATABASE_URI'] = db_uri
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
+    # Connection pools (gunicorn.conf.py sizes DB_POOL_SIZE from each worker's threads)
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = _engine_options(db_uri)
+
+    # Optional read replica: eligible GET requests read from it (see utils/db_routing.py)
+    replica_uri = os.environ.get('DATABASE_REPLICA_URL')
+    if replica_uri:
+        app.config['SQLALCHEMY_BINDS'] = {'replica': {'url': replica_uri, **_engine_options(replica_uri)}}
+    app.config['REPLICA_STICKY_SECONDS'] = float(os.environ.get('REPLICA_STICKY_SECONDS', 10))  # Reads stay on the primary this long after a write
+
     # Optional Google OAuth
     app.config['GOOGLE_CLIENT_ID'] = os.environ.get('GOOGLE_CLIENT_ID')
     app.config['GOOGLE_CLIENT_SECRET'] = os.environ.get('GOOGLE_CLIENT_SECRET')
@@ -34,6 +67,39 @@ def create_app():
     app.config['SESSION_COOKIE_HTTPONLY'] = True
     app.config['SESSION_COOKIE_SECURE'] = False  # True in production with HTTPS
 
+    # Content-addressed profile image store
+    app.config['IMAGE_STORE_PATH'] = os.environ.get('IMAGE_STORE_PATH', os.path.join(app.root_path, '../uploads/images'))
+    app.config['THUMBNAIL_SIZE'] = int(os.environ.get('THUMBNAIL_SIZE', 128))
+
+    # Background AI feedback jobs
+    app.config['FEEDBACK_ASYNC'] = os.environ.get('FEEDBACK_ASYNC', 'true').lower() == 'true'
+    app.config['FEEDBACK_WORKER_AUTOSTART'] = os.environ.get('FEEDBACK_WORKER_AUTOSTART', 'true').lower() == 'true'
+    app.config['FEEDBACK_WORKERS'] = int(os.environ.get('FEEDBACK_WORKERS', 4))
+    app.config['FEEDBACK_POLL_INTERVAL'] = float(os.environ.get('FEEDBACK_POLL_INTERVAL', 5))
+    app.config['FEEDBACK_JOB_TIMEOUT'] = int(os.environ.get('FEEDBACK_JOB_TIMEOUT', 600))  # Seconds before a running job is considered dead
+    app.config['FEEDBACK_MAX_ATTEMPTS'] = int(os.environ.get('FEEDBACK_MAX_ATTEMPTS', 3))
+
+    # Streaming feedback over SSE (needs FEEDBACK_ASYNC). Students see the text as it is
+    # generated when the teacher has enabled display_feedback for their submission.
+    app.config['FEEDBACK_STREAMING'] = os.environ.get('FEEDBACK_STREAMING', 'false').lower() == 'true'
+    app.config['FEEDBACK_STREAM_GRACE'] = int(os.environ.get('FEEDBACK_STREAM_GRACE', 15))  # Seconds before the worker takes over a job nobody streamed
+    app.config['FEEDBACK_STREAM_WAIT'] = int(os.environ.get('FEEDBACK_STREAM_WAIT', 30))  # Seconds a stream waits on another worker's job before the client is told to poll
+
+    # Draft autosave: changes are coalesced in memory and flushed every interval or once this many labels wait
+    app.config['DRAFT_FLUSH_INTERVAL'] = float(os.environ.get('DRAFT_FLUSH_INTERVAL', 2))
+    app.config['DRAFT_FLUSH_SIZE'] = int(os.environ.get('DRAFT_FLUSH_SIZE', 500))
+    app.config['DRAFT_MAX_CHARS'] = int(os.environ.get('DRAFT_MAX_CHARS', 20000))  # Per label
+
+    # Bulk feedback regeneration
+    app.config['BULK_FEEDBACK_WORKERS'] = int(os.environ.get('BULK_FEEDBACK_WORKERS', 8))
+    app.config['BULK_FEEDBACK_RATE'] = float(os.environ.get('BULK_FEEDBACK_RATE', 5))  # Gemini calls per second, per process
+    app.config['BULK_FEEDBACK_COMMIT_EVERY'] = int(os.environ.get('BULK_FEEDBACK_COMMIT_EVERY', 25))
+
+    # Faster JSON responses when orjson is installed
+    app.config['JSON_PROVIDER'] = os.environ.get('JSON_PROVIDER', 'orjson')
+    if app.config['JSON_PROVIDER'] == 'orjson' and orjson is not None:
+        app.json = OrjsonProvider(app)
+
     # ----- CORS -----
     CORS(
         app,
@@ -49,28 +115,53 @@ def create_app():
         ],
         allow_headers=['Content-Type', 'Authorization'],
         expose_headers=['Set-Cookie'],
-        methods=['GET', 'POST', 'PUT', 'DELETE', 'OPTIONS'],
+        methods=['GET', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'],
     )
 
     # Init DB
     db.init_app(app)
+    if replica_uri:
+        init_db_routing(app)
 
-    # Health Check Route
+    # Health Check Route (also the readiness probe used by start_app.py)
     @app.route('/api/health')
+    @use_primary
     def health():
+        try:
+            db.session.execute(text('SELECT 1'))
+        except Exception as e:
+            print(f'[HEALTH] Database check failed: {str(e)}')
+            return {'status': 'error', 'message': 'Database unavailable'}, 503
         return {'status': 'ok', 'message': 'RJMS API and Frontend running'}
 
     # Blueprints
-    from .routes import auth, courses, students, teacher, reflections
+    from .routes import auth, courses, students, teacher, reflections, images
     app.register_blueprint(auth.bp)
     app.register_blueprint(courses.bp)
     app.register_blueprint(students.bp)
     app.register_blueprint(teacher.bp)
     app.register_blueprint(reflections.bp)
+    app.register_blueprint(images.bp)
+
+    # Maintenance commands
+    from .commands import register_commands, ensure_reflection_stats
+    from .migrations import run_migrations
+    register_commands(app)
 
     # Create tables
     with app.app_context():
         db.create_all()
+        run_migrations()
+        ensure_reflection_stats()
+
+    # Buffer for draft autosaves
+    from .services.drafts import init_draft_buffer
+    init_draft_buffer(app)
+
+    # Start draining the feedback queue
+    if app.config['FEEDBACK_ASYNC'] and app.config['FEEDBACK_WORKER_AUTOSTART']:
+        from .services.feedback_jobs import init_feedback_worker
+        init_feedback_worker(app)
 
     # ----- Serve Built Vue Frontend -----
     @app.route('/', defaults={'path': ''})
@@ -0,0 +1,33 @@
+import click
+from .models.models import db, ReflectionStats, ReflectionSubmission
+from .services.submission_stats import rebuild_reflection_stats
+from .migrations import MIGRATIONS, get_applied_versions, run_migrations
+
+
+def register_commands(app):
+    """Attach maintenance commands to `flask`"""
+
+    @app.cli.command('rebuild-reflection-stats')
+    @click.option('--course-id', type=int, default=None, help='Only rebuild counters for this course')
+    def rebuild_reflection_stats_command(course_id):
+        """Rebuild per-reflection submission counters from reflection_submissions"""
+        written = rebuild_reflection_stats(course_id)
+        click.echo(f'Rebuilt counters for {written} reflections')
+
+    @app.cli.command('migrate')
+    def migrate_command():
+        """Apply pending schema migrations and list their status"""
+        run_migrations()
+        applied = get_applied_versions()
+        for version, description, _ in sorted(MIGRATIONS, key=lambda m: m[0]):
+            status = 'applied' if version in applied else 'pending'
+            click.echo(f'{version:>4}  {status:<8} {description}')
+
+
+def ensure_reflection_stats():
+    """Backfill counters the first time the app starts against existing submissions"""
+    if db.session.query(ReflectionStats.reflection_id).first() is None and \
+            db.session.query(ReflectionSubmission.id).first() is not None:
+        written = rebuild_reflection_stats()
+        print(f"[STATS] Backfilled submission counters for {written} reflections")
+    db.session.commit()
@@ -0,0 +1,312 @@
+from datetime import datetime
+from sqlalchemy import select, update, func, text, inspect
+from .models.models import (
+    db, SchemaMigration, User, Course, Enrollment, Reflection, ReflectionStructure, ReflectionSubmission,
+    FeedbackJob, SubmissionLabelFeedback, SubmissionDraft
+)
+from .utils.db_utils import insert_ignore
+
+# (version, description, function) in the order they were added. Never renumber or edit
+# a migration that has shipped; add a new one instead.
+MIGRATIONS = []
+
+# Arbitrary key for the Postgres advisory lock that serializes concurrent startups
+MIGRATION_LOCK_KEY = 72810461
+
+
+def migration(version, description):
+    """Register a schema migration. The function receives a connection inside a transaction."""
+    def register(fn):
+        MIGRATIONS.append((version, description, fn))
+        return fn
+    return register
+
+
+def _indexes(model, *names):
+    return [index for index in model.__table__.indexes if index.name in names]
+
+
+@migration(1, 'Composite indexes on hot foreign keys')
+def add_hot_foreign_key_indexes(conn):
+    # Declared on the models so fresh databases get them from create_all();
+    # checkfirst makes this a no-op there
+    indexes = (
+        _indexes(Course, 'ix_courses_teacher_id_status') +
+        _indexes(Enrollment, 'ix_enrollments_course_id_student_id') +
+        _indexes(Reflection, 'ix_reflections_course_id_start_date', 'ix_reflections_course_id_due_date') +
+        _indexes(ReflectionSubmission, 'ix_reflection_submissions_student_id_reflection_id')
+    )
+    for index in indexes:
+        index.create(bind=conn, checkfirst=True)
+
+
+def _add_column(conn, model, column_name):
+    """ALTER TABLE ... ADD COLUMN for a column declared on the model, if it's missing"""
+    table = model.__table__
+    existing = {column['name'] for column in inspect(conn).get_columns(table.name)}
+    if column_name in existing:
+        return
+    column = table.c[column_name]
+    column_type = column.type.compile(dialect=conn.dialect)
+    conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+
+
+@migration(2, 'Add users.profile_image_url')
+def add_profile_image_url(conn):
+    _add_column(conn, User, 'profile_image_url')
+
+
+@migration(3, 'Move inline profile images to the image store')
+def move_profile_images(conn):
+    from .services.image_store import save_data_url
+
+    users = User.__table__
+    # External picture URLs are small; keep them as-is in the new column
+    conn.execute(
+        update(users).where(
+            users.c.profile_image.isnot(None),
+            users.c.profile_image_url.is_(None),
+            ~users.c.profile_image.like('data:%'),
+            func.length(users.c.profile_image) <= 512
+        ).values(profile_image_url=users.c.profile_image, profile_image=None)
+    )
+
+    last_id = 0
+    moved = 0
+    while True:
+        # Small batches: each row can hold megabytes of base64
+        rows = conn.execute(
+            select(users.c.id, users.c.profile_image).where(
+                users.c.id > last_id,
+                users.c.profile_image.like('data:image/%')
+            ).order_by(users.c.id).limit(50)
+        ).all()
+        if not rows:
+            break
+        for row in rows:
+            last_id = row.id
+            try:
+                url = save_data_url(row.profile_image)
+            except ValueError as e:
+                print(f"[MIGRATE] Skipping profile image of user {row.id}: {str(e)}")
+                continue
+            conn.execute(
+                update(users).where(users.c.id == row.id).values(profile_image_url=url, profile_image=None)
+            )
+            moved += 1
+    print(f"[MIGRATE] Moved {moved} profile images to the image store")
+
+
+@migration(4, 'Add courses.lazy_reflections')
+def add_lazy_reflections(conn):
+    _add_column(conn, Course, 'lazy_reflections')
+
+
+# (index, table, column) for the columns list endpoints search with lower(column) LIKE '%term%'
+SEARCH_INDEXES = [
+    ('ix_courses_name_trgm', 'courses', 'name'),
+    ('ix_courses_course_code_trgm', 'courses', 'course_code'),
+    ('ix_users_name_trgm', 'users', 'name'),
+    ('ix_users_email_trgm', 'users', 'email'),
+    ('ix_reflections_name_trgm', 'reflections', 'name')
+]
+
+
+@migration(5, 'Trigram indexes for list search')
+def add_search_indexes(conn):
+    # Substring matches can't use a btree index; SQLite just scans
+    if conn.dialect.name != 'postgresql':
+        return
+    try:
+        with conn.begin_nested():
+            conn.execute(text('CREATE EXTENSION IF NOT EXISTS pg_trgm'))
+    except Exception as e:
+        print(f"[MIGRATE] pg_trgm is unavailable, list search will scan: {str(e)}")
+        return
+    for name, table, column in SEARCH_INDEXES:
+        conn.execute(text(f'CREATE INDEX IF NOT EXISTS {name} ON {table} USING gin (lower({column}) gin_trgm_ops)'))
+
+
+@migration(6, 'Full-text search index over submissions')
+def add_submission_search(conn):
+    from .services.submission_search import SEARCH_CONFIG, FTS_TABLE
+
+    if conn.dialect.name == 'postgresql':
+        # A generated column stays in sync on every write, including bulk UPDATEs
+        conn.execute(text(f"""
+            ALTER TABLE reflection_submissions ADD COLUMN IF NOT EXISTS search_vector tsvector
+            GENERATED ALWAYS AS (
+                setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(content, '')), 'A') ||
+                setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(ai_feedback, '')), 'B')
+            ) STORED
+        """))
+        conn.execute(text(
+            'CREATE INDEX IF NOT EXISTS ix_reflection_submissions_search_vector '
+            'ON reflection_submissions USING gin (search_vector)'
+        ))
+        return
+
+    if conn.dialect.name != 'sqlite':
+        return
+
+    # External-content FTS5 table; triggers mirror every insert, update and delete
+    conn.execute(text(f"""
+        CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+            content, ai_feedback, content='reflection_submissions', content_rowid='id'
+        )
+    """))
+    conn.execute(text(f"""
+        CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON reflection_submissions BEGIN
+            INSERT INTO {FTS_TABLE}(rowid, content, ai_feedback) VALUES (new.id, new.content, new.ai_feedback);
+        END
+    """))
+    conn.execute(text(f"""
+        CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON reflection_submissions BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, content, ai_feedback)
+            VALUES ('delete', old.id, old.content, old.ai_feedback);
+        END
+    """))
+    conn.execute(text(f"""
+        CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF content, ai_feedback ON reflection_submissions BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, content, ai_feedback)
+            VALUES ('delete', old.id, old.content, old.ai_feedback);
+            INSERT INTO {FTS_TABLE}(rowid, content, ai_feedback) VALUES (new.id, new.content, new.ai_feedback);
+        END
+    """))
+    conn.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+
+
+@migration(7, 'Move inline reflection structures to versioned reflection_structures')
+def version_reflection_structures(conn):
+    from .services.structures import structure_hash
+
+    _add_column(conn, Reflection, 'structure_id')
+    reflections = Reflection.__table__
+    structures = ReflectionStructure.__table__
+
+    # Each distinct structure of a course becomes a version, oldest first
+    rows = conn.execute(
+        select(
+            reflections.c.course_id,
+            reflections.c.structure,
+            func.min(reflections.c.start_date).label('first_start')
+        ).where(
+            reflections.c.structure.isnot(None),
+            reflections.c.structure_id.is_(None)
+        ).group_by(reflections.c.course_id, reflections.c.structure).order_by(
+            reflections.c.course_id, 'first_start'
+        )
+    ).all()
+
+    versions = {}
+    for row in rows:
+        versions[row.course_id] = versions.get(row.course_id, 0) + 1
+        structure_id = conn.execute(
+            structures.insert().values(
+                course_id=row.course_id,
+                version=versions[row.course_id],
+                content=row.structure,
+                content_hash=structure_hash(row.structure),
+                created_at=datetime.utcnow()
+            )
+        ).inserted_primary_key[0]
+        conn.execute(
+            update(reflections).where(
+                reflections.c.course_id == row.course_id,
+                reflections.c.structure == row.structure
+            ).values(structure_id=structure_id, structure=None)
+        )
+    print(f"[MIGRATE] Created {len(rows)} reflection structure versions")
+
+
+@migration(8, 'Purge empty placeholder submissions')
+def purge_placeholder_submissions(conn):
+    # Opening a reflection used to create an empty submission for the student
+    submissions = ReflectionSubmission.__table__
+    jobs = FeedbackJob.__table__
+    label_feedback = SubmissionLabelFeedback.__table__
+    purged = conn.execute(
+        submissions.delete().where(
+            submissions.c.content.is_(None),
+            submissions.c.submitted_at.is_(None),
+            submissions.c.ai_feedback.is_(None),
+            submissions.c.score.is_(None),
+            ~select(jobs.c.id).where(jobs.c.submission_id == submissions.c.id).exists(),
+            ~select(label_feedback.c.id).where(label_feedback.c.submission_id == submissions.c.id).exists()
+        )
+    ).rowcount
+    print(f"[MIGRATE] Purged {purged} placeholder submissions")
+
+
+@migration(9, 'Unique index on reflections (course_id, start_date)')
+def add_unique_reflection_dates(conn):
+    reflections = Reflection.__table__
+    submissions = ReflectionSubmission.__table__
+    drafts = SubmissionDraft.__table__
+
+    duplicated = select(reflections.c.course_id, reflections.c.start_date).where(
+        reflections.c.start_date.isnot(None)
+    ).group_by(reflections.c.course_id, reflections.c.start_date).having(func.count() > 1)
+
+    used = set(conn.execute(select(submissions.c.reflection_id).distinct()).scalars())
+    used.update(conn.execute(select(drafts.c.reflection_id).distinct()).scalars())
+
+    removable = []
+    blocked = 0
+    for course_id, start_date in conn.execute(duplicated).all():
+        ids = sorted(conn.execute(
+            select(reflections.c.id).where(
+                reflections.c.course_id == course_id,
+                reflections.c.start_date == start_date
+            )
+        ).scalars())
+        # Keep the oldest row students wrote against (or the oldest row), drop unused copies
+        keeper = next((reflection_id for reflection_id in ids if reflection_id in used), ids[0])
+        extra = [reflection_id for reflection_id in ids if reflection_id != keeper]
+        removable.extend(reflection_id for reflection_id in extra if reflection_id not in used)
+        blocked += sum(1 for reflection_id in extra if reflection_id in used)
+
+    if removable:
+        conn.execute(reflections.delete().where(reflections.c.id.in_(removable)))
+    print(f"[MIGRATE] Removed {len(removable)} unused duplicate reflections")
+
+    if blocked:
+        print(f"[MIGRATE] {blocked} duplicate reflections have student work; "
+              f"uq_reflections_course_id_start_date not created until they are merged")
+        return
+    for index in _indexes(Reflection, 'uq_reflections_course_id_start_date'):
+        index.create(bind=conn, checkfirst=True)
+
+
+def get_applied_versions():
+    table = SchemaMigration.__table__
+    with db.engine.connect() as conn:
+        return set(conn.execute(select(table.c.version)).scalars())
+
+
+def run_migrations():
+    """Apply pending migrations in version order. Safe to call on every startup."""
+    table = SchemaMigration.__table__
+    table.create(bind=db.engine, checkfirst=True)
+    applied = get_applied_versions()
+
+    for version, description, fn in sorted(MIGRATIONS, key=lambda m: m[0]):
+        if version in applied:
+            continue
+
+        with db.engine.begin() as conn:
+            if conn.dialect.name == 'postgresql':
+                # Another worker may be migrating at the same time
+                conn.execute(text('SELECT pg_advisory_xact_lock(:key)'), {'key': MIGRATION_LOCK_KEY})
+                if conn.execute(select(table.c.version).where(table.c.version == version)).first():
+                    continue
+
+            fn(conn)
+            conn.execute(
+                insert_ignore(table, conn.dialect.name).values(
+                    version=version,
+                    description=description,
+                    applied_at=datetime.utcnow()
+                )
+            )
+        print(f"[MIGRATE] Applied migration {version}: {description}")
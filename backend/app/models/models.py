@@ -1,7 +1,8 @@
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
+from ..utils.db_routing import RoutingSession
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 class User(db.Model):
     __tablename__ = 'users'
@@ -11,7 +12,8 @@ class User(db.Model):
     name = db.Column(db.String(255), nullable=False)
     google_id = db.Column(db.String(255), unique=True, nullable=False)
     role = db.Column(db.String(50), nullable=False)  # 'student' or 'teacher'
-    profile_image = db.Column(db.Text)  # Base64 encoded image
+    profile_image = db.deferred(db.Column(db.Text))  # Legacy inline base64 image, moved to the image store by migration 3
+    profile_image_url = db.Column(db.String(512))  # Image store URL or external (Google) picture URL
     department = db.Column(db.String(255))
     experience = db.Column(db.String(255))  # For teachers
     area_of_interest = db.Column(db.String(255))
@@ -40,11 +42,16 @@ class Course(db.Model):
     recurrence_days = db.Column(db.Integer)
     selected_days = db.Column(db.String(255))  # Comma-separated days
     custom_structure = db.Column(db.Text)  # JSON string for custom reflection structure
+    # When set, reflections are computed from the recurrence rule and only
+    # stored once a student or teacher opens one
+    lazy_reflections = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     # Relationships
     enrollments = db.relationship('Enrollment', backref='course', lazy=True, cascade='all, delete-orphan')
     reflections = db.relationship('Reflection', backref='course', lazy=True, cascade='all, delete-orphan')
+    
+    __table_args__ = (db.Index('ix_courses_teacher_id_status', 'teacher_id', 'status'),)
 
 
 class Enrollment(db.Model):
@@ -55,7 +62,10 @@ class Enrollment(db.Model):
     course_id = db.Column(db.Integer, db.ForeignKey('courses.id'), nullable=False)
     enrolled_at = db.Column(db.DateTime, default=datetime.utcnow)
     
-    __table_args__ = (db.UniqueConstraint('student_id', 'course_id', name='unique_enrollment'),)
+    __table_args__ = (
+        db.UniqueConstraint('student_id', 'course_id', name='unique_enrollment'),
+        db.Index('ix_enrollments_course_id_student_id', 'course_id', 'student_id'),
+    )
 
 
 class Reflection(db.Model):
@@ -68,11 +78,46 @@ class Reflection(db.Model):
     description = db.Column(db.Text)
     start_date = db.Column(db.DateTime)
     due_date = db.Column(db.DateTime)
-    structure = db.Column(db.Text)  # JSON string for reflection structure
+    structure_id = db.Column(db.Integer, db.ForeignKey('reflection_structures.id'))
+    # Inline copy of the structure; only rows written before structures were versioned have one
+    legacy_structure = db.Column('structure', db.Text)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     # Relationships
     submissions = db.relationship('ReflectionSubmission', backref='reflection', lazy=True, cascade='all, delete-orphan')
+    stats = db.relationship('ReflectionStats', backref='reflection', uselist=False, lazy=True, cascade='all, delete-orphan', passive_deletes=True)
+    structure_version = db.relationship('ReflectionStructure', lazy=True)
+    
+    __table_args__ = (
+        db.Index('ix_reflections_course_id_start_date', 'course_id', 'start_date'),
+        db.Index('ix_reflections_course_id_due_date', 'course_id', 'due_date'),
+        # One reflection per course and day, so concurrent opens of a lazy occurrence can't duplicate it
+        db.Index('uq_reflections_course_id_start_date', 'course_id', 'start_date', unique=True),
+    )
+    
+    @property
+    def structure(self):
+        """JSON string for reflection structure"""
+        if self.structure_id is not None:
+            return self.structure_version.content
+        return self.legacy_structure
+
+
+class ReflectionStructure(db.Model):
+    __tablename__ = 'reflection_structures'
+    
+    # One row per distinct structure a course has been configured with
+    id = db.Column(db.Integer, primary_key=True)
+    course_id = db.Column(db.Integer, db.ForeignKey('courses.id', ondelete='CASCADE'), nullable=False)
+    version = db.Column(db.Integer, nullable=False)
+    content = db.Column(db.Text, nullable=False)  # JSON string, as in Course.custom_structure
+    content_hash = db.Column(db.String(64), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.UniqueConstraint('course_id', 'version', name='unique_structure_version'),
+        db.Index('ix_reflection_structures_course_id_content_hash', 'course_id', 'content_hash'),
+    )
 
 
 class ReflectionSubmission(db.Model):
@@ -89,4 +134,111 @@ class ReflectionSubmission(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
-    __table_args__ = (db.UniqueConstraint('reflection_id', 'student_id', name='unique_submission'),)
+    # Relationships
+    feedback_jobs = db.relationship('FeedbackJob', backref='submission', lazy=True, cascade='all, delete-orphan', passive_deletes=True)
+    label_feedback = db.relationship('SubmissionLabelFeedback', lazy=True, cascade='all, delete-orphan', passive_deletes=True)
+    
+    __table_args__ = (
+        db.UniqueConstraint('reflection_id', 'student_id', name='unique_submission'),
+        db.Index('ix_reflection_submissions_student_id_reflection_id', 'student_id', 'reflection_id'),
+    )
+
+
+class FeedbackJob(db.Model):
+    __tablename__ = 'feedback_jobs'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    submission_id = db.Column(db.Integer, db.ForeignKey('reflection_submissions.id', ondelete='CASCADE'), nullable=False, index=True)
+    status = db.Column(db.String(20), nullable=False, default='pending')  # 'pending', 'running', 'done', 'failed'
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    error = db.Column(db.Text)
+    run_after = db.Column(db.DateTime, default=datetime.utcnow)  # Earliest time a worker may claim the job
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    
+    __table_args__ = (db.Index('ix_feedback_jobs_status_run_after', 'status', 'run_after'),)
+
+
+# AI feedback for one label of a structured submission, reused while the label's response is unchanged
+class SubmissionLabelFeedback(db.Model):
+    __tablename__ = 'submission_label_feedback'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    submission_id = db.Column(db.Integer, db.ForeignKey('reflection_submissions.id', ondelete='CASCADE'), nullable=False)
+    label = db.Column(db.Text, nullable=False)
+    response_hash = db.Column(db.String(64), nullable=False)  # SHA-256 of the normalized response, framework and model
+    feedback = db.Column(db.Text, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (db.UniqueConstraint('submission_id', 'label', name='unique_label_feedback'),)
+
+
+# Autosaved answer for one label of a reflection the student hasn't submitted (again) yet
+class SubmissionDraft(db.Model):
+    __tablename__ = 'submission_drafts'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    reflection_id = db.Column(db.Integer, db.ForeignKey('reflections.id', ondelete='CASCADE'), nullable=False)
+    student_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    label = db.Column(db.Text, nullable=False)  # '' for plain-text reflections
+    response = db.Column(db.Text)  # NULL once the label was removed, so older saves can't bring it back
+    updated_at = db.Column(db.DateTime, nullable=False)  # When the server received the change; newest wins
+    
+    __table_args__ = (db.UniqueConstraint('reflection_id', 'student_id', 'label', name='unique_draft_label'),)
+
+
+class FeedbackCacheEntry(db.Model):
+    __tablename__ = 'feedback_cache'
+    
+    key = db.Column(db.String(64), primary_key=True)  # SHA-256 of normalized content, framework and model
+    model = db.Column(db.String(100), nullable=False)
+    feedback = db.Column(db.Text, nullable=False)
+    hit_count = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    last_used_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+
+class FeedbackBatch(db.Model):
+    __tablename__ = 'feedback_batches'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    reflection_id = db.Column(db.Integer, db.ForeignKey('reflections.id', ondelete='CASCADE'), nullable=False, index=True)
+    requested_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='pending')  # 'pending', 'running', 'done', 'failed'
+    force = db.Column(db.Boolean, default=False)  # Bypass the feedback cache
+    total = db.Column(db.Integer, nullable=False, default=0)
+    completed = db.Column(db.Integer, nullable=False, default=0)
+    failed = db.Column(db.Integer, nullable=False, default=0)
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+
+
+class ReflectionStats(db.Model):
+    __tablename__ = 'reflection_stats'
+    
+    # Maintained alongside submission writes; rebuild with `flask rebuild-reflection-stats`
+    reflection_id = db.Column(db.Integer, db.ForeignKey('reflections.id', ondelete='CASCADE'), primary_key=True)
+    submitted_count = db.Column(db.Integer, nullable=False, default=0)
+    scored_count = db.Column(db.Integer, nullable=False, default=0)
+    last_submitted_at = db.Column(db.DateTime)
+
+
+class SchemaMigration(db.Model):
+    __tablename__ = 'schema_migrations'
+    
+    version = db.Column(db.Integer, primary_key=True)
+    description = db.Column(db.String(255), nullable=False)
+    applied_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class ResourceVersion(db.Model):
+    __tablename__ = 'resource_versions'
+    
+    # Change counters behind the ETags of read endpoints; see utils/versioning.py
+    kind = db.Column(db.String(16), primary_key=True)  # 'course', 'user'
+    resource_id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
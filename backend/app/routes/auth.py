@@ -2,6 +2,10 @@ from flask import Blueprint, request, jsonify, session
 from google.oauth2 import id_token
 from google.auth.transport import requests
 from ..models.models import db, User
+from ..services.image_store import save_data_url
+from ..utils.auth_utils import login_user
+from ..utils.versioning import conditional, current_versions
+from ..serializers import USER_SUMMARY, USER_PROFILE
 import os
 
 bp = Blueprint('auth', __name__, url_prefix='/api/auth')
@@ -53,7 +57,7 @@ def google_auth():
                 name=name,
                 google_id=google_id,
                 role=role,
-                profile_image=picture
+                profile_image_url=picture or None
             )
             db.session.add(user)
             db.session.commit()
@@ -66,18 +70,9 @@ def google_auth():
                 db.session.commit()
         
         # Set session
-        session['user_id'] = user.id
-        session['user_role'] = user.role
+        login_user(user)
         
-        return jsonify({
-            'user': {
-                'id': user.id,
-                'email': user.email,
-                'name': user.name,
-                'role': user.role,
-                'profile_image': user.profile_image
-            }
-        }), 200
+        return jsonify({'user': USER_SUMMARY.dump(user)}), 200
         
     except Exception as e:
         print(f'Auth error: {str(e)}')
@@ -89,7 +84,11 @@ def logout():
     session.clear()
     return jsonify({'message': 'Logged out successfully'}), 200
 
+def _me_versions():
+    return current_versions(('user', session['user_id'])) if 'user_id' in session else []
+
 @bp.route('/me', methods=['GET'])
+@conditional(_me_versions)
 def get_current_user():
     """Get current logged in user"""
     if 'user_id' not in session:
@@ -100,20 +99,10 @@ def get_current_user():
         session.clear()
         return jsonify({'error': 'User not found'}), 404
     
-    return jsonify({
-        'user': {
-            'id': user.id,
-            'email': user.email,
-            'name': user.name,
-            'role': user.role,
-            'profile_image': user.profile_image,
-            'department': user.department,
-            'experience': user.experience,
-            'area_of_interest': user.area_of_interest,
-            'student_id': user.student_id,
-            'year_of_joining': user.year_of_joining
-        }
-    }), 200
+    # Keep the role in the signed session in sync with the database
+    session['user_role'] = user.role
+    
+    return jsonify({'user': USER_PROFILE.dump(user)}), 200
 
 @bp.route('/profile', methods=['PUT'])
 def update_profile():
@@ -146,22 +135,29 @@ def update_profile():
         if 'year_of_joining' in data:
             user.year_of_joining = data['year_of_joining']
     
-    # Profile image (base64) - validate size
+    # Profile image (base64 data URL) - stored in the image store, not in the users row
     if 'profile_image' in data:
         image_data = data['profile_image']
-        if image_data:
+        if not image_data:
+            # Allow null to remove image
+            user.profile_image_url = None
+            user.profile_image = None
+        elif image_data != user.profile_image_url:
             # Check if it's a valid base64 data URL
             if not image_data.startswith('data:image/'):
                 return jsonify({'error': 'Invalid image format'}), 400
             
-            # Estimate base64 size (approximately 4/3 of original)
-            # Limit to ~2.7MB base64 (2MB original)
+            # Reject oversized payloads before decoding (~2.7MB base64 for 2MB original)
             if len(image_data) > 2.7 * 1024 * 1024:
                 return jsonify({'error': 'Image too large. Maximum size is 2MB'}), 400
             
-            user.profile_image = image_data
-        else:
-            # Allow null to remove image
+            try:
+                user.profile_image_url = save_data_url(image_data)
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            except OSError as e:
+                print(f'Error storing profile image: {str(e)}')
+                return jsonify({'error': 'Failed to store image'}), 500
             user.profile_image = None
     
     try:
@@ -173,16 +169,5 @@ def update_profile():
     
     return jsonify({
         'message': 'Profile updated successfully',
-        'user': {
-            'id': user.id,
-            'email': user.email,
-            'name': user.name,
-            'role': user.role,
-            'profile_image': user.profile_image,
-            'department': user.department,
-            'experience': user.experience,
-            'area_of_interest': user.area_of_interest,
-            'student_id': user.student_id,
-            'year_of_joining': user.year_of_joining
-        }
+        'user': USER_PROFILE.dump(user)
     }), 200
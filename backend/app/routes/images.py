@@ -0,0 +1,19 @@
+from flask import Blueprint, request, jsonify, send_file
+from ..services.image_store import resolve_image
+
+bp = Blueprint('images', __name__, url_prefix='/api/images')
+
+ONE_YEAR = 365 * 24 * 3600
+
+@bp.route('/<filename>', methods=['GET'])
+def get_image(filename):
+    """Serve a stored image. URLs are content-addressed, so responses never change."""
+    resolved = resolve_image(filename, thumbnail=request.args.get('size') == 'thumb')
+    if not resolved:
+        return jsonify({'error': 'Image not found'}), 404
+
+    path, mime_type, etag = resolved
+    response = send_file(path, mimetype=mime_type, etag=etag, max_age=ONE_YEAR, conditional=True)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
@@ -1,86 +1,202 @@
-from flask import Blueprint, request, jsonify, session
-from ..models.models import db, Reflection, ReflectionSubmission, Course, Enrollment, User
-from ..utils.auth_utils import login_required, teacher_required, student_required
-from ..services.ai_feedback import generate_reflection_feedback
-from datetime import datetime
+from flask import Blueprint, Response, request, jsonify, session, current_app, stream_with_context
+from ..models.models import db, Reflection, ReflectionSubmission, Course, Enrollment, User, FeedbackJob
+from ..utils.auth_utils import login_required, teacher_required, student_required, current_user
+from ..utils.versioning import conditional, current_versions, bump_versions
+from ..utils.db_routing import use_primary
+from ..utils.db_utils import upsert
+from ..serializers import (
+    REFLECTION_DETAIL, SUBMISSION_DETAIL, SUBMISSION_ROW_WITH_CONTENT, SUBMISSION_ROW_WITHOUT_CONTENT
+)
+from ..services.ai_feedback import generate_submission_feedback, FALLBACK_FEEDBACK
+from ..services.feedback_jobs import enqueue_feedback_job, notify_worker, serialize_job, claim_job, stream_feedback_job
+from ..services.submission_stats import bump_reflection_stats
+from ..services.drafts import parse_draft_patch, save_draft_changes, load_draft, clear_draft
+from ..services.schedule import virtual_occurrences, materialize_occurrence
+from ..services.structures import find_structure_id, load_structures
+from ..utils.pagination import encode_cursor, decode_cursor, keyset_after, parse_limit
+from ..utils.listing import Field, iso, parse_listing_args, search_clause, select_fields, render, row_key, apply_keyset, split_page
+from sqlalchemy import and_, func
+from datetime import datetime, date
+import json
+import time
 
 bp = Blueprint('reflections', __name__, url_prefix='/api/reflections')
 
+REFLECTION_FIELDS = {
+    'id': Field(Reflection.id, None),
+    'name': Field(Reflection.name, None),
+    'number': Field(Reflection.number, None),
+    'description': Field(Reflection.description, None),
+    'start_date': Field(Reflection.start_date, iso),
+    'due_date': Field(Reflection.due_date, iso),
+    # Structures are sent once per page in `structures`, keyed by this id
+    'structure_id': Field(Reflection.structure_id, None)
+}
+
+# Reflections without a start date list after the scheduled ones. Coalescing keeps them
+# in the keyset order: a NULL in the sort key would never compare greater than a cursor.
+UNDATED = datetime.max
+
+def _course_reflections_versions(course_id):
+    # The user's counter covers the student's own submissions
+    return current_versions(('course', course_id), ('user', session['user_id']))
+
 @bp.route('/course/<int:course_id>', methods=['GET'])
 @login_required
+@conditional(_course_reflections_versions)
 def get_course_reflections(course_id):
-    """Get all reflections for a course"""
-    reflections = Reflection.query.filter_by(course_id=course_id).order_by(Reflection.number).all()
-    user = User.query.get(session['user_id'])
-    
-    result = []
-    for r in reflections:
-        reflection_data = {
-            'id': r.id,
-            'name': r.name,
-            'number': r.number,
-            'description': r.description,
-            'start_date': r.start_date.isoformat() if r.start_date else None,
-            'due_date': r.due_date.isoformat() if r.due_date else None,
-            'structure': r.structure
+    """Get reflections for a course (supports search, limit, cursor, fields)"""
+    course = Course.query.get_or_404(course_id)
+    user = current_user()
+    if not user:
+        return jsonify({'error': 'User not found'}), 404
+    
+    # Students also get their own submission for each reflection
+    available = list(REFLECTION_FIELDS) + (['submission'] if user.role == 'student' else [])
+    try:
+        args = parse_listing_args(request.args, available)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    columns = [name for name in args.fields if name in REFLECTION_FIELDS]
+    
+    query = db.session.query(Reflection.id).filter(Reflection.course_id == course_id)
+    if args.search:
+        query = query.filter(search_clause(args.search, Reflection.name))
+    
+    sort_key = [func.coalesce(Reflection.start_date, UNDATED), Reflection.id]
+    query = query.with_entities(*select_fields(columns, REFLECTION_FIELDS, sort_key))
+    try:
+        rows = apply_keyset(query, sort_key, args.limit, args.cursor).all()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    # (sort key, reflection id, item); the sort key doubles as the cursor
+    entries = [(row_key(row, sort_key), row._key1, render(row, columns, REFLECTION_FIELDS)) for row in rows]
+    
+    if course.lazy_reflections:
+        # Unopened occurrences have no row (and so no id) until they're materialized.
+        # They sort by start date with 0 standing in for the id.
+        materialized = {
+            start_date.date() for (start_date,) in
+            db.session.query(Reflection.start_date).filter(Reflection.course_id == course_id)
+            if start_date
         }
-        
-        if user.role == 'student':
-            submission = ReflectionSubmission.query.filter_by(
-                reflection_id=r.id,
-                student_id=user.id
-            ).first()
-            
-            reflection_data['submission'] = {
+        structure_id = find_structure_id(course.id, course.custom_structure)
+        virtual = []
+        for occurrence in virtual_occurrences(course, materialized, structure_id):
+            if args.search and args.search not in occurrence['name'].lower():
+                continue
+            key = [occurrence['start_date'], 0]
+            if args.cursor and key <= _cursor_values(args.cursor):
+                continue
+            data = {
+                'id': None,
+                'name': occurrence['name'],
+                'number': occurrence['number'],
+                'description': '',
+                'start_date': occurrence['start_date'].isoformat(),
+                'due_date': occurrence['due_date'].isoformat(),
+                'structure_id': occurrence['structure_id']
+            }
+            item = {name: data[name] for name in columns}
+            item.update(virtual=True, occurrence_date=occurrence['occurrence_date'])
+            virtual.append((key, None, item))
+        entries = sorted(entries + virtual, key=lambda entry: entry[0])
+        if args.limit:
+            entries = entries[:args.limit + 1]
+    
+    entries, next_cursor = split_page(entries, args.limit, lambda entry: entry[0])
+    
+    if 'submission' in args.fields:
+        # One lookup for the whole page instead of one per reflection
+        reflection_ids = [reflection_id for _, reflection_id, _ in entries if reflection_id]
+        submissions = {
+            submission.reflection_id: submission for submission in db.session.query(
+                ReflectionSubmission.id,
+                ReflectionSubmission.reflection_id,
+                ReflectionSubmission.submitted_at,
+                ReflectionSubmission.ai_feedback,
+                ReflectionSubmission.display_feedback
+            ).filter(
+                ReflectionSubmission.reflection_id.in_(reflection_ids),
+                ReflectionSubmission.student_id == user.id
+            )
+        } if reflection_ids else {}
+        for _, reflection_id, item in entries:
+            submission = submissions.get(reflection_id)
+            item['submission'] = {
                 'id': submission.id,
                 'submitted': submission.submitted_at is not None,
                 'submitted_at': submission.submitted_at.isoformat() if submission.submitted_at else None,
                 'feedback': submission.ai_feedback if submission.display_feedback else None
             } if submission else None
-        
-        result.append(reflection_data)
     
-    return jsonify({'reflections': result}), 200
+    result = {'reflections': [item for _, _, item in entries]}
+    if 'structure_id' in args.fields:
+        result['structures'] = load_structures(item['structure_id'] for _, _, item in entries)
+    if args.limit:
+        result['next_cursor'] = next_cursor
+    return jsonify(result), 200
+
+def _cursor_values(cursor):
+    start_date = datetime.fromisoformat(cursor[0]) if isinstance(cursor[0], str) else cursor[0]
+    return [start_date, cursor[1]]
+
+@bp.route('/course/<int:course_id>/occurrences/<occurrence_date>', methods=['POST'])
+@login_required
+def open_occurrence(course_id, occurrence_date):
+    """Materialize a computed reflection of a lazy course so it can be opened and submitted"""
+    course = Course.query.get_or_404(course_id)
+    user = current_user()
+    if not user:
+        return jsonify({'error': 'User not found'}), 404
+    
+    if user.role == 'teacher' and course.teacher_id != user.id:
+        return jsonify({'error': 'Access denied'}), 403
+    if user.role == 'student':
+        enrollment = Enrollment.query.filter_by(student_id=user.id, course_id=course_id).first()
+        if not enrollment:
+            return jsonify({'error': 'Not enrolled in this course'}), 403
+    
+    try:
+        occurrence = date.fromisoformat(occurrence_date)
+    except ValueError:
+        return jsonify({'error': 'Invalid occurrence date'}), 400
+    
+    if not course.lazy_reflections:
+        return jsonify({'error': 'Reflections of this course are not opened on demand'}), 409
+    
+    reflection = materialize_occurrence(course_id, occurrence)
+    if not reflection:
+        return jsonify({'error': 'No reflection is scheduled on that date'}), 404
+    
+    return jsonify({'reflection_id': reflection.id}), 200
 
 @bp.route('/<int:reflection_id>', methods=['GET'])
 @login_required
 def get_reflection(reflection_id):
     """Get specific reflection details"""
     reflection = Reflection.query.get_or_404(reflection_id)
-    user = User.query.get(session['user_id'])
-    
-    data = {
-        'id': reflection.id,
-        'name': reflection.name,
-        'number': reflection.number,
-        'description': reflection.description,
-        'start_date': reflection.start_date.isoformat() if reflection.start_date else None,
-        'due_date': reflection.due_date.isoformat() if reflection.due_date else None,
-        'structure': reflection.structure,
-        'course_id': reflection.course_id
-    }
+    user = current_user()
+    if not user:
+        return jsonify({'error': 'User not found'}), 404
+    
+    data = REFLECTION_DETAIL.dump(reflection)
     
     if user.role == 'student':
+        # Read-only: the submission row is created by the first submit
         submission = ReflectionSubmission.query.filter_by(
             reflection_id=reflection_id,
             student_id=user.id
         ).first()
         
-        if not submission:
-            submission = ReflectionSubmission(
-                reflection_id=reflection_id,
-                student_id=user.id
-            )
-            db.session.add(submission)
-            db.session.commit()
-        
         data['submission'] = {
             'id': submission.id,
             'content': submission.content,
             'submitted': submission.submitted_at is not None,
             'submitted_at': submission.submitted_at.isoformat() if submission.submitted_at else None,
             'feedback': submission.ai_feedback if submission.display_feedback else None
-        }
+        } if submission else None
     
     return jsonify(data), 200
 
@@ -99,41 +215,226 @@ def submit_reflection():
     if reflection.due_date and reflection.due_date < datetime.utcnow():
         return jsonify({'error': 'Submission deadline has passed'}), 403
     
-    submission = ReflectionSubmission.query.filter_by(
-        reflection_id=reflection_id,
+    # Lock an existing row so the previous submission time stays accurate
+    previous = db.session.query(ReflectionSubmission.submitted_at).filter_by(
+        reflection_id=reflection.id,
         student_id=session['user_id']
-    ).first()
+    ).with_for_update().first()
     
-    if not submission:
-        submission = ReflectionSubmission(
-            reflection_id=reflection_id,
-            student_id=session['user_id']
-        )
-        db.session.add(submission)
+    # Create or update the submission in one statement, so concurrent submits can't collide
+    submitted_at = datetime.utcnow()
+    table = ReflectionSubmission.__table__
+    row = db.session.execute(
+        upsert(
+            table,
+            db.session.get_bind().dialect.name,
+            index_elements=['reflection_id', 'student_id'],
+            update_columns=['content', 'ai_feedback', 'submitted_at', 'updated_at']
+        ).values(
+            reflection_id=reflection.id,
+            student_id=session['user_id'],
+            content=content,
+            ai_feedback=None,
+            submitted_at=submitted_at,
+            created_at=submitted_at,
+            updated_at=submitted_at
+        ).returning(table.c.id, table.c.created_at)
+    ).one()
+    # The Core upsert skips the flush hook that keeps the student's ETags current
+    bump_versions(db.session.connection(), [('user', session['user_id'])])
     
-    submission.content = content
-    submission.submitted_at = datetime.utcnow()
+    if previous is None:
+        # created_at keeps its old value on conflict, so it only matches if this statement inserted
+        # the row; otherwise a concurrent first submit created (and counted) it
+        first_submission = row.created_at == submitted_at
+    else:
+        first_submission = previous.submitted_at is None
+    submission = db.session.get(ReflectionSubmission, row.id)
+    
+    bump_reflection_stats(
+        reflection.id,
+        submitted=1 if first_submission else 0,
+        last_submitted_at=submitted_at
+    )
+    clear_draft(reflection.id, session['user_id'])
+    
+    if current_app.config['FEEDBACK_ASYNC']:
+        # Commit the content now and let the background worker generate feedback
+        db.session.flush()
+        
+        # A streaming client runs the job itself through the stream endpoint; the
+        # worker only picks it up if the client hasn't connected within the grace period
+        stream = bool(data.get('stream')) and current_app.config['FEEDBACK_STREAMING']
+        job = enqueue_feedback_job(
+            submission.id,
+            delay_seconds=current_app.config['FEEDBACK_STREAM_GRACE'] if stream else 0
+        )
+        db.session.commit()
+        if not stream:
+            notify_worker()
+        
+        result = {
+            'message': 'Reflection submitted successfully',
+            'submission_id': submission.id,
+            'feedback_job': serialize_job(job)
+        }
+        if stream:
+            result['stream_url'] = f'/api/reflections/feedback-jobs/{job.id}/stream'
+        return jsonify(result), 202
     
     # Get course details for AI feedback context
     course = Course.query.get(reflection.course_id)
     
     # Generate AI-powered feedback using Gemini
     try:
-        submission.ai_feedback = generate_reflection_feedback(
+        db.session.flush()
+        submission.ai_feedback = generate_submission_feedback(
+            submission.id,
             reflection_content=content,
-            framework=course.framework if course else None,
-            structure=reflection.structure
+            framework=course.framework if course else None
         )
         print(f"[AI] Generated feedback for reflection {reflection_id}")
     except Exception as e:
         print(f"[AI] Error generating feedback: {str(e)}")
         # Fallback to generic feedback if AI fails
-        submission.ai_feedback = "Thank you for your thoughtful reflection. Keep up the great work!"
+        submission.ai_feedback = FALLBACK_FEEDBACK
     
     db.session.commit()
     
     return jsonify({'message': 'Reflection submitted successfully'}), 200
 
+@bp.route('/<int:reflection_id>/draft', methods=['PATCH'])
+@student_required
+def save_draft(reflection_id):
+    """Autosave changed answers as JSON-patch operations; never triggers AI feedback"""
+    reflection = Reflection.query.get_or_404(reflection_id)
+    if reflection.due_date and reflection.due_date < datetime.utcnow():
+        return jsonify({'error': 'Submission deadline has passed'}), 403
+    
+    try:
+        changes = parse_draft_patch(request.get_json(silent=True), current_app.config['DRAFT_MAX_CHARS'])
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    # Buffered and written in the background, together with other recent saves
+    save_draft_changes(reflection_id, session['user_id'], changes)
+    return jsonify({'saved': len(changes)}), 202
+
+@bp.route('/<int:reflection_id>/draft', methods=['GET'])
+@student_required
+@use_primary  # Drafts change every few seconds; replica lag would bring back older text
+def get_draft(reflection_id):
+    """Get the student's autosaved answers, newer than their last submission"""
+    submitted_at = db.session.query(ReflectionSubmission.submitted_at).filter_by(
+        reflection_id=reflection_id,
+        student_id=session['user_id']
+    ).scalar()
+    
+    draft, updated_at = load_draft(reflection_id, session['user_id'], since=submitted_at)
+    return jsonify({
+        'draft': draft,
+        'updated_at': updated_at.isoformat() if updated_at else None
+    }), 200
+
+@bp.route('/feedback-jobs/<int:job_id>', methods=['GET'])
+@login_required
+def get_feedback_job(job_id):
+    """Poll the status of a background feedback job"""
+    job = FeedbackJob.query.get_or_404(job_id)
+    submission = ReflectionSubmission.query.get_or_404(job.submission_id)
+    
+    if submission.student_id != session['user_id']:
+        reflection = Reflection.query.get(submission.reflection_id)
+        course = Course.query.get(reflection.course_id)
+        if course.teacher_id != session['user_id']:
+            return jsonify({'error': 'Access denied'}), 403
+    
+    data = serialize_job(job)
+    data['feedback_ready'] = job.status in ('done', 'failed') and submission.ai_feedback is not None
+    data['feedback'] = submission.ai_feedback if submission.display_feedback else None
+    
+    return jsonify({'job': data}), 200
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@bp.route('/feedback-jobs/<int:job_id>/stream', methods=['GET'])
+@student_required
+@use_primary  # Claims the job and stores the result
+def stream_feedback(job_id):
+    """
+    Stream AI feedback for the student's own submission as Server-Sent Events.
+
+    Sends `chunk` events ({text}) while the feedback is generated and a final
+    `done` event ({feedback, job}) once it is stored. Feedback the teacher
+    hasn't enabled (display_feedback) is never sent: generation is reported
+    with a `status` event instead, and `done` carries no feedback. If the job
+    was already taken by the background worker, only `status` events and the
+    final `done` are sent, for at most FEEDBACK_STREAM_WAIT seconds; after
+    that an `error` event tells the client to poll the job endpoint.
+    """
+    if not current_app.config['FEEDBACK_STREAMING']:
+        return jsonify({'error': 'Feedback streaming is disabled'}), 404
+    
+    job = FeedbackJob.query.get_or_404(job_id)
+    submission = ReflectionSubmission.query.get_or_404(job.submission_id)
+    if submission.student_id != session['user_id']:
+        return jsonify({'error': 'Access denied'}), 403
+    submission_id = submission.id
+    wait_limit = current_app.config['FEEDBACK_STREAM_WAIT']
+    poll_url = f'/api/reflections/feedback-jobs/{job_id}'
+    
+    def visible_feedback():
+        # Re-read: the teacher may have enabled feedback while it was generated
+        row = db.session.query(ReflectionSubmission.ai_feedback, ReflectionSubmission.display_feedback).filter_by(id=submission_id).first()
+        return row.ai_feedback if row and row.display_feedback else None
+    
+    def finished(job):
+        return _sse('done', {'feedback': visible_feedback(), 'job': serialize_job(job)})
+    
+    def events():
+        if claim_job(job_id):
+            show_text = submission.display_feedback
+            if not show_text:
+                yield _sse('status', {'status': 'running'})
+            chunks = stream_feedback_job(job_id)
+            try:
+                for chunk in chunks:
+                    if show_text:
+                        yield _sse('chunk', {'text': chunk})
+            except Exception:
+                # The job is back in the queue; the client can poll the job endpoint instead
+                yield _sse('error', {'error': 'Feedback generation was interrupted', 'job_id': job_id, 'poll_url': poll_url})
+                return
+            finally:
+                # Runs the job's disconnect handling while the request context is still active
+                chunks.close()
+            yield finished(FeedbackJob.query.get(job_id))
+            return
+        
+        # Someone else is generating it (or already has); report progress for a short while,
+        # then hand the client over to polling so this doesn't hold a request thread
+        deadline = time.monotonic() + wait_limit
+        db.session.commit()
+        while time.monotonic() < deadline:
+            current = FeedbackJob.query.get(job_id)
+            if current is None:
+                break
+            if current.status in ('done', 'failed'):
+                yield finished(current)
+                return
+            yield _sse('status', {'status': current.status})
+            # Fresh snapshot on the next poll; the connection goes back to the pool while we sleep
+            db.session.commit()
+            time.sleep(1)
+        yield _sse('error', {'error': 'Still waiting for feedback', 'job_id': job_id, 'poll_url': poll_url})
+    
+    return Response(
+        stream_with_context(events()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
 @bp.route('/<int:reflection_id>/submissions', methods=['GET'])
 @teacher_required
 def get_reflection_submissions(reflection_id):
@@ -144,30 +445,77 @@ def get_reflection_submissions(reflection_id):
     if course.teacher_id != session['user_id']:
         return jsonify({'error': 'Access denied'}), 403
     
-    enrollments = Enrollment.query.filter_by(course_id=course.id).all()
+    try:
+        limit = parse_limit(request.args.get('limit'))
+        cursor = decode_cursor(request.args['cursor']) if request.args.get('cursor') else None
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
-    submissions_data = []
-    for enrollment in enrollments:
-        student = enrollment.student
-        submission = ReflectionSubmission.query.filter_by(
-            reflection_id=reflection_id,
-            student_id=student.id
-        ).first()
-        
-        submissions_data.append({
-            'student_id': student.id,
-            'student_name': student.name,
-            'student_email': student.email,
-            'submitted': submission.submitted_at is not None if submission else False,
-            'submission_date': submission.submitted_at.isoformat() if submission and submission.submitted_at else None,
-            'content': submission.content if submission else None,
-            'ai_feedback': submission.ai_feedback if submission else None,
-            'score': submission.score if submission else None,
-            'display_feedback': submission.display_feedback if submission else False,
-            'submission_id': submission.id if submission else None
-        })
-    
-    return jsonify({'submissions': submissions_data}), 200
+    # content/ai_feedback are the heavy columns; the list view can leave them out
+    # and fetch a single row via /submission/<id> when it's expanded
+    include_content = request.args.get('include_content', 'true').lower() != 'false'
+    
+    columns = [
+        User.id.label('student_id'),
+        User.name.label('student_name'),
+        User.email.label('student_email'),
+        ReflectionSubmission.id.label('submission_id'),
+        ReflectionSubmission.submitted_at,
+        ReflectionSubmission.score,
+        ReflectionSubmission.display_feedback
+    ]
+    if include_content:
+        columns += [ReflectionSubmission.content, ReflectionSubmission.ai_feedback]
+    else:
+        columns += [
+            ReflectionSubmission.content.isnot(None).label('has_content'),
+            ReflectionSubmission.ai_feedback.isnot(None).label('has_feedback')
+        ]
+    
+    # One pass over the roster: enrollments -> users, outer-joined to this reflection's submissions
+    query = db.session.query(*columns).select_from(Enrollment).join(
+        User, User.id == Enrollment.student_id
+    ).outerjoin(
+        ReflectionSubmission,
+        and_(
+            ReflectionSubmission.reflection_id == reflection_id,
+            ReflectionSubmission.student_id == Enrollment.student_id
+        )
+    ).filter(Enrollment.course_id == course.id)
+    
+    sort_key = [User.name, User.id]
+    if cursor:
+        if len(cursor) != len(sort_key):
+            return jsonify({'error': 'Invalid cursor'}), 400
+        query = query.filter(keyset_after(sort_key, cursor))
+    query = query.order_by(*sort_key)
+    
+    rows = query.limit(limit + 1).all() if limit else query.all()
+    has_more = bool(limit) and len(rows) > limit
+    rows = rows[:limit] if limit else rows
+    
+    serializer = SUBMISSION_ROW_WITH_CONTENT if include_content else SUBMISSION_ROW_WITHOUT_CONTENT
+    result = {'submissions': serializer.dump_many(rows)}
+    if limit:
+        last = rows[-1] if rows else None
+        result['next_cursor'] = encode_cursor([last.student_name, last.student_id]) if has_more else None
+    
+    return jsonify(result), 200
+
+@bp.route('/submission/<int:submission_id>', methods=['GET'])
+@teacher_required
+def get_submission(submission_id):
+    """Get a single submission with its content (teacher view)"""
+    submission = ReflectionSubmission.query.get_or_404(submission_id)
+    reflection = Reflection.query.get(submission.reflection_id)
+    course = Course.query.get(reflection.course_id)
+    
+    if course.teacher_id != session['user_id']:
+        return jsonify({'error': 'Access denied'}), 403
+    
+    return jsonify({
+        'submission': SUBMISSION_DETAIL.dump(submission)
+    }), 200
 
 @bp.route('/submission/<int:submission_id>/update', methods=['PUT'])
 @teacher_required
@@ -183,7 +531,11 @@ def update_submission(submission_id):
     data = request.get_json()
     
     if 'score' in data:
+        was_scored = submission.score is not None
         submission.score = data['score']
+        is_scored = submission.score is not None
+        if was_scored != is_scored:
+            bump_reflection_stats(submission.reflection_id, scored=1 if is_scored else -1)
     if 'display_feedback' in data:
         submission.display_feedback = data['display_feedback']
     if 'ai_feedback' in data:
@@ -199,39 +551,139 @@ def get_student_dashboard():
     """Get student dashboard with due/overdue reflections"""
     user_id = session['user_id']
     sort_by = request.args.get('sort_by', 'dates')  # 'dates' or 'courses'
+    now = datetime.utcnow()
     
-    enrollments = Enrollment.query.filter_by(student_id=user_id).all()
-    course_ids = [e.course_id for e in enrollments]
+    try:
+        limit = parse_limit(request.args.get('limit'))
+        cursor = decode_cursor(request.args['cursor']) if request.args.get('cursor') else None
+        # Defaults to everything still open; pass due_from to include overdue reflections
+        due_from = datetime.fromisoformat(request.args['due_from'].replace('Z', '')) if request.args.get('due_from') else now
+        due_to = datetime.fromisoformat(request.args['due_to'].replace('Z', '')) if request.args.get('due_to') else None
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
-    reflections = Reflection.query.filter(Reflection.course_id.in_(course_ids)).all()
+    # Anti-join: keep reflections the student has no submitted row for
+    submitted = and_(
+        ReflectionSubmission.reflection_id == Reflection.id,
+        ReflectionSubmission.student_id == user_id,
+        ReflectionSubmission.submitted_at.isnot(None)
+    )
     
-    dashboard_data = []
-    now = datetime.utcnow()
+    query = db.session.query(
+        Reflection.id,
+        Reflection.name,
+        Reflection.due_date,
+        Course.name.label('course_name'),
+        Course.course_code
+    ).select_from(Enrollment).join(
+        Course, Course.id == Enrollment.course_id
+    ).join(
+        Reflection, Reflection.course_id == Course.id
+    ).outerjoin(
+        ReflectionSubmission, submitted
+    ).filter(
+        Enrollment.student_id == user_id,
+        ReflectionSubmission.id.is_(None),
+        Reflection.due_date >= due_from
+    )
+    
+    if due_to:
+        query = query.filter(Reflection.due_date <= due_to)
     
-    for reflection in reflections:
-        if reflection.due_date and reflection.due_date >= now:
-            submission = ReflectionSubmission.query.filter_by(
-                reflection_id=reflection.id,
-                student_id=user_id
-            ).first()
-            
-            is_submitted = submission and submission.submitted_at is not None
-            
-            if not is_submitted or (reflection.due_date and reflection.due_date < now):
-                course = Course.query.get(reflection.course_id)
-                dashboard_data.append({
-                    'reflection_id': reflection.id,
-                    'reflection_name': reflection.name,
-                    'course_name': course.name,
-                    'course_code': course.course_code,
-                    'due_date': reflection.due_date.isoformat() if reflection.due_date else None,
-                    'is_overdue': reflection.due_date < now if reflection.due_date else False
-                })
-    
-    # Sort
     if sort_by == 'dates':
-        dashboard_data.sort(key=lambda x: x['due_date'] if x['due_date'] else '')
+        sort_key = [Reflection.due_date, Reflection.id]
     else:  # sort by courses
-        dashboard_data.sort(key=lambda x: (x['course_name'], x['reflection_name']))
+        sort_key = [Course.name, Reflection.name, Reflection.id]
+    
+    if cursor:
+        if len(cursor) != len(sort_key):
+            return jsonify({'error': 'Invalid cursor'}), 400
+        if sort_by == 'dates':
+            cursor[0] = datetime.fromisoformat(cursor[0])
+        query = query.filter(keyset_after(sort_key, cursor))
+    query = query.order_by(*sort_key)
+    
+    rows = query.limit(limit + 1).all() if limit else query.all()
+    
+    # (sort key, item) pairs; the sort key doubles as the cursor
+    entries = [(
+        (row.due_date, row.id) if sort_by == 'dates' else (row.course_name, row.name, row.id),
+        {
+            'reflection_id': row.id,
+            'reflection_name': row.name,
+            'course_name': row.course_name,
+            'course_code': row.course_code,
+            'due_date': row.due_date
+        }
+    ) for row in rows]
+    
+    # Occurrences of lazy courses that haven't been materialized aren't in the query above.
+    # They sort alongside it with the negated course id standing in for the reflection id.
+    virtual = _virtual_dashboard_entries(user_id, sort_by, due_from, due_to)
+    if cursor:
+        virtual = [entry for entry in virtual if entry[0] > tuple(cursor)]
+    if virtual:
+        entries = sorted(entries + virtual, key=lambda entry: entry[0])
+        if limit:
+            entries = entries[:limit + 1]
+    
+    has_more = bool(limit) and len(entries) > limit
+    entries = entries[:limit] if limit else entries
+    
+    dashboard_data = []
+    for _, item in entries:
+        due_date = item['due_date']
+        item['due_date'] = due_date.isoformat() if due_date else None
+        item['is_overdue'] = due_date < now if due_date else False
+        dashboard_data.append(item)
+    
+    result = {'reflections': dashboard_data}
+    if limit:
+        next_cursor = None
+        if has_more:
+            last_key = list(entries[-1][0])
+            if sort_by == 'dates':
+                last_key[0] = last_key[0].isoformat()
+            next_cursor = encode_cursor(last_key)
+        result['next_cursor'] = next_cursor
+    
+    return jsonify(result), 200
+
+def _virtual_dashboard_entries(user_id, sort_by, due_from, due_to):
+    """Dashboard entries for unopened occurrences of the student's lazy courses"""
+    courses = Course.query.join(Enrollment, Enrollment.course_id == Course.id).filter(
+        Enrollment.student_id == user_id,
+        Course.lazy_reflections.is_(True)
+    ).all()
+    if not courses:
+        return []
+    
+    materialized = {}
+    for course_id, start_date in db.session.query(Reflection.course_id, Reflection.start_date).filter(
+        Reflection.course_id.in_([c.id for c in courses])
+    ):
+        if start_date:
+            materialized.setdefault(course_id, set()).add(start_date.date())
     
-    return jsonify({'reflections': dashboard_data}), 200
+    entries = []
+    for course in courses:
+        for occurrence in virtual_occurrences(course, materialized.get(course.id, set())):
+            due_date = occurrence['due_date']
+            if due_date < due_from or (due_to and due_date > due_to):
+                continue
+            if sort_by == 'dates':
+                key = (due_date, -course.id)
+            else:
+                key = (course.name, occurrence['name'], -course.id)
+            entries.append((key, {
+                'reflection_id': None,
+                'virtual': True,
+                'course_id': course.id,
+                'occurrence_date': occurrence['occurrence_date'],
+                'reflection_name': occurrence['name'],
+                'course_name': course.name,
+                'course_code': course.course_code,
+                'due_date': due_date
+            }))
+    entries.sort(key=lambda entry: entry[0])
+    return entries
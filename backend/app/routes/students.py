@@ -1,31 +1,57 @@
 from flask import Blueprint, request, jsonify, session, send_file
 from ..models.models import db, User, Enrollment, Course
 from ..utils.auth_utils import teacher_required
+from ..serializers import USER_SUMMARY
+from ..utils.listing import Field, iso, parse_listing_args, search_clause, select_fields, render_many, row_key, apply_keyset, split_page
+from ..services.image_store import thumbnail_url
+from ..services.enrollment import bulk_enroll, iter_csv_rows, iter_json_rows
 import io
+import csv
 
 bp = Blueprint('students', __name__, url_prefix='/api/students')
 
+# Only the columns the roster shows; images are served separately as thumbnails
+STUDENT_FIELDS = {
+    'id': Field(User.id, None),
+    'name': Field(User.name, None),
+    'email': Field(User.email, None),
+    'profile_image': Field(User.profile_image_url, thumbnail_url),
+    'enrolled_at': Field(Enrollment.enrolled_at, iso)
+}
+
 @bp.route('/course/<int:course_id>', methods=['GET'])
 @teacher_required
 def get_course_students(course_id):
-    """Get all students enrolled in a course"""
+    """Get students enrolled in a course (supports search, limit, cursor, fields)"""
     course = Course.query.get_or_404(course_id)
     
     if course.teacher_id != session['user_id']:
         return jsonify({'error': 'Access denied'}), 403
     
-    enrollments = Enrollment.query.filter_by(course_id=course_id).all()
-    students = [e.student for e in enrollments]
-    
-    return jsonify({
-        'students': [{
-            'id': s.id,
-            'name': s.name,
-            'email': s.email,
-            'profile_image': s.profile_image,
-            'enrolled_at': Enrollment.query.filter_by(student_id=s.id, course_id=course_id).first().enrolled_at.isoformat()
-        } for s in students]
-    }), 200
+    try:
+        args = parse_listing_args(request.args, STUDENT_FIELDS)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    query = db.session.query(User.id).select_from(User).join(
+        Enrollment, Enrollment.student_id == User.id
+    ).filter(Enrollment.course_id == course_id)
+    
+    if args.search:
+        query = query.filter(search_clause(args.search, User.name, User.email))
+    
+    sort_key = [User.name, User.id]
+    query = query.with_entities(*select_fields(args.fields, STUDENT_FIELDS, sort_key))
+    try:
+        rows = apply_keyset(query, sort_key, args.limit, args.cursor).all()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    rows, next_cursor = split_page(rows, args.limit, lambda row: row_key(row, sort_key))
+    
+    result = {'students': render_many(rows, args.fields, STUDENT_FIELDS)}
+    if args.limit:
+        result['next_cursor'] = next_cursor
+    return jsonify(result), 200
 
 @bp.route('/course/<int:course_id>', methods=['POST'])
 @teacher_required
@@ -68,11 +94,7 @@ def add_student_to_course(course_id):
     
     return jsonify({
         'message': 'Student added successfully',
-        'student': {
-            'id': student.id,
-            'name': student.name,
-            'email': student.email
-        }
+        'student': USER_SUMMARY.only(('id', 'name', 'email')).dump(student)
     }), 201
 
 @bp.route('/course/<int:course_id>/bulk', methods=['POST'])
@@ -84,37 +106,45 @@ def bulk_add_students(course_id):
     if course.teacher_id != session['user_id']:
         return jsonify({'error': 'Access denied'}), 403
     
-    data = request.get_json()
-    students_data = data.get('students', [])
-    
-    added = 0
-    for student_info in students_data:
-        email = student_info.get('email')
-        if not email:
-            continue
-        
-        student = User.query.filter_by(email=email, role='student').first()
-        if not student:
-            # Create new student user
-            student = User(
-                email=email,
-                name=student_info.get('name', email.split('@')[0]),
-                google_id=f'manual_{email}',
-                role='student'
-            )
-            db.session.add(student)
-            db.session.flush()
-        
-        # Check if already enrolled
-        existing = Enrollment.query.filter_by(student_id=student.id, course_id=course_id).first()
-        if not existing:
-            enrollment = Enrollment(student_id=student.id, course_id=course_id)
-            db.session.add(enrollment)
-            added += 1
+    data = request.get_json(silent=True) or {}
+    students_data = data.get('students', []) if isinstance(data, dict) else None
+    if not isinstance(students_data, list):
+        return jsonify({'error': 'students must be a list'}), 400
     
-    db.session.commit()
+    results, summary = bulk_enroll(course_id, iter_json_rows(students_data))
+    added = summary.get('enrolled', 0)
+    
+    return jsonify({
+        'message': f'{added} students added successfully',
+        'summary': summary,
+        'results': results
+    }), 201
+
+@bp.route('/course/<int:course_id>/upload', methods=['POST'])
+@teacher_required
+def upload_students(course_id):
+    """Enroll students from an uploaded CSV file (see /sample-format)"""
+    course = Course.query.get_or_404(course_id)
+    
+    if course.teacher_id != session['user_id']:
+        return jsonify({'error': 'Access denied'}), 403
     
-    return jsonify({'message': f'{added} students added successfully'}), 201
+    upload = request.files.get('file')
+    if not upload:
+        return jsonify({'error': 'A CSV file is required'}), 400
+    
+    try:
+        results, summary = bulk_enroll(course_id, iter_csv_rows(upload.stream))
+    except (ValueError, UnicodeDecodeError, csv.Error) as e:
+        db.session.rollback()
+        return jsonify({'error': f'Could not read CSV: {str(e)}'}), 400
+    
+    added = summary.get('enrolled', 0)
+    return jsonify({
+        'message': f'{added} students added successfully',
+        'summary': summary,
+        'results': results
+    }), 201
 
 @bp.route('/<int:student_id>/course/<int:course_id>', methods=['DELETE'])
 @teacher_required
@@ -1,6 +1,15 @@
-from flask import Blueprint, jsonify, session
-from ..models.models import Course, Reflection, ReflectionSubmission, Enrollment
+from flask import Blueprint, request, jsonify, session, current_app
+from ..models.models import db, Course, Reflection, ReflectionStats, Enrollment, FeedbackBatch
 from ..utils.auth_utils import teacher_required
+from ..services.feedback_cache import get_cache_stats
+from ..services.ai_feedback import gemini
+from ..services.prompt_builder import get_prompt_stats
+from ..services.bulk_feedback import find_active_batch, start_feedback_batch, serialize_batch
+from ..services.schedule import virtual_occurrences
+from ..services.submission_search import search_submissions
+from ..utils.pagination import encode_cursor, decode_cursor, parse_limit
+from bisect import bisect_right
+from datetime import datetime
 
 bp = Blueprint('teacher', __name__, url_prefix='/api/teacher')
 
@@ -13,23 +22,136 @@ def get_course_overview(course_id):
     if course.teacher_id != session['user_id']:
         return jsonify({'error': 'Access denied'}), 403
     
-    reflections = Reflection.query.filter_by(course_id=course_id).all()
     total_students = Enrollment.query.filter_by(course_id=course_id).count()
     
-    overview_data = []
-    for reflection in reflections:
-        submissions_count = ReflectionSubmission.query.filter_by(
-            reflection_id=reflection.id
-        ).filter(ReflectionSubmission.submitted_at.isnot(None)).count()
-        
-        overview_data.append({
-            'reflection_name': reflection.name,
-            'reflections_received': submissions_count,
-            'total_enrolled_students': total_students
-        })
+    # Counters are maintained on submit/update, so this is a single read
+    rows = db.session.query(
+        Reflection.id,
+        Reflection.name,
+        Reflection.start_date,
+        ReflectionStats.submitted_count,
+        ReflectionStats.scored_count,
+        ReflectionStats.last_submitted_at
+    ).outerjoin(
+        ReflectionStats, ReflectionStats.reflection_id == Reflection.id
+    ).filter(
+        Reflection.course_id == course_id
+    ).order_by(Reflection.start_date, Reflection.id).all()
+    
+    overview_data = [{
+        'reflection_id': row.id,
+        'reflection_name': row.name,
+        'reflections_received': row.submitted_count or 0,
+        'reflections_scored': row.scored_count or 0,
+        'last_submitted_at': row.last_submitted_at.isoformat() if row.last_submitted_at else None,
+        'total_enrolled_students': total_students
+    } for row in rows]
+    
+    if course.lazy_reflections:
+        # Unopened occurrences have nothing submitted against them yet
+        materialized = {row.start_date.date() for row in rows if row.start_date}
+        starts = [row.start_date or datetime.min for row in rows]
+        for occurrence in virtual_occurrences(course, materialized):
+            position = bisect_right(starts, occurrence['start_date'])
+            starts.insert(position, occurrence['start_date'])
+            overview_data.insert(position, {
+                'reflection_id': None,
+                'virtual': True,
+                'occurrence_date': occurrence['occurrence_date'],
+                'reflection_name': occurrence['name'],
+                'reflections_received': 0,
+                'reflections_scored': 0,
+                'last_submitted_at': None,
+                'total_enrolled_students': total_students
+            })
     
     return jsonify({
         'overview': overview_data,
         'total_students': total_students,
-        'total_reflections': len(reflections)
+        'total_reflections': len(overview_data)
+    }), 200
+
+@bp.route('/course/<int:course_id>/search', methods=['GET'])
+@teacher_required
+def search_course_submissions(course_id):
+    """Full-text search over a course's submissions and their AI feedback, best match first"""
+    course = Course.query.get_or_404(course_id)
+    
+    if course.teacher_id != session['user_id']:
+        return jsonify({'error': 'Access denied'}), 403
+    
+    text = (request.args.get('q') or '').strip()
+    if not text:
+        return jsonify({'error': 'A search query (q) is required'}), 400
+    
+    try:
+        limit = parse_limit(request.args.get('limit'), default=20, maximum=100)
+        cursor = decode_cursor(request.args['cursor']) if request.args.get('cursor') else None
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if cursor and len(cursor) != 2:
+        return jsonify({'error': 'Invalid cursor'}), 400
+    
+    rows, has_more = search_submissions(course_id, text, limit, cursor)
+    
+    last = rows[-1] if rows else None
+    return jsonify({
+        'results': [{
+            'submission_id': row.submission_id,
+            'reflection_id': row.reflection_id,
+            'reflection_name': row.reflection_name,
+            'student_id': row.student_id,
+            'student_name': row.student_name,
+            'submission_date': row.submitted_at.isoformat() if row.submitted_at else None,
+            'score': row.score,
+            'rank': row.rank,
+            'snippet': row.snippet
+        } for row in rows],
+        'next_cursor': encode_cursor([last.rank, last.submission_id]) if has_more else None
     }), 200
+
+@bp.route('/reflection/<int:reflection_id>/regenerate-feedback', methods=['POST'])
+@teacher_required
+def regenerate_reflection_feedback(reflection_id):
+    """Regenerate AI feedback for every submission of a reflection in the background"""
+    reflection = Reflection.query.get_or_404(reflection_id)
+    course = Course.query.get(reflection.course_id)
+    
+    if course.teacher_id != session['user_id']:
+        return jsonify({'error': 'Access denied'}), 403
+    
+    active = find_active_batch(reflection_id, current_app.config['FEEDBACK_JOB_TIMEOUT'])
+    if active:
+        return jsonify({'error': 'Feedback is already being regenerated', 'batch': serialize_batch(active)}), 409
+    
+    data = request.get_json(silent=True) or {}
+    batch = FeedbackBatch(
+        reflection_id=reflection_id,
+        requested_by=session['user_id'],
+        force=bool(data.get('force', False))
+    )
+    db.session.add(batch)
+    db.session.commit()
+    
+    start_feedback_batch(current_app._get_current_object(), batch.id)
+    
+    return jsonify({'batch': serialize_batch(batch)}), 202
+
+@bp.route('/feedback-batches/<int:batch_id>', methods=['GET'])
+@teacher_required
+def get_feedback_batch(batch_id):
+    """Get progress of a feedback regeneration batch"""
+    batch = FeedbackBatch.query.get_or_404(batch_id)
+    reflection = Reflection.query.get(batch.reflection_id)
+    course = Course.query.get(reflection.course_id)
+    
+    if course.teacher_id != session['user_id']:
+        return jsonify({'error': 'Access denied'}), 403
+    
+    return jsonify({'batch': serialize_batch(batch)}), 200
+
+@bp.route('/ai/stats', methods=['GET'])
+@teacher_required
+def get_ai_stats():
+    """Get AI feedback cache, Gemini client and prompt size statistics for this process"""
+    return jsonify({'cache': get_cache_stats(), 'gemini': gemini.stats(), 'prompts': get_prompt_stats()}), 200
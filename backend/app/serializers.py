@@ -0,0 +1,89 @@
+from .utils.serialization import Serializer, iso
+
+
+def _is_set(value):
+    return value is not None
+
+
+# Users
+USER_SUMMARY = Serializer(
+    id='id',
+    email='email',
+    name='name',
+    role='role',
+    profile_image='profile_image_url'
+)
+
+USER_PROFILE = USER_SUMMARY.extend(
+    department='department',
+    experience='experience',
+    area_of_interest='area_of_interest',
+    student_id='student_id',
+    year_of_joining='year_of_joining'
+)
+
+# Courses
+COURSE_SUMMARY = Serializer(
+    id='id',
+    name='name',
+    course_code='course_code',
+    status='status'
+)
+
+COURSE_DETAIL = COURSE_SUMMARY.extend(
+    teacher_id='teacher_id',
+    framework='framework',
+    start_date=('start_date', iso),
+    end_date=('end_date', iso),
+    reflection_due_days='reflection_due_days',
+    recurrence_days='recurrence_days',
+    selected_days='selected_days',
+    custom_structure='custom_structure',
+    lazy_reflections=('lazy_reflections', bool)
+)
+
+# Reflections
+REFLECTION_DETAIL = Serializer(
+    id='id',
+    name='name',
+    number='number',
+    description='description',
+    start_date=('start_date', iso),
+    due_date=('due_date', iso),
+    structure_id='structure_id',
+    structure='structure',
+    course_id='course_id'
+)
+
+# Submissions, from query rows labeled as in get_reflection_submissions
+SUBMISSION_ROW = Serializer(
+    student_id='student_id',
+    student_name='student_name',
+    student_email='student_email',
+    submitted=('submitted_at', _is_set),
+    submission_date=('submitted_at', iso),
+    score='score',
+    display_feedback=('display_feedback', bool),
+    submission_id='submission_id'
+)
+
+SUBMISSION_ROW_WITH_CONTENT = SUBMISSION_ROW.extend(
+    content='content',
+    ai_feedback='ai_feedback'
+)
+
+SUBMISSION_ROW_WITHOUT_CONTENT = SUBMISSION_ROW.extend(
+    has_content=('has_content', bool),
+    has_feedback=('has_feedback', bool)
+)
+
+SUBMISSION_DETAIL = Serializer(
+    submission_id='id',
+    student_id='student_id',
+    submitted=('submitted_at', _is_set),
+    submission_date=('submitted_at', iso),
+    content='content',
+    ai_feedback='ai_feedback',
+    score='score',
+    display_feedback='display_feedback'
+)
@@ -1,15 +1,24 @@
 import os
-import google.generativeai as genai
-from typing import Optional
-import json
+from typing import Generator, Optional
+from .feedback_cache import make_cache_key, get_cached_feedback, store_feedback
+from .gemini_client import GeminiClient
+from .prompt_builder import build_feedback_prompt
+from .label_feedback import plan_label_feedback, finish_label_feedback
+from ..models.models import db
 
-# Configure Gemini API
-genai.configure(api_key=os.environ.get('GOOGLE_API_KEY'))
+GEMINI_MODEL = os.environ.get('GEMINI_MODEL', 'gemini-2.0-flash-exp')
+
+# Shared by every request and worker thread in this process
+gemini = GeminiClient(GEMINI_MODEL)
+
+# Generic feedback for when Gemini fails or returns nothing
+FALLBACK_FEEDBACK = "Thank you for your thoughtful reflection. Keep up the great work!"
 
 def generate_reflection_feedback(
     reflection_content: str,
     framework: Optional[str] = None,
-    structure: Optional[str] = None
+    use_cache: bool = True,
+    use_fallback: bool = True
 ) -> str:
     """
     Generate AI-powered feedback for student reflection submissions using Google Gemini.
@@ -17,51 +26,126 @@ def generate_reflection_feedback(
     Args:
         reflection_content: The student's reflection text (may be JSON structured)
         framework: The reflection framework being used (e.g., "Bloom's Taxonomy", "5 WHYs", "1-H")
-        structure: The custom structure as JSON string containing field labels
+        use_cache: Whether a cached result may be returned instead of calling Gemini
+        use_fallback: Return generic feedback if Gemini fails, instead of raising the error
     
     Returns:
         AI-generated feedback text
     """
+    # Identical content under the same framework and model gets the same feedback
+    cache_key = make_cache_key(reflection_content, framework, GEMINI_MODEL)
+    cached = get_cached_feedback(cache_key) if use_cache else None
+    if cached is not None:
+        return cached
+    
     try:
-        # Parse reflection content if it's structured
-        reflection_text = ""
-        try:
-            content_data = json.loads(reflection_content)
-            if isinstance(content_data, list) and len(content_data) > 0 and 'label' in content_data[0]:
-                # Structured format: convert to readable text
-                reflection_text = "\n\n".join([
-                    f"{item['label']}:\n{item['response']}"
-                    for item in content_data
-                ])
-            else:
-                reflection_text = reflection_content
-        except (json.JSONDecodeError, TypeError):
-            # Plain text format
-            reflection_text = reflection_content
-        
-        # Build context-aware prompt
-        prompt = f"""You are an Educational reflection feedback expert analyzing a student's reflection journal entry. You need to evaluate the feedback based on the configuration framework chosen by the educator."""
-        
-        if framework:
-            prompt += f" The framework chosen by the educator is '{framework}'."
-        
-        prompt += f"""\n\nYou have to provide feedback separately for each question/label of the reflection. Also, provide constructive, encouraging, specific feedback that can help the student improve and deepen their learning.
-
-Student's Reflection:
-{reflection_text}
-
-Please provide your feedback addressing each question/label separately, highlighting what the student did well and suggesting areas for improvement and deeper exploration."""
+        prompt = build_feedback_prompt(reflection_content, framework)
 
-        # Call Gemini API
-        model = genai.GenerativeModel('gemini-2.0-flash-exp')
-        response = model.generate_content(prompt)
+        # Call Gemini API (bounded by GEMINI_TIMEOUT; fails fast while the circuit breaker is open)
+        feedback = gemini.generate(prompt)
         
-        if response and response.text:
-            return response.text.strip()
+        if feedback:
+            store_feedback(cache_key, feedback, GEMINI_MODEL)
+            return feedback
         else:
-            return "Thank you for your thoughtful reflection. Keep up the great work!"
+            return FALLBACK_FEEDBACK
             
     except Exception as e:
         print(f"Error generating AI feedback: {str(e)}")
-        # Fallback to generic positive feedback
-        return "Great reflection! Consider elaborating more on your learning outcomes and connecting your insights to real-world applications."
+        if not use_fallback:
+            raise
+        return FALLBACK_FEEDBACK
+
+def stream_reflection_feedback(
+    reflection_content: str,
+    framework: Optional[str] = None,
+    use_cache: bool = True
+) -> Generator[str, None, str]:
+    """
+    Generate feedback like generate_reflection_feedback(), yielding text as Gemini produces it.
+    
+    A cached result is yielded as a single chunk. The complete text is cached once
+    the stream finishes, and is the generator's return value. Unlike
+    generate_reflection_feedback(), errors are raised (possibly after some chunks)
+    rather than replaced with fallback text, so the caller can hand the job back
+    to the background worker.
+    """
+    cache_key = make_cache_key(reflection_content, framework, GEMINI_MODEL)
+    cached = get_cached_feedback(cache_key) if use_cache else None
+    if cached is not None:
+        yield cached
+        return cached
+    
+    chunks = []
+    for chunk in gemini.generate_stream(build_feedback_prompt(reflection_content, framework)):
+        chunks.append(chunk)
+        yield chunk
+    
+    feedback = ''.join(chunks).strip()
+    if feedback:
+        store_feedback(cache_key, feedback, GEMINI_MODEL)
+    return feedback
+
+def _plan(submission_id, reflection_content, framework, use_cache):
+    # Don't hold a connection we opened just for the plan while waiting on the LLM
+    owns_transaction = not db.session().in_transaction()
+    plan = plan_label_feedback(submission_id, reflection_content, framework, GEMINI_MODEL, force=not use_cache)
+    if owns_transaction:
+        db.session.commit()
+    return plan
+
+def generate_submission_feedback(
+    submission_id: Optional[int],
+    reflection_content: str,
+    framework: Optional[str] = None,
+    use_cache: bool = True,
+    use_fallback: bool = True
+) -> str:
+    """
+    Generate feedback for a stored submission.
+    
+    Structured content is handled label by label: labels whose response is
+    unchanged since the last feedback reuse it, and the rest are sent to Gemini
+    together in one call. The per-label results are added to the session for
+    the caller to commit. Plain-text content falls back to
+    generate_reflection_feedback(). `use_cache=False` regenerates every label;
+    `use_fallback=False` raises Gemini errors instead of returning generic feedback.
+    """
+    plan = _plan(submission_id, reflection_content, framework, use_cache)
+    if plan is None:
+        return generate_reflection_feedback(reflection_content, framework, use_cache, use_fallback)
+    
+    reply = None
+    if plan.prompt:
+        try:
+            reply = gemini.generate(plan.prompt)
+        except Exception as e:
+            print(f"Error generating AI feedback: {str(e)}")
+            if not use_fallback:
+                raise
+            return FALLBACK_FEEDBACK
+        print(f"[AI] Generated feedback for {len(plan.changed)} of {len(plan.labels)} labels")
+    return finish_label_feedback(plan, reply)
+
+def stream_submission_feedback(
+    submission_id: Optional[int],
+    reflection_content: str,
+    framework: Optional[str] = None,
+    use_cache: bool = True
+) -> Generator[str, None, str]:
+    """
+    Streaming counterpart of generate_submission_feedback(). Yields the text
+    generated for the changed labels and returns the full merged feedback.
+    """
+    plan = _plan(submission_id, reflection_content, framework, use_cache)
+    if plan is None:
+        return (yield from stream_reflection_feedback(reflection_content, framework, use_cache))
+    
+    reply = None
+    if plan.prompt:
+        chunks = []
+        for chunk in gemini.generate_stream(plan.prompt):
+            chunks.append(chunk)
+            yield chunk
+        reply = ''.join(chunks)
+    return finish_label_feedback(plan, reply)
@@ -0,0 +1,188 @@
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+from sqlalchemy import update, bindparam
+from ..models.models import db, FeedbackBatch, ReflectionSubmission, Reflection, Course
+from .ai_feedback import generate_submission_feedback
+from ..utils.versioning import bump_versions
+
+
+class RateLimiter:
+    """Thread-safe token bucket allowing `rate` calls per second with bursts up to `burst`"""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst if burst is not None else max(1, int(rate))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def configure(self, rate, burst=None):
+        with self._lock:
+            self.rate = rate
+            self.capacity = burst if burst is not None else max(1, int(rate))
+            self._tokens = min(self._tokens, self.capacity)
+
+    def acquire(self):
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+# Shared by every batch in this process, so concurrent batches can't multiply the Gemini rate
+rate_limiter = RateLimiter(rate=5)
+
+
+def serialize_batch(batch):
+    """Public view of a batch for progress polling"""
+    return {
+        'id': batch.id,
+        'reflection_id': batch.reflection_id,
+        'status': batch.status,
+        'total': batch.total,
+        'completed': batch.completed,
+        'failed': batch.failed,
+        'progress': round((batch.completed + batch.failed) / batch.total, 4) if batch.total else None,
+        'created_at': batch.created_at.isoformat() if batch.created_at else None,
+        'started_at': batch.started_at.isoformat() if batch.started_at else None,
+        'finished_at': batch.finished_at.isoformat() if batch.finished_at else None
+    }
+
+
+def find_active_batch(reflection_id, stale_after_seconds):
+    """Return the batch currently working on a reflection, ignoring ones that stopped reporting progress"""
+    cutoff = datetime.utcnow() - timedelta(seconds=stale_after_seconds)
+    return FeedbackBatch.query.filter(
+        FeedbackBatch.reflection_id == reflection_id,
+        FeedbackBatch.status.in_(['pending', 'running']),
+        FeedbackBatch.updated_at >= cutoff
+    ).first()
+
+
+def start_feedback_batch(app, batch_id):
+    """Run a batch on a background thread"""
+    thread = threading.Thread(
+        target=_run_in_context,
+        args=(app, batch_id),
+        name=f'feedback-batch-{batch_id}',
+        daemon=True
+    )
+    thread.start()
+    return thread
+
+
+def _run_in_context(app, batch_id):
+    rate_limiter.configure(app.config['BULK_FEEDBACK_RATE'])
+    with app.app_context():
+        try:
+            run_feedback_batch(
+                app,
+                batch_id,
+                max_workers=app.config['BULK_FEEDBACK_WORKERS'],
+                commit_every=app.config['BULK_FEEDBACK_COMMIT_EVERY']
+            )
+        except Exception as e:
+            db.session.rollback()
+            print(f"[BATCH] Feedback batch {batch_id} failed: {str(e)}")
+            batch = FeedbackBatch.query.get(batch_id)
+            if batch:
+                batch.status = 'failed'
+                batch.error = str(e)
+                batch.finished_at = datetime.utcnow()
+                db.session.commit()
+        finally:
+            db.session.remove()
+
+
+def run_feedback_batch(app, batch_id, max_workers=8, commit_every=25):
+    """Regenerate feedback for every submitted entry of a reflection"""
+    batch = FeedbackBatch.query.get(batch_id)
+    reflection = Reflection.query.get(batch.reflection_id)
+    course = Course.query.get(reflection.course_id)
+    framework = course.framework if course else None
+    use_cache = not batch.force
+
+    rows = db.session.query(
+        ReflectionSubmission.id,
+        ReflectionSubmission.student_id,
+        ReflectionSubmission.content,
+        ReflectionSubmission.submitted_at
+    ).filter(
+        ReflectionSubmission.reflection_id == reflection.id,
+        ReflectionSubmission.submitted_at.isnot(None),
+        ReflectionSubmission.content.isnot(None)
+    ).all()
+
+    students = {row.id: row.student_id for row in rows}
+    batch.total = len(rows)
+    batch.status = 'running'
+    batch.started_at = datetime.utcnow()
+    db.session.commit()
+    print(f"[BATCH] Regenerating feedback for {len(rows)} submissions of reflection {reflection.id}")
+
+    table = ReflectionSubmission.__table__
+    # Skip rows the student resubmitted while the batch was running
+    write_feedback = update(table).where(
+        table.c.id == bindparam('b_id'),
+        table.c.submitted_at == bindparam('b_submitted_at')
+    ).values(ai_feedback=bindparam('b_feedback'))
+
+    def generate(row):
+        rate_limiter.acquire()
+        with app.app_context():
+            # A failure raises, so the row keeps its current feedback and counts as failed
+            feedback = generate_submission_feedback(
+                row.id,
+                reflection_content=row.content,
+                framework=framework,
+                use_cache=use_cache,
+                use_fallback=False
+            )
+            # Per-label feedback rows written for this submission
+            db.session.commit()
+            return feedback
+
+    pending = []
+    failed = 0
+
+    def flush():
+        if pending:
+            db.session.execute(write_feedback, pending)
+            # Core UPDATEs skip the flush hook that keeps the students' ETags current
+            bump_versions(db.session.connection(), [('user', students[item['b_id']]) for item in pending])
+        batch.completed += len(pending)
+        batch.failed += failed
+        db.session.commit()
+        pending.clear()
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f'feedback-batch-{batch_id}') as pool:
+        futures = {pool.submit(generate, row): row for row in rows}
+        for future in as_completed(futures):
+            row = futures[future]
+            try:
+                feedback = future.result()
+            except Exception as e:
+                print(f"[BATCH] Failed to regenerate feedback for submission {row.id}: {str(e)}")
+                failed += 1
+            else:
+                pending.append({'b_id': row.id, 'b_submitted_at': row.submitted_at, 'b_feedback': feedback})
+
+            if len(pending) + failed >= commit_every:
+                flush()
+                failed = 0
+
+    flush()
+    batch.status = 'done'
+    batch.finished_at = datetime.utcnow()
+    db.session.commit()
+    print(f"[BATCH] Feedback batch {batch_id} finished: {batch.completed} regenerated, {batch.failed} failed")
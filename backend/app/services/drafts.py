@@ -0,0 +1,206 @@
+import os
+import atexit
+import threading
+from datetime import datetime
+from sqlalchemy import and_, bindparam
+from ..models.models import db, SubmissionDraft
+from ..utils.db_utils import insert_ignore
+
+MAX_OPS = 100  # Per PATCH request
+_buffer = None
+
+
+def parse_draft_patch(operations, max_chars):
+    """
+    Turn JSON-patch style operations into {label: response, or None for removed}.
+
+    Each operation targets one label through a single-segment JSON Pointer,
+    e.g. {"op": "replace", "path": "/What did you learn?", "value": "..."}.
+    "add" and "replace" set the label's text, "remove" clears it. The path "/"
+    addresses the text of a plain (unstructured) reflection. Later operations
+    on the same label win. Raises ValueError for anything malformed.
+    """
+    if not isinstance(operations, list) or not operations:
+        raise ValueError('Expected a non-empty list of operations')
+    if len(operations) > MAX_OPS:
+        raise ValueError(f'At most {MAX_OPS} operations per request')
+
+    changes = {}
+    for operation in operations:
+        if not isinstance(operation, dict):
+            raise ValueError('Each operation must be an object')
+        op = operation.get('op')
+        path = operation.get('path')
+        if not isinstance(path, str) or not path.startswith('/') or '/' in path[1:]:
+            raise ValueError(f'Invalid path: {path!r}')
+        label = path[1:].replace('~1', '/').replace('~0', '~')
+
+        if op in ('add', 'replace'):
+            value = operation.get('value')
+            if not isinstance(value, str):
+                raise ValueError(f'Value for {path!r} must be a string')
+            if len(value) > max_chars:
+                raise ValueError(f'Value for {path!r} is longer than {max_chars} characters')
+            changes[label] = value
+        elif op == 'remove':
+            changes[label] = None
+        else:
+            raise ValueError(f'Unsupported operation: {op!r}')
+    return changes
+
+
+class DraftBuffer:
+    """
+    Per-process buffer that coalesces autosaves before they reach the database.
+
+    Changes are kept per (reflection, student, label), so a burst of saves while
+    a student types becomes a single row write. A background thread flushes
+    every `interval` seconds, or as soon as `max_pending` labels are waiting.
+    Rows carry the time the change was received, and a flush never replaces a
+    newer row, so buffers in several worker processes can't reorder saves.
+    """
+
+    def __init__(self, app, interval=2.0, max_pending=500):
+        self.app = app
+        self.interval = interval
+        self.max_pending = max_pending
+        self._pending = {}  # (reflection_id, student_id) -> {label: (response, received_at)}
+        self._count = 0
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._pid = None
+
+    def add(self, reflection_id, student_id, changes):
+        received_at = datetime.utcnow()
+        with self._lock:
+            entry = self._pending.setdefault((reflection_id, student_id), {})
+            for label, response in changes.items():
+                if label not in entry:
+                    self._count += 1
+                entry[label] = (response, received_at)
+            full = self._count >= self.max_pending
+        self._ensure_running()
+        if full:
+            self._wakeup.set()
+
+    def pending_for(self, reflection_id, student_id):
+        """Unflushed changes for one student's reflection: {label: (response, received_at)}"""
+        with self._lock:
+            return dict(self._pending.get((reflection_id, student_id), {}))
+
+    def discard(self, reflection_id, student_id):
+        with self._lock:
+            self._count -= len(self._pending.pop((reflection_id, student_id), {}))
+
+    def _ensure_running(self):
+        # Threads don't survive fork, so each worker process starts its own flusher
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._pid = os.getpid()
+                    self._thread = threading.Thread(target=self._run, name='draft-flusher', daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def flush(self):
+        """Write all buffered changes in one transaction"""
+        with self._lock:
+            pending, self._pending, self._count = self._pending, {}, 0
+        if not pending:
+            return
+
+        rows = [
+            {'b_reflection_id': reflection_id, 'b_student_id': student_id, 'b_label': label,
+             'b_response': response, 'b_updated_at': received_at}
+            for (reflection_id, student_id), labels in pending.items()
+            for label, (response, received_at) in labels.items()
+        ]
+        table = SubmissionDraft.__table__
+        try:
+            with self.app.app_context():
+                conn = db.session.connection()
+                # Drop the rows these changes supersede; rows written later by another process stay,
+                # and the insert below then skips the older change
+                conn.execute(table.delete().where(and_(
+                    table.c.reflection_id == bindparam('b_reflection_id'),
+                    table.c.student_id == bindparam('b_student_id'),
+                    table.c.label == bindparam('b_label'),
+                    table.c.updated_at <= bindparam('b_updated_at')
+                )), rows)
+                conn.execute(insert_ignore(table, conn.dialect.name).values(
+                    reflection_id=bindparam('b_reflection_id'),
+                    student_id=bindparam('b_student_id'),
+                    label=bindparam('b_label'),
+                    response=bindparam('b_response'),
+                    updated_at=bindparam('b_updated_at')
+                ), rows)
+                db.session.commit()
+        except Exception as e:
+            print(f"[DRAFTS] Flush of {len(rows)} draft changes failed: {str(e)}")
+            self._requeue(pending)
+
+    def _requeue(self, pending):
+        # Keep failed changes for the next flush unless newer ones arrived meanwhile
+        with self._lock:
+            for key, labels in pending.items():
+                entry = self._pending.setdefault(key, {})
+                for label, change in labels.items():
+                    if label not in entry:
+                        entry[label] = change
+                        self._count += 1
+
+
+def init_draft_buffer(app):
+    """Create the process-wide draft buffer; its flusher starts with the first save"""
+    global _buffer
+    if _buffer is None:
+        _buffer = DraftBuffer(
+            app,
+            interval=app.config['DRAFT_FLUSH_INTERVAL'],
+            max_pending=app.config['DRAFT_FLUSH_SIZE']
+        )
+        # Don't lose the last few seconds of typing on a clean shutdown
+        atexit.register(_buffer.flush)
+    return _buffer
+
+
+def save_draft_changes(reflection_id, student_id, changes):
+    _buffer.add(reflection_id, student_id, changes)
+
+
+def load_draft(reflection_id, student_id, since=None):
+    """
+    The student's current draft as {label: response}, including changes not flushed yet.
+
+    Rows older than `since` (the last submission) are ignored, as are labels
+    whose latest change removed them.
+    """
+    query = db.session.query(SubmissionDraft.label, SubmissionDraft.response, SubmissionDraft.updated_at).filter(
+        SubmissionDraft.reflection_id == reflection_id,
+        SubmissionDraft.student_id == student_id
+    )
+    if since:
+        query = query.filter(SubmissionDraft.updated_at > since)
+    latest = {row.label: (row.response, row.updated_at) for row in query}
+
+    for label, (response, received_at) in _buffer.pending_for(reflection_id, student_id).items():
+        if since and received_at <= since:
+            continue
+        if label not in latest or latest[label][1] <= received_at:
+            latest[label] = (response, received_at)
+
+    draft = {label: response for label, (response, _) in latest.items() if response is not None}
+    updated_at = max((received_at for _, received_at in latest.values()), default=None)
+    return draft, updated_at
+
+
+def clear_draft(reflection_id, student_id):
+    """Drop a student's draft once the reflection is submitted; the caller commits"""
+    _buffer.discard(reflection_id, student_id)
+    SubmissionDraft.query.filter_by(reflection_id=reflection_id, student_id=student_id).delete(synchronize_session=False)
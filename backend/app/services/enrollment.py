@@ -0,0 +1,155 @@
+import io
+import re
+import csv
+from datetime import datetime
+from itertools import islice
+from ..models.models import db, User, Enrollment
+from ..utils.db_utils import insert_ignore
+from ..utils.versioning import bump_versions
+
+CHUNK_SIZE = 500
+EMAIL_PATTERN = re.compile(r'^[^@\s]+@[^@\s]+$')
+
+
+def iter_csv_rows(stream):
+    """
+    Yield (row_number, {'name', 'email'}) from an uploaded CSV without loading it whole.
+
+    Expects the header from the sample format (name,email); header matching is
+    case-insensitive and a UTF-8 BOM is tolerated.
+    """
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    reader = csv.DictReader(text)
+    if reader.fieldnames is None:
+        return
+    reader.fieldnames = [(name or '').strip().lower() for name in reader.fieldnames]
+    if 'email' not in reader.fieldnames:
+        raise ValueError('CSV must have an "email" column')
+
+    # Row 1 is the header
+    for row_number, row in enumerate(reader, start=2):
+        yield row_number, {'name': row.get('name'), 'email': row.get('email')}
+
+
+def iter_json_rows(students):
+    """
+    Adapt the JSON payload of the bulk endpoint to the same row format.
+
+    Items that aren't objects with string (or missing) name and email come
+    through with an 'error', so they are reported as invalid rows.
+    """
+    for row_number, student in enumerate(students, start=1):
+        if not isinstance(student, dict):
+            yield row_number, {'name': None, 'email': None, 'error': 'Expected an object with name and email'}
+            continue
+        row = {'name': student.get('name'), 'email': student.get('email')}
+        if not all(value is None or isinstance(value, str) for value in row.values()):
+            row['error'] = 'Name and email must be strings'
+        yield row_number, row
+
+
+def _chunks(rows, size):
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def bulk_enroll(course_id, rows):
+    """
+    Create missing student accounts and enroll them in a course, CHUNK_SIZE rows at a time.
+
+    Each chunk costs a fixed handful of statements: one IN lookup for users,
+    one multi-row insert for new users, one IN lookup for enrollments and one
+    multi-row insert for new enrollments. Inserts skip conflicting rows, so
+    concurrent imports of the same roster don't fail.
+
+    Returns a per-row report (in input order) and summary counts.
+    """
+    report = []
+    seen = set()
+    for chunk in _chunks(rows, CHUNK_SIZE):
+        report.extend(_enroll_chunk(course_id, chunk, seen))
+    db.session.commit()
+
+    summary = {}
+    for result in report:
+        summary[result['status']] = summary.get(result['status'], 0) + 1
+    summary['created_users'] = sum(1 for result in report if result.get('user_created'))
+    return report, summary
+
+
+def _enroll_chunk(course_id, chunk, seen):
+    dialect = db.session.get_bind().dialect.name
+    now = datetime.utcnow()
+    results = {}
+    candidates = []
+
+    for row_number, row in chunk:
+        if row.get('error'):
+            results[row_number] = {'row': row_number, 'email': None, 'status': 'invalid', 'error': row['error']}
+            continue
+        email = (row.get('email') or '').strip()
+        name = (row.get('name') or '').strip()
+        if not EMAIL_PATTERN.match(email):
+            results[row_number] = {'row': row_number, 'email': email or None, 'status': 'invalid', 'error': 'Invalid email'}
+        elif email in seen:
+            results[row_number] = {'row': row_number, 'email': email, 'status': 'duplicate'}
+        else:
+            seen.add(email)
+            candidates.append((row_number, email, name or email.split('@')[0]))
+
+    emails = [email for _, email, _ in candidates]
+    users = {
+        row.email: row for row in
+        db.session.query(User.id, User.email, User.role).filter(User.email.in_(emails))
+    } if emails else {}
+
+    missing = [(email, name) for _, email, name in candidates if email not in users]
+    created = set()
+    if missing:
+        # Only the rows this statement inserted come back; a concurrent import may have created the rest
+        created = set(db.session.scalars(insert_ignore(User.__table__, dialect).returning(User.__table__.c.email), [{
+            'email': email,
+            'name': name,
+            'google_id': f'manual_{email}',
+            'role': 'student',
+            'created_at': now
+        } for email, name in missing]))
+        for row in db.session.query(User.id, User.email, User.role).filter(User.email.in_([e for e, _ in missing])):
+            users[row.email] = row
+
+    student_ids = [users[email].id for email in emails if email in users and users[email].role == 'student']
+    enrolled = {
+        row.student_id for row in
+        db.session.query(Enrollment.student_id).filter(
+            Enrollment.course_id == course_id,
+            Enrollment.student_id.in_(student_ids)
+        )
+    } if student_ids else set()
+
+    new_enrollments = [student_id for student_id in student_ids if student_id not in enrolled]
+    if new_enrollments:
+        db.session.execute(insert_ignore(Enrollment.__table__, dialect), [{
+            'student_id': student_id,
+            'course_id': course_id,
+            'enrolled_at': now
+        } for student_id in new_enrollments])
+        bump_versions(db.session.connection(), [('course', course_id)] + [('user', student_id) for student_id in new_enrollments])
+
+    for row_number, email, _ in candidates:
+        user = users.get(email)
+        if not user:
+            result = {'status': 'error', 'error': 'Could not create user'}
+        elif user.role != 'student':
+            result = {'status': 'not_student', 'error': f'{email} is registered as a {user.role}'}
+        elif user.id in enrolled:
+            result = {'status': 'already_enrolled', 'student_id': user.id}
+        else:
+            result = {'status': 'enrolled', 'student_id': user.id}
+        result.update({'row': row_number, 'email': email, 'user_created': email in created})
+        results[row_number] = result
+
+    return [results[row_number] for row_number, _ in chunk]
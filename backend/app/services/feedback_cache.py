@@ -0,0 +1,163 @@
+import os
+import re
+import json
+import hashlib
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from cachetools import TTLCache
+from sqlalchemy import select, update, delete, func
+from ..models.models import db, FeedbackCacheEntry
+from ..utils.db_utils import insert_ignore
+from .prompt_builder import parse_sections
+
+# Cache settings
+MEMORY_CACHE_SIZE = int(os.environ.get('FEEDBACK_CACHE_SIZE', 1024))
+DB_CACHE_MAX_ENTRIES = int(os.environ.get('FEEDBACK_CACHE_DB_MAX_ENTRIES', 50000))
+CACHE_TTL_SECONDS = int(os.environ.get('FEEDBACK_CACHE_TTL', 7 * 24 * 3600))
+PRUNE_EVERY = 100  # Stores between DB eviction passes
+
+_memory = TTLCache(maxsize=MEMORY_CACHE_SIZE, ttl=CACHE_TTL_SECONDS)
+_lock = threading.Lock()
+_stats = {'memory_hits': 0, 'db_hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0}
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+def _normalize(text):
+    return _WHITESPACE.sub(' ', text or '').strip()
+
+
+def normalize_content(reflection_content):
+    """Canonical text for a submission, so formatting-only changes hit the same entry"""
+    sections = parse_sections(reflection_content)
+    if sections[0][0] is None:
+        return _normalize(reflection_content)
+    return '\n'.join(f"{_normalize(label)}: {_normalize(response)}" for label, response in sections)
+
+
+def make_cache_key(reflection_content, framework, model_name):
+    payload = json.dumps([model_name, framework or '', normalize_content(reflection_content)])
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _count(stat, amount=1):
+    with _lock:
+        _stats[stat] += amount
+
+
+@contextmanager
+def _cache_connection():
+    """
+    Connection for cache reads and writes.
+
+    A caller already in a transaction (a synchronous submit, a job storing its
+    result) shares its connection through a savepoint: a second connection
+    would wait on that transaction's write lock on SQLite. A failed cache write
+    only rolls back the savepoint. Otherwise the cache uses a short transaction
+    of its own, so it never leaves one open for the caller.
+    """
+    session = db.session()
+    if session.in_transaction():
+        with session.begin_nested():
+            yield session.connection()
+    else:
+        with db.engine.begin() as conn:
+            yield conn
+
+
+def get_cached_feedback(key):
+    """Look up feedback in memory first, then in the database"""
+    with _lock:
+        feedback = _memory.get(key)
+    if feedback is not None:
+        _count('memory_hits')
+        return feedback
+
+    cutoff = datetime.utcnow() - timedelta(seconds=CACHE_TTL_SECONDS)
+    table = FeedbackCacheEntry.__table__
+    try:
+        with _cache_connection() as conn:
+            feedback = conn.execute(
+                select(table.c.feedback).where(table.c.key == key, table.c.created_at >= cutoff)
+            ).scalar()
+            if feedback is not None:
+                conn.execute(
+                    update(table).where(table.c.key == key).values(
+                        hit_count=table.c.hit_count + 1,
+                        last_used_at=datetime.utcnow()
+                    )
+                )
+    except Exception as e:
+        print(f"[AI] Feedback cache lookup failed: {str(e)}")
+        feedback = None
+
+    if feedback is None:
+        _count('misses')
+        return None
+
+    _count('db_hits')
+    with _lock:
+        _memory[key] = feedback
+    return feedback
+
+
+def store_feedback(key, feedback, model_name):
+    """Write generated feedback to both cache tiers"""
+    with _lock:
+        _memory[key] = feedback
+        _stats['stores'] += 1
+        should_prune = _stats['stores'] % PRUNE_EVERY == 0
+
+    now = datetime.utcnow()
+    table = FeedbackCacheEntry.__table__
+    try:
+        with _cache_connection() as conn:
+            conn.execute(table.delete().where(table.c.key == key))
+            conn.execute(
+                insert_ignore(table, conn.dialect.name).values(
+                    key=key,
+                    model=model_name,
+                    feedback=feedback,
+                    hit_count=0,
+                    created_at=now,
+                    last_used_at=now
+                )
+            )
+    except Exception as e:
+        print(f"[AI] Feedback cache store failed: {str(e)}")
+        return
+
+    if should_prune:
+        prune_cache()
+
+
+def prune_cache():
+    """Drop expired DB entries, then the least recently used ones beyond the size cap"""
+    table = FeedbackCacheEntry.__table__
+    cutoff = datetime.utcnow() - timedelta(seconds=CACHE_TTL_SECONDS)
+    try:
+        with _cache_connection() as conn:
+            evicted = conn.execute(delete(table).where(table.c.created_at < cutoff)).rowcount
+
+            total = conn.execute(select(func.count()).select_from(table)).scalar()
+            overflow = total - DB_CACHE_MAX_ENTRIES
+            if overflow > 0:
+                oldest = select(table.c.key).order_by(table.c.last_used_at).limit(overflow)
+                evicted += conn.execute(delete(table).where(table.c.key.in_(oldest))).rowcount
+    except Exception as e:
+        print(f"[AI] Feedback cache prune failed: {str(e)}")
+        return
+
+    if evicted:
+        _count('evictions', evicted)
+        print(f"[AI] Evicted {evicted} feedback cache entries")
+
+
+def get_cache_stats():
+    with _lock:
+        stats = dict(_stats)
+        stats['memory_entries'] = len(_memory)
+    lookups = stats['memory_hits'] + stats['db_hits'] + stats['misses']
+    stats['hit_rate'] = round((stats['memory_hits'] + stats['db_hits']) / lookups, 4) if lookups else None
+    return stats
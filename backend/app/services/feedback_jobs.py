@@ -0,0 +1,292 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from ..models.models import db, FeedbackJob, ReflectionSubmission, Reflection, Course
+from .ai_feedback import generate_submission_feedback, stream_submission_feedback, FALLBACK_FEEDBACK
+
+# Set whenever a job is enqueued so the dispatcher doesn't wait for the next poll
+_wakeup = threading.Event()
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def enqueue_feedback_job(submission_id, delay_seconds=0):
+    """
+    Queue AI feedback generation for a submission.
+
+    The job is added to the current session and becomes visible to workers
+    once the caller commits. Any older job still waiting for the same
+    submission is dropped, since it would only produce feedback for stale content.
+    """
+    FeedbackJob.query.filter_by(
+        submission_id=submission_id,
+        status='pending'
+    ).delete(synchronize_session=False)
+
+    job = FeedbackJob(
+        submission_id=submission_id,
+        status='pending',
+        run_after=datetime.utcnow() + timedelta(seconds=delay_seconds)
+    )
+    db.session.add(job)
+    return job
+
+
+def notify_worker():
+    """Wake the dispatcher so a freshly committed job is picked up immediately"""
+    _wakeup.set()
+
+
+def serialize_job(job):
+    """Public view of a job for status polling"""
+    return {
+        'id': job.id,
+        'submission_id': job.submission_id,
+        'status': job.status,
+        'attempts': job.attempts,
+        'created_at': job.created_at.isoformat() if job.created_at else None,
+        'started_at': job.started_at.isoformat() if job.started_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None
+    }
+
+
+def claim_job(job_id):
+    """Atomically move a pending job to running. Returns True if this caller won the job."""
+    claimed = FeedbackJob.query.filter_by(id=job_id, status='pending').update({
+        'status': 'running',
+        'started_at': datetime.utcnow(),
+        'attempts': FeedbackJob.attempts + 1
+    }, synchronize_session=False)
+    db.session.commit()
+    return claimed == 1
+
+
+def claim_next_job():
+    """Claim the oldest runnable job, or return None if the queue is empty"""
+    while True:
+        candidate = db.session.query(FeedbackJob.id).filter(
+            FeedbackJob.status == 'pending',
+            FeedbackJob.run_after <= datetime.utcnow()
+        ).order_by(FeedbackJob.run_after, FeedbackJob.id).first()
+
+        if not candidate:
+            db.session.commit()
+            return None
+
+        # Another worker may have claimed it between the select and the update
+        if claim_job(candidate.id):
+            return candidate.id
+
+
+def requeue_stale_jobs(stale_after_seconds):
+    """Return jobs whose worker died mid-run to the queue"""
+    cutoff = datetime.utcnow() - timedelta(seconds=stale_after_seconds)
+    requeued = FeedbackJob.query.filter(
+        FeedbackJob.status == 'running',
+        FeedbackJob.started_at < cutoff
+    ).update({'status': 'pending', 'run_after': datetime.utcnow()}, synchronize_session=False)
+    db.session.commit()
+    if requeued:
+        print(f"[JOBS] Requeued {requeued} stale feedback jobs")
+
+
+def _job_input(job_id):
+    """
+    Load what a claimed job needs to call the LLM: (job, submission_id, content, framework).
+
+    Returns None if the job is gone, or if its submission is, in which case the job is failed.
+    Commits before returning, so no connection is held while the LLM runs.
+    """
+    job = db.session.get(FeedbackJob, job_id)
+    if not job:
+        return None
+
+    submission = db.session.get(ReflectionSubmission, job.submission_id)
+    if not submission:
+        job.status = 'failed'
+        job.error = 'Submission no longer exists'
+        job.finished_at = datetime.utcnow()
+        db.session.commit()
+        return None
+
+    reflection = db.session.get(Reflection, submission.reflection_id)
+    course = db.session.get(Course, reflection.course_id)
+    submission_id = submission.id
+    content = submission.content
+    framework = course.framework if course else None
+
+    # Release the connection while we wait on the LLM
+    db.session.commit()
+    return job, submission_id, content, framework
+
+
+def _complete_job(job_id, content, feedback):
+    job = db.session.get(FeedbackJob, job_id)
+    submission = db.session.get(ReflectionSubmission, job.submission_id)
+
+    # Only store the result if the student hasn't resubmitted in the meantime
+    if submission and submission.content == content:
+        submission.ai_feedback = feedback
+
+    job.status = 'done'
+    job.error = None
+    job.finished_at = datetime.utcnow()
+    db.session.commit()
+
+
+def run_feedback_job(job_id, max_attempts=3):
+    """Generate and store feedback for a claimed job"""
+    loaded = _job_input(job_id)
+    if not loaded:
+        return
+    job, submission_id, content, framework = loaded
+
+    try:
+        # Errors reach the retry logic below; generic feedback only after the last attempt
+        feedback = generate_submission_feedback(
+            submission_id,
+            reflection_content=content,
+            framework=framework,
+            use_fallback=False
+        )
+    except Exception as e:
+        print(f"[JOBS] Feedback job {job_id} failed: {str(e)}")
+        db.session.rollback()
+        job = db.session.get(FeedbackJob, job_id)
+        job.error = str(e)
+        if job.attempts < max_attempts:
+            # Back off before the next attempt
+            job.status = 'pending'
+            job.run_after = datetime.utcnow() + timedelta(seconds=30 * job.attempts)
+        else:
+            job.status = 'failed'
+            job.finished_at = datetime.utcnow()
+            submission = db.session.get(ReflectionSubmission, job.submission_id)
+            if submission and submission.content == content and not submission.ai_feedback:
+                submission.ai_feedback = FALLBACK_FEEDBACK
+        db.session.commit()
+        return
+
+    _complete_job(job_id, content, feedback)
+    print(f"[AI] Generated feedback for submission {submission_id} (job {job_id})")
+
+
+def stream_feedback_job(job_id):
+    """
+    Run a claimed job in the caller's thread, yielding feedback text as it is generated.
+
+    The complete text is stored only once the stream finishes. If generation
+    fails or the consumer stops listening, the job goes back to the queue for
+    the background worker to finish.
+    """
+    loaded = _job_input(job_id)
+    if not loaded:
+        return
+    job, submission_id, content, framework = loaded
+
+    try:
+        feedback = yield from stream_submission_feedback(
+            submission_id,
+            reflection_content=content,
+            framework=framework
+        )
+    except (Exception, GeneratorExit) as e:
+        # GeneratorExit: the client disconnected mid-stream
+        db.session.rollback()
+        job = db.session.get(FeedbackJob, job_id)
+        job.status = 'pending'
+        job.error = str(e) or type(e).__name__
+        job.run_after = datetime.utcnow()
+        db.session.commit()
+        notify_worker()
+        print(f"[JOBS] Streaming job {job_id} handed back to the worker: {job.error}")
+        raise
+
+    _complete_job(job_id, content, feedback or FALLBACK_FEEDBACK)
+    print(f"[AI] Streamed feedback for submission {submission_id} (job {job_id})")
+
+
+class FeedbackWorker:
+    """
+    Background dispatcher that drains the feedback job table.
+
+    A single daemon thread claims jobs from the database and hands them to a
+    bounded thread pool. Claims are atomic, so several processes can run a
+    worker against the same database.
+    """
+
+    def __init__(self, app, max_workers=4, poll_interval=5.0, stale_after=600, max_attempts=3):
+        self.app = app
+        self.max_workers = max_workers
+        self.poll_interval = poll_interval
+        self.stale_after = stale_after
+        self.max_attempts = max_attempts
+        self._slots = threading.BoundedSemaphore(max_workers)
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='feedback-job')
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='feedback-dispatcher', daemon=True)
+        self._thread.start()
+        print(f"[JOBS] Feedback worker started with {self.max_workers} threads")
+
+    def stop(self):
+        self._stop.set()
+        _wakeup.set()
+        if self._thread:
+            self._thread.join(timeout=self.poll_interval)
+        self._pool.shutdown(wait=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                with self.app.app_context():
+                    requeue_stale_jobs(self.stale_after)
+                    self._dispatch()
+                    db.session.remove()
+            except Exception as e:
+                print(f"[JOBS] Dispatcher error: {str(e)}")
+
+            _wakeup.wait(self.poll_interval)
+            _wakeup.clear()
+
+    def _dispatch(self):
+        # Only claim as many jobs as there are free threads, so claimed jobs never sit idle
+        while not self._stop.is_set() and self._slots.acquire(blocking=False):
+            job_id = claim_next_job()
+            if job_id is None:
+                self._slots.release()
+                return
+            self._pool.submit(self._process, job_id)
+
+    def _process(self, job_id):
+        try:
+            with self.app.app_context():
+                try:
+                    run_feedback_job(job_id, max_attempts=self.max_attempts)
+                except Exception as e:
+                    db.session.rollback()
+                    print(f"[JOBS] Error processing job {job_id}: {str(e)}")
+                finally:
+                    db.session.remove()
+        finally:
+            self._slots.release()
+            # A slot just freed up; look for more work
+            _wakeup.set()
+
+
+def init_feedback_worker(app):
+    """Start the process-wide feedback worker (at most once per process)"""
+    global _worker
+    with _worker_lock:
+        if _worker is None:
+            _worker = FeedbackWorker(
+                app,
+                max_workers=app.config['FEEDBACK_WORKERS'],
+                poll_interval=app.config['FEEDBACK_POLL_INTERVAL'],
+                stale_after=app.config['FEEDBACK_JOB_TIMEOUT'],
+                max_attempts=app.config['FEEDBACK_MAX_ATTEMPTS']
+            )
+            _worker.start()
+    return _worker
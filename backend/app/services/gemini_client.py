@@ -0,0 +1,252 @@
+import os
+import time
+import random
+import threading
+from collections import deque
+import google.generativeai as genai
+from google.api_core import exceptions as api_exceptions
+
+# Configure Gemini API
+genai.configure(api_key=os.environ.get('GOOGLE_API_KEY'))
+
+# Client settings
+GEMINI_TIMEOUT = float(os.environ.get('GEMINI_TIMEOUT', 30))  # Seconds per call, retries included
+GEMINI_MAX_RETRIES = int(os.environ.get('GEMINI_MAX_RETRIES', 2))
+GEMINI_RETRY_BASE = float(os.environ.get('GEMINI_RETRY_BASE', 0.5))  # Seconds; backoff doubles per retry
+GEMINI_RETRY_MAX = float(os.environ.get('GEMINI_RETRY_MAX', 8))
+GEMINI_BREAKER_THRESHOLD = int(os.environ.get('GEMINI_BREAKER_THRESHOLD', 5))  # Consecutive failed calls before opening
+GEMINI_BREAKER_RESET = float(os.environ.get('GEMINI_BREAKER_RESET', 30))  # Seconds open before a trial call
+LATENCY_SAMPLES = 1000
+
+# Errors worth another attempt: rate limits, overload, transient server errors and timeouts
+RETRYABLE_ERRORS = (
+    api_exceptions.TooManyRequests,
+    api_exceptions.ResourceExhausted,
+    api_exceptions.ServiceUnavailable,
+    api_exceptions.InternalServerError,
+    api_exceptions.DeadlineExceeded,
+    api_exceptions.GatewayTimeout,
+    TimeoutError,
+    ConnectionError,
+)
+
+
+class GeminiUnavailable(Exception):
+    """Raised without calling Gemini while the circuit breaker is open"""
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker.
+
+    Closed: calls go through. After `threshold` failed calls in a row it opens
+    and rejects calls for `reset_after` seconds, then lets a single trial call
+    through (half-open); that call's outcome closes or re-opens it.
+    """
+
+    def __init__(self, threshold, reset_after):
+        self.threshold = threshold
+        self.reset_after = reset_after
+        self.state = 'closed'
+        self.failures = 0
+        self._opened_at = 0
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == 'closed':
+                return True
+            if self.state == 'open' and time.monotonic() - self._opened_at >= self.reset_after:
+                self.state = 'half_open'
+            if self.state == 'half_open' and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = 'closed'
+            self.failures = 0
+            self._trial_running = False
+
+    def release(self):
+        """Give up a trial call without an outcome, so the next call can try instead"""
+        with self._lock:
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_running = False
+            if self.state == 'half_open' or self.failures >= self.threshold:
+                if self.state != 'open':
+                    print(f'[AI] Circuit breaker opened after {self.failures} failed Gemini calls')
+                self.state = 'open'
+                self._opened_at = time.monotonic()
+
+
+def _summarize(ordered):
+    """Percentiles in milliseconds of sorted durations in seconds"""
+    if not ordered:
+        return None
+    summary = {
+        name: round(ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] * 1000, 1)
+        for name, fraction in (('p50', 0.5), ('p90', 0.9), ('p95', 0.95), ('p99', 0.99))
+    }
+    summary['samples'] = len(ordered)
+    return summary
+
+
+class GeminiClient:
+    """
+    Long-lived, thread-safe wrapper around a Gemini model.
+
+    Each generate() call gets an overall deadline; retryable errors are retried
+    with exponential backoff and full jitter within it. While the provider keeps
+    failing, the circuit breaker makes calls fail fast with GeminiUnavailable
+    so callers can fall back immediately instead of waiting on timeouts.
+    """
+
+    def __init__(self, model_name, timeout=GEMINI_TIMEOUT, max_retries=GEMINI_MAX_RETRIES,
+                 retry_base=GEMINI_RETRY_BASE, retry_max=GEMINI_RETRY_MAX,
+                 breaker_threshold=GEMINI_BREAKER_THRESHOLD, breaker_reset=GEMINI_BREAKER_RESET):
+        self.model_name = model_name
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.breaker = CircuitBreaker(breaker_threshold, breaker_reset)
+        self._model = None
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=LATENCY_SAMPLES)
+        self._first_chunk_latencies = deque(maxlen=LATENCY_SAMPLES)  # Streaming calls only
+        self._stats = {'calls': 0, 'successes': 0, 'failures': 0, 'retries': 0, 'short_circuited': 0}
+
+    @property
+    def model(self):
+        # Built once and shared by all threads
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    self._model = genai.GenerativeModel(self.model_name)
+        return self._model
+
+    def _count(self, stat):
+        with self._lock:
+            self._stats[stat] += 1
+
+    def _begin(self):
+        if not self.breaker.allow():
+            self._count('short_circuited')
+            raise GeminiUnavailable(f'Gemini circuit breaker is {self.breaker.state}')
+        self._count('calls')
+        return time.monotonic()
+
+    def _retry_delay(self, error, attempt, deadline):
+        """Seconds to wait before retrying after `error`, or None if the call should give up"""
+        if not isinstance(error, RETRYABLE_ERRORS):
+            # Bad requests and blocked responses say nothing about the provider's health: they neither
+            # trip the breaker nor reset its failure count, they only free a half-open trial slot
+            self._count('failures')
+            self.breaker.release()
+            return None
+        backoff = random.uniform(0, min(self.retry_max, self.retry_base * 2 ** attempt))
+        if attempt >= self.max_retries or time.monotonic() + backoff >= deadline:
+            self._count('failures')
+            self.breaker.record_failure()
+            return None
+        self._count('retries')
+        print(f'[AI] Gemini call failed ({type(error).__name__}), retry {attempt + 1} in {backoff:.2f}s')
+        return backoff
+
+    def _succeeded(self, started, first_chunk_at=None):
+        self.breaker.record_success()
+        with self._lock:
+            self._stats['successes'] += 1
+            self._latencies.append(time.monotonic() - started)
+            if first_chunk_at is not None:
+                self._first_chunk_latencies.append(first_chunk_at - started)
+
+    def generate(self, prompt):
+        """
+        Generate text for `prompt`. Returns the stripped response text, or None if it was empty.
+
+        Raises GeminiUnavailable when the breaker is open, or the last error once
+        retries or the deadline are exhausted.
+        """
+        started = self._begin()
+        deadline = started + self.timeout
+        attempt = 0
+        while True:
+            try:
+                response = self.model.generate_content(
+                    prompt,
+                    request_options={'timeout': max(0.1, deadline - time.monotonic())}
+                )
+                text = response.text.strip() if response and response.text else None
+            except Exception as e:
+                delay = self._retry_delay(e, attempt, deadline)
+                if delay is None:
+                    raise
+                attempt += 1
+                time.sleep(delay)
+                continue
+
+            self._succeeded(started)
+            return text
+
+    def generate_stream(self, prompt):
+        """
+        Yield response text for `prompt` chunk by chunk, as Gemini produces it.
+
+        Errors are retried like generate() until the first chunk has been
+        yielded; after that they are raised, since a retry would repeat text.
+        """
+        started = self._begin()
+        deadline = started + self.timeout
+        attempt = 0
+        first_chunk_at = None
+        try:
+            while True:
+                try:
+                    response = self.model.generate_content(
+                        prompt,
+                        stream=True,
+                        request_options={'timeout': max(0.1, deadline - time.monotonic())}
+                    )
+                    for chunk in response:
+                        text = chunk.text
+                        if not text:
+                            continue
+                        if first_chunk_at is None:
+                            first_chunk_at = time.monotonic()
+                        yield text
+                except Exception as e:
+                    delay = self._retry_delay(e, attempt, deadline) if first_chunk_at is None else None
+                    if delay is None:
+                        if first_chunk_at is not None:
+                            self._count('failures')
+                            self.breaker.record_failure()
+                        raise
+                    attempt += 1
+                    time.sleep(delay)
+                    continue
+
+                self._succeeded(started, first_chunk_at)
+                return
+        except GeneratorExit:
+            # The consumer went away mid-stream; that says nothing about the provider
+            self.breaker.release()
+            raise
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            latencies = sorted(self._latencies)
+            first_chunk_latencies = sorted(self._first_chunk_latencies)
+        stats['model'] = self.model_name
+        stats['breaker'] = self.breaker.state
+        stats['latency_ms'] = _summarize(latencies)
+        stats['first_chunk_ms'] = _summarize(first_chunk_latencies)
+        return stats
@@ -0,0 +1,140 @@
+import os
+import io
+import re
+import base64
+import hashlib
+import tempfile
+from flask import current_app
+from PIL import Image
+
+MAX_IMAGE_BYTES = 2 * 1024 * 1024  # 2MB decoded
+
+# MIME type -> file extension for the formats we accept
+IMAGE_TYPES = {
+    'image/png': 'png',
+    'image/jpeg': 'jpg',
+    'image/gif': 'gif',
+    'image/webp': 'webp'
+}
+EXTENSION_TYPES = {ext: mime for mime, ext in IMAGE_TYPES.items()}
+PIL_FORMATS = {'png': 'PNG', 'jpg': 'JPEG', 'gif': 'GIF', 'webp': 'WEBP'}
+
+IMAGE_URL_PREFIX = '/api/images/'
+DIGEST_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+DATA_URL_PATTERN = re.compile(r'^data:(image/[a-z+.-]+);base64,(.*)$', re.DOTALL)
+
+
+def parse_data_url(data_url):
+    """Decode a base64 image data URL. Returns (mime_type, bytes) or raises ValueError."""
+    match = DATA_URL_PATTERN.match(data_url)
+    if not match:
+        raise ValueError('Invalid image format')
+
+    mime_type = match.group(1)
+    if mime_type not in IMAGE_TYPES:
+        raise ValueError('Unsupported image type')
+
+    try:
+        data = base64.b64decode(match.group(2), validate=True)
+    except (ValueError, TypeError):
+        raise ValueError('Invalid image format')
+
+    if len(data) > MAX_IMAGE_BYTES:
+        raise ValueError('Image too large. Maximum size is 2MB')
+    return mime_type, data
+
+
+def _store_root():
+    return current_app.config['IMAGE_STORE_PATH']
+
+
+def image_path(digest, extension, thumbnail=False):
+    suffix = '_thumb' if thumbnail else ''
+    return os.path.join(_store_root(), digest[:2], f'{digest}{suffix}.{extension}')
+
+
+def _write_atomic(path, data):
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _make_thumbnail(data, extension, size):
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            image.thumbnail((size, size))
+            if extension == 'jpg' and image.mode not in ('RGB', 'L'):
+                image = image.convert('RGB')
+            output = io.BytesIO()
+            image.save(output, format=PIL_FORMATS[extension])
+            return output.getvalue()
+    except Exception as e:
+        print(f"[IMAGES] Could not generate thumbnail: {str(e)}")
+        return None
+
+
+def save_image(mime_type, data):
+    """
+    Store image bytes under their SHA-256 digest and return the public URL.
+
+    Identical uploads map to the same file, so saving is idempotent.
+    """
+    extension = IMAGE_TYPES[mime_type]
+    digest = hashlib.sha256(data).hexdigest()
+
+    path = image_path(digest, extension)
+    if not os.path.exists(path):
+        _write_atomic(path, data)
+
+    thumb_path = image_path(digest, extension, thumbnail=True)
+    if not os.path.exists(thumb_path):
+        thumbnail = _make_thumbnail(data, extension, current_app.config['THUMBNAIL_SIZE'])
+        if thumbnail is not None:
+            _write_atomic(thumb_path, thumbnail)
+
+    return f'{IMAGE_URL_PREFIX}{digest}.{extension}'
+
+
+def save_data_url(data_url):
+    mime_type, data = parse_data_url(data_url)
+    return save_image(mime_type, data)
+
+
+def resolve_image(filename, thumbnail=False):
+    """Map '<digest>.<ext>' to (path, mime_type, etag), or None if it isn't stored"""
+    digest, _, extension = filename.partition('.')
+    if not DIGEST_PATTERN.match(digest) or extension not in EXTENSION_TYPES:
+        return None
+
+    path = image_path(digest, extension)
+    if not os.path.exists(path):
+        return None
+
+    if thumbnail:
+        thumb_path = image_path(digest, extension, thumbnail=True)
+        if not os.path.exists(thumb_path):
+            # Stored before thumbnails were generated, or generation failed at upload time
+            with open(path, 'rb') as f:
+                data = _make_thumbnail(f.read(), extension, current_app.config['THUMBNAIL_SIZE'])
+            if data is None:
+                print(f"[IMAGES] Serving the original for {filename}: no thumbnail could be generated")
+                return path, EXTENSION_TYPES[extension], digest
+            _write_atomic(thumb_path, data)
+        return thumb_path, EXTENSION_TYPES[extension], f'{digest}-thumb'
+
+    return path, EXTENSION_TYPES[extension], digest
+
+
+def thumbnail_url(url):
+    """Thumbnail variant of a profile image URL; external URLs are returned as-is"""
+    if url and url.startswith(IMAGE_URL_PREFIX):
+        return f'{url}?size=thumb'
+    return url
@@ -0,0 +1,120 @@
+import json
+from datetime import datetime
+from ..models.models import db, SubmissionLabelFeedback
+from ..utils.db_utils import insert_ignore
+from .feedback_cache import make_cache_key, get_cached_feedback, store_feedback
+from .prompt_builder import parse_sections, build_label_feedback_prompt, parse_label_feedback, heading
+
+# Shown for a label the model skipped; not stored, so the label is retried on the next submission
+MISSING_LABEL_FEEDBACK = "Good work on this answer. Consider adding a concrete example and what you would do differently next time."
+
+
+class LabelFeedbackPlan:
+    """
+    What a structured submission's feedback needs.
+
+    `feedback` holds the labels whose text is already known: stored for this
+    submission with a matching response hash, or cached for an identical
+    answer elsewhere. `changed` lists the (label, response) pairs that still
+    need the LLM, all sent together in `prompt` (None when nothing changed).
+    """
+
+    def __init__(self, submission_id, model_name, labels, hashes, stored, feedback, changed, prompt):
+        self.submission_id = submission_id
+        self.model_name = model_name
+        self.labels = labels
+        self.hashes = hashes
+        self.stored = stored
+        self.feedback = feedback
+        self.changed = changed
+        self.prompt = prompt
+
+
+def label_hash(label, response, framework, model_name):
+    """Same key as the feedback cache uses for a one-label submission, so the two can share entries"""
+    return make_cache_key(json.dumps([{'label': label, 'response': response}]), framework, model_name)
+
+
+def plan_label_feedback(submission_id, reflection_content, framework, model_name, force=False):
+    """
+    Work out which labels of a submission need new feedback.
+
+    Returns None for content that isn't label/response JSON (or repeats a
+    label), which gets feedback as a whole instead. With `force`, every
+    label is regenerated.
+    """
+    sections = parse_sections(reflection_content)
+    labels = [label for label, _ in sections]
+    if labels[0] is None or len(set(labels)) != len(labels):
+        return None
+
+    hashes = {label: label_hash(label, response, framework, model_name) for label, response in sections}
+    stored = {
+        row.label: row.response_hash
+        for row in db.session.query(SubmissionLabelFeedback.label, SubmissionLabelFeedback.response_hash)
+        .filter(SubmissionLabelFeedback.submission_id == submission_id)
+    } if submission_id else {}
+
+    feedback = {}
+    changed = []
+    if not force:
+        reusable = [label for label in labels if stored.get(label) == hashes[label]]
+        if reusable:
+            feedback = dict(
+                db.session.query(SubmissionLabelFeedback.label, SubmissionLabelFeedback.feedback).filter(
+                    SubmissionLabelFeedback.submission_id == submission_id,
+                    SubmissionLabelFeedback.label.in_(reusable)
+                )
+            )
+    for label, response in sections:
+        if label in feedback:
+            continue
+        cached = get_cached_feedback(hashes[label]) if not force else None
+        if cached is not None:
+            feedback[label] = cached
+        else:
+            changed.append((label, response))
+
+    prompt = build_label_feedback_prompt(changed, framework) if changed else None
+    return LabelFeedbackPlan(submission_id, model_name, labels, hashes, stored, feedback, changed, prompt)
+
+
+def finish_label_feedback(plan, reply):
+    """
+    Merge the LLM's reply into the plan and return the submission's full feedback text.
+
+    New and updated labels are written to the session (the caller commits);
+    labels the submission no longer has are removed.
+    """
+    generated = parse_label_feedback(reply, [label for label, _ in plan.changed]) if plan.changed else {}
+    for label, text in generated.items():
+        store_feedback(plan.hashes[label], text, plan.model_name)
+    plan.feedback.update(generated)
+
+    if plan.submission_id:
+        # Rows to (re)write: labels with new text, and stored labels whose text came from the cache
+        fresh = [label for label in plan.labels if label in plan.feedback and plan.stored.get(label) != plan.hashes[label]]
+        gone = [label for label in plan.stored if label not in plan.hashes]
+        table = SubmissionLabelFeedback.__table__
+        if fresh or gone:
+            db.session.execute(table.delete().where(
+                table.c.submission_id == plan.submission_id,
+                table.c.label.in_(fresh + gone)
+            ))
+        if fresh:
+            now = datetime.utcnow()
+            db.session.execute(insert_ignore(table, db.session.get_bind().dialect.name), [
+                {
+                    'submission_id': plan.submission_id,
+                    'label': label,
+                    'response_hash': plan.hashes[label],
+                    'feedback': plan.feedback[label],
+                    'updated_at': now
+                }
+                for label in fresh
+            ])
+
+    return '\n\n'.join(
+        f'{heading(label)}\n{plan.feedback.get(label, MISSING_LABEL_FEEDBACK)}'
+        for label in plan.labels
+    )
@@ -0,0 +1,250 @@
+import os
+import re
+import json
+import threading
+from collections import deque
+from functools import lru_cache
+
+# Prompt budgets, in estimated tokens
+PROMPT_TOKEN_BUDGET = int(os.environ.get('PROMPT_TOKEN_BUDGET', 3000))  # Whole prompt, template included
+PROMPT_LABEL_TOKEN_BUDGET = int(os.environ.get('PROMPT_LABEL_TOKEN_BUDGET', 800))  # One label's response
+CHARS_PER_TOKEN = float(os.environ.get('PROMPT_CHARS_PER_TOKEN', 4))  # Rough average for English text
+MIN_SECTION_TOKENS = 32  # Never squeeze a response below this when sharing the request budget
+SIZE_SAMPLES = 1000
+
+_INLINE_WHITESPACE = re.compile(r'[^\S\n]+')
+_BLANK_LINES = re.compile(r'\n\s*\n\s*')
+
+_lock = threading.Lock()
+_sizes = deque(maxlen=SIZE_SAMPLES)
+_stats = {'prompts': 0, 'compacted': 0, 'sections_trimmed': 0, 'tokens_in': 0, 'tokens_out': 0}
+
+
+def estimate_tokens(text):
+    """Cheap token estimate from the character count; good enough for budgeting"""
+    return int(len(text) / CHARS_PER_TOKEN + 0.5) if text else 0
+
+
+def normalize_whitespace(text):
+    """Collapse runs of spaces and tabs, and of blank lines, keeping paragraph breaks"""
+    text = _INLINE_WHITESPACE.sub(' ', text or '')
+    text = _BLANK_LINES.sub('\n\n', text)
+    return '\n'.join(line.strip() for line in text.split('\n')).strip()
+
+
+def trim_to_budget(text, max_tokens):
+    """
+    Shorten `text` to about `max_tokens`, keeping its opening and its conclusion.
+
+    The dropped middle is replaced by a marker giving its length, so the model
+    knows the student wrote more than it can see. Returns (text, trimmed).
+    """
+    if estimate_tokens(text) <= max_tokens:
+        return text, False
+
+    budget = int(max_tokens * CHARS_PER_TOKEN)
+    head_end = text.rfind(' ', 0, budget * 2 // 3)
+    tail_start = text.find(' ', len(text) - budget // 3)
+    if head_end <= 0 or tail_start < 0 or tail_start <= head_end:
+        head_end, tail_start = budget * 2 // 3, len(text) - budget // 3
+
+    omitted = len(text[head_end:tail_start].split())
+    return f'{text[:head_end].rstrip()} [... {omitted} words omitted ...] {text[tail_start:].lstrip()}', True
+
+
+def _allocate(sizes, budget):
+    """
+    Split `budget` tokens across sections of the given sizes.
+
+    Sections under an even share keep all they need; what they leave over is
+    shared evenly by the larger ones.
+    """
+    caps = list(sizes)
+    remaining = budget
+    pending = sorted(range(len(sizes)), key=lambda i: sizes[i])
+    while pending:
+        share = max(MIN_SECTION_TOKENS, remaining // len(pending))
+        if sizes[pending[0]] > share:
+            for i in pending:
+                caps[i] = share
+            break
+        i = pending.pop(0)
+        remaining -= sizes[i]
+    return caps
+
+
+@lru_cache(maxsize=64)
+def _template(framework):
+    """The fixed text around a reflection, built once per framework"""
+    prefix = "You are an Educational reflection feedback expert analyzing a student's reflection journal entry. You need to evaluate the feedback based on the configuration framework chosen by the educator."
+    if framework:
+        prefix += f" The framework chosen by the educator is '{framework}'."
+    prefix += """\n\nYou have to provide feedback separately for each question/label of the reflection. Also, provide constructive, encouraging, specific feedback that can help the student improve and deepen their learning.
+
+Student's Reflection:
+"""
+    suffix = "\n\nPlease provide your feedback addressing each question/label separately, highlighting what the student did well and suggesting areas for improvement and deeper exploration."
+    return prefix, suffix, estimate_tokens(prefix) + estimate_tokens(suffix)
+
+
+def _is_section(item):
+    return isinstance(item, dict) and isinstance(item.get('label'), str) and isinstance(item.get('response'), str)
+
+
+def parse_sections(reflection_content):
+    """
+    [(label, response)] for structured content, or [(None, text)] for anything else.
+
+    Content counts as structured only if every item is an object with a
+    string label and a string response; anything else is fed to the model
+    as plain text rather than failing the feedback job.
+    """
+    try:
+        content_data = json.loads(reflection_content)
+    except (json.JSONDecodeError, TypeError):
+        content_data = None
+    if isinstance(content_data, list) and content_data and all(_is_section(item) for item in content_data):
+        return [(item['label'], item['response']) for item in content_data]
+    return [(None, reflection_content)]
+
+
+def _compact(sections, token_budget, label_budget, fixed_tokens):
+    """
+    Normalize and trim (label, response) sections so they fit the budgets.
+
+    Returns (sections, tokens_in, trimmed_count).
+    """
+    sections = [
+        (normalize_whitespace(label) if label is not None else None, normalize_whitespace(str(response or '')))
+        for label, response in sections
+    ]
+    tokens_in = fixed_tokens + sum(estimate_tokens(response) for _, response in sections)
+
+    # Labels and separators cost tokens too
+    overhead = sum(estimate_tokens(label) + 1 for label, _ in sections if label is not None)
+    available = max(MIN_SECTION_TOKENS, token_budget - fixed_tokens - overhead)
+    sizes = [estimate_tokens(response) for _, response in sections]
+    if len(sections) > 1:
+        sizes = [min(size, label_budget) for size in sizes]
+    caps = _allocate(sizes, available)
+
+    compacted = []
+    trimmed_count = 0
+    for (label, response), cap in zip(sections, caps):
+        response, trimmed = trim_to_budget(response, cap)
+        trimmed_count += trimmed
+        compacted.append((label, response))
+    return compacted, tokens_in, trimmed_count
+
+
+def build_feedback_prompt(reflection_content, framework=None, token_budget=None, label_budget=None):
+    """
+    Build the Gemini prompt for a submission's content (plain text or JSON label/response pairs).
+
+    Responses are whitespace-normalized and trimmed to the per-label budget.
+    If they still don't fit the request budget, the longest ones are trimmed
+    further until they do.
+    """
+    prefix, suffix, template_tokens = _template(framework)
+    sections, tokens_in, trimmed_count = _compact(
+        parse_sections(reflection_content),
+        token_budget or PROMPT_TOKEN_BUDGET,
+        label_budget or PROMPT_LABEL_TOKEN_BUDGET,
+        template_tokens
+    )
+
+    prompt = prefix + '\n\n'.join(
+        f'{label}:\n{response}' if label is not None else response
+        for label, response in sections
+    ) + suffix
+    _record(tokens_in, estimate_tokens(prompt), trimmed_count)
+    return prompt
+
+
+@lru_cache(maxsize=64)
+def _label_template(framework):
+    """Instructions for feedback on selected labels, one '### label' section each"""
+    prefix = "You are an Educational reflection feedback expert analyzing answers from a student's reflection journal entry."
+    if framework:
+        prefix += f" The framework chosen by the educator is '{framework}'."
+    prefix += """\n\nProvide constructive, encouraging, specific feedback on each answer below, highlighting what the student did well and suggesting areas for improvement and deeper exploration. Reply with one section per answer, starting each with its heading line exactly as given below, and no other headings.
+
+"""
+    return prefix, estimate_tokens(prefix)
+
+
+def heading(label):
+    """The '### label' line that introduces a label's section, in prompts and in merged feedback"""
+    return '### ' + ' '.join(label.split())
+
+
+def build_label_feedback_prompt(sections, framework=None, token_budget=None, label_budget=None):
+    """Prompt for feedback on several (label, response) pairs at once, within the same budgets"""
+    prefix, template_tokens = _label_template(framework)
+    sections, tokens_in, trimmed_count = _compact(
+        sections,
+        token_budget or PROMPT_TOKEN_BUDGET,
+        label_budget or PROMPT_LABEL_TOKEN_BUDGET,
+        template_tokens
+    )
+
+    prompt = prefix + '\n\n'.join(f'{heading(label)}\n{response}' for label, response in sections)
+    _record(tokens_in, estimate_tokens(prompt), trimmed_count)
+    return prompt
+
+
+_HEADING = re.compile(r'^#{1,6}[ \t]*(.+?)[ \t]*:?[ \t]*$', re.MULTILINE)
+
+
+def _heading_key(text):
+    return ' '.join(text.replace('*', '').split()).rstrip(':').casefold()
+
+
+def parse_label_feedback(text, labels):
+    """
+    Split a reply to build_label_feedback_prompt() into {label: feedback}.
+
+    Only headings naming one of `labels` start a section, so the model's own
+    sub-headings stay inside the feedback. Labels the reply skipped are missing
+    from the result; a reply about a single label needs no heading at all.
+    """
+    wanted = {_heading_key(label): label for label in labels}
+    matches = [m for m in _HEADING.finditer(text or '') if _heading_key(m.group(1)) in wanted]
+
+    feedback = {}
+    for i, match in enumerate(matches):
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(text)
+        body = text[match.end():end].strip()
+        if body:
+            feedback[wanted[_heading_key(match.group(1))]] = body
+
+    if not matches and len(labels) == 1 and text and text.strip():
+        feedback[labels[0]] = text.strip()
+    return feedback
+
+
+def _record(tokens_in, tokens_out, trimmed_count):
+    with _lock:
+        _stats['prompts'] += 1
+        _stats['compacted'] += 1 if trimmed_count else 0
+        _stats['sections_trimmed'] += trimmed_count
+        _stats['tokens_in'] += tokens_in
+        _stats['tokens_out'] += tokens_out
+        _sizes.append(tokens_out)
+
+
+def get_prompt_stats():
+    """Estimated prompt sizes for this process, after compaction"""
+    with _lock:
+        stats = dict(_stats)
+        sizes = sorted(_sizes)
+    if sizes:
+        stats['tokens'] = {
+            name: sizes[min(len(sizes) - 1, int(fraction * len(sizes)))]
+            for name, fraction in (('p50', 0.5), ('p95', 0.95), ('max', 1.0))
+        }
+    else:
+        stats['tokens'] = None
+    stats['token_budget'] = PROMPT_TOKEN_BUDGET
+    stats['label_token_budget'] = PROMPT_LABEL_TOKEN_BUDGET
+    return stats
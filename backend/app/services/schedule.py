@@ -0,0 +1,239 @@
+from datetime import datetime, time, timedelta
+from sqlalchemy import func, insert, update, exists, or_
+from ..models.models import db, Course, Reflection, ReflectionSubmission, SubmissionDraft
+from ..utils.versioning import bump_versions
+from ..utils.db_utils import insert_ignore
+from .structures import ensure_course_structure
+
+# Map day names to weekday numbers (Monday=0, Sunday=6)
+# Support both full names and abbreviations
+DAY_MAP = {
+    'Monday': 0, 'Mon': 0,
+    'Tuesday': 1, 'Tues': 1, 'Tue': 1,
+    'Wednesday': 2, 'Wed': 2,
+    'Thursday': 3, 'Thurs': 3, 'Thu': 3,
+    'Friday': 4, 'Fri': 4,
+    'Saturday': 5, 'Sat': 5,
+    'Sunday': 6, 'Sun': 6
+}
+
+
+def _as_date(value):
+    return value.date() if isinstance(value, datetime) else value
+
+
+def parse_selected_weekdays(selected_days):
+    """Weekday numbers for a comma-separated list of day names, or None if no days are selected"""
+    if not selected_days:
+        return None
+    names = [d.strip() for d in selected_days.split(',')]
+    return sorted({DAY_MAP[name] for name in names if name in DAY_MAP})
+
+
+def compute_occurrences(course):
+    """
+    Start dates (at midnight) of every reflection the course configuration calls for.
+
+    Computed arithmetically from the recurrence rule rather than by walking
+    the calendar, so the cost is proportional to the number of occurrences.
+    """
+    start, end = _as_date(course.start_date), _as_date(course.end_date)
+    if not start or not end or end < start:
+        return []
+
+    weekdays = parse_selected_weekdays(course.selected_days)
+    if weekdays is not None:
+        dates = []
+        for weekday in weekdays:
+            first = start + timedelta(days=(weekday - start.weekday()) % 7)
+            count = (end - first).days // 7 + 1 if first <= end else 0
+            dates.extend(first + timedelta(weeks=k) for k in range(count))
+        dates.sort()
+    else:
+        # Values straight from the configure request may still be strings
+        step = int(course.recurrence_days) if course.recurrence_days else 7
+        count = (end - start).days // step + 1
+        dates = [start + timedelta(days=step * k) for k in range(count)]
+
+    return [datetime.combine(d, time.min) for d in dates]
+
+
+def occurrence_fields(course, number, start, structure_id=None):
+    """Name, number, due date and structure version of the reflection for one occurrence"""
+    due_days = int(course.reflection_due_days) if course.reflection_due_days else 7
+    return {
+        'name': f"Reflection {start.strftime('%d/%m')}",
+        'number': number,
+        'due_date': start + timedelta(days=due_days),
+        'structure_id': structure_id
+    }
+
+
+def parse_reflection_dates(date_strings):
+    """Parse ISO date strings from the client into midnight datetimes, skipping invalid ones"""
+    dates = []
+    for date_str in date_strings:
+        try:
+            parsed = datetime.fromisoformat(date_str.replace('Z', ''))
+        except (AttributeError, ValueError) as e:
+            print(f"[SCHEDULE] Failed to parse date: {date_str}, error: {e}")
+            continue
+        dates.append(datetime.combine(_as_date(parsed), time.min))
+    return dates
+
+
+def reconcile_reflections(course, target_dates):
+    """
+    Bring a course's reflections in line with `target_dates` using the minimal set of writes.
+
+    Existing rows are matched to target dates by start date. Unmatched targets
+    are inserted, matched rows are updated only where name, number, due date or
+    structure differ, and rows for dates no longer scheduled are deleted unless
+    students have already submitted or started a draft for them. Such rows
+    also keep their structure version. Everything, including pending
+    changes to the course itself, commits in a single transaction.
+    """
+    now = datetime.utcnow()
+    structure_id = ensure_course_structure(course)
+
+    existing = Reflection.query.filter_by(course_id=course.id).all()
+    # Submissions and started drafts both count as work students did against a reflection
+    usage_counts = {}
+    for model in (ReflectionSubmission, SubmissionDraft):
+        counts = db.session.query(model.reflection_id, func.count(model.id)).join(
+            Reflection, Reflection.id == model.reflection_id
+        ).filter(Reflection.course_id == course.id).group_by(model.reflection_id)
+        for reflection_id, count in counts:
+            usage_counts[reflection_id] = usage_counts.get(reflection_id, 0) + count
+
+    by_date = {}
+    leftovers = []
+    for reflection in sorted(existing, key=lambda r: (-usage_counts.get(r.id, 0), r.id)):
+        key = _as_date(reflection.start_date)
+        if key in by_date:
+            # Duplicate for the same day; the one students used most wins
+            leftovers.append(reflection)
+        else:
+            by_date[key] = reflection
+
+    inserts, updates = [], []
+    for number, start in enumerate(sorted(set(target_dates)), start=1):
+        desired = occurrence_fields(course, number, start, structure_id)
+        reflection = by_date.pop(start.date(), None)
+        if reflection is None:
+            inserts.append(dict(desired, course_id=course.id, description='', start_date=start, created_at=now))
+            continue
+        changed = {field: value for field, value in desired.items() if getattr(reflection, field) != value}
+        if usage_counts.get(reflection.id, 0):
+            changed.pop('structure_id', None)
+        if changed:
+            updates.append(dict(changed, id=reflection.id))
+
+    leftovers.extend(by_date.values())
+    deletes = [r.id for r in leftovers if usage_counts.get(r.id, 0) == 0]
+    kept = len(leftovers) - len(deletes)
+
+    if inserts:
+        db.session.execute(insert(Reflection), inserts)
+    if updates:
+        db.session.execute(update(Reflection), updates)
+    if deletes:
+        Reflection.query.filter(Reflection.id.in_(deletes)).delete(synchronize_session=False)
+    if inserts or updates or deletes:
+        # Core statements skip the flush hook that keeps ETags current
+        bump_versions(db.session.connection(), [('course', course.id)])
+    db.session.commit()
+
+    summary = {'created': len(inserts), 'updated': len(updates), 'deleted': len(deletes), 'kept_in_use': kept}
+    print(f"[SCHEDULE] Reconciled reflections for course {course.id}: {summary}")
+    return summary
+
+
+def virtual_occurrences(course, materialized_dates, structure_id=None):
+    """
+    Reflections a lazy course calls for that have no row yet, computed from the recurrence rule.
+
+    `materialized_dates` holds the start dates (as dates) of the course's stored
+    reflections. Each occurrence is keyed by its ISO start date, which the client
+    passes back to materialize it. `structure_id` is the course's current
+    structure version, for callers that show it.
+    """
+    occurrences = []
+    for number, start in enumerate(compute_occurrences(course), start=1):
+        if start.date() in materialized_dates:
+            continue
+        occurrence = occurrence_fields(course, number, start, structure_id)
+        occurrence.update(start_date=start, occurrence_date=start.date().isoformat())
+        occurrences.append(occurrence)
+    return occurrences
+
+
+def materialize_occurrence(course_id, occurrence_date):
+    """
+    Return the stored reflection for an occurrence of a lazy course, creating it on first use.
+
+    Returns None unless the course is lazy and its current configuration
+    schedules a reflection on `occurrence_date`. The insert skips a row a
+    concurrent first open already created (unique on course and start date),
+    and the row is then read back, so every caller gets the same reflection.
+    """
+    course = db.session.get(Course, course_id)
+    start = datetime.combine(occurrence_date, time.min)
+    occurrences = compute_occurrences(course) if course and course.lazy_reflections else []
+    if start not in occurrences:
+        db.session.rollback()
+        return None
+
+    def stored():
+        return Reflection.query.filter(
+            Reflection.course_id == course.id,
+            Reflection.start_date == start
+        ).order_by(Reflection.id).first()
+
+    reflection = stored()
+    if reflection:
+        db.session.commit()
+        return reflection
+
+    table = Reflection.__table__
+    fields = occurrence_fields(course, occurrences.index(start) + 1, start, ensure_course_structure(course))
+    created = db.session.execute(
+        insert_ignore(table, db.session.get_bind().dialect.name).values(
+            course_id=course.id,
+            description='',
+            start_date=start,
+            created_at=datetime.utcnow(),
+            **fields
+        )
+    ).rowcount
+    if created:
+        # Core statements skip the flush hook that keeps ETags current
+        bump_versions(db.session.connection(), [('course', course.id)])
+    db.session.commit()
+
+    reflection = stored()
+    if created:
+        print(f"[SCHEDULE] Materialized reflection {reflection.id} for course {course.id} on {occurrence_date}")
+    return reflection
+
+
+def prune_unused_reflections(course):
+    """
+    Delete a lazy course's stored reflections that nobody has submitted or started a draft for.
+
+    They are recomputed from the current configuration on the next read, so a
+    configuration change costs this one statement instead of a full reconcile.
+    """
+    used = or_(
+        exists().where(ReflectionSubmission.reflection_id == Reflection.id),
+        exists().where(SubmissionDraft.reflection_id == Reflection.id)
+    )
+    deleted = Reflection.query.filter(
+        Reflection.course_id == course.id,
+        ~used
+    ).delete(synchronize_session=False)
+    if deleted:
+        bump_versions(db.session.connection(), [('course', course.id)])
+    db.session.commit()
+    print(f"[SCHEDULE] Pruned {deleted} unused reflections for lazy course {course.id}")
+    return deleted
@@ -0,0 +1,57 @@
+import hashlib
+from datetime import datetime
+from sqlalchemy import func
+from ..models.models import db, ReflectionStructure
+
+
+def structure_hash(content):
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+
+def find_structure_id(course_id, content):
+    """Id of the course's stored version of `content`, or None"""
+    if not content:
+        return None
+    return db.session.query(ReflectionStructure.id).filter(
+        ReflectionStructure.course_id == course_id,
+        ReflectionStructure.content_hash == structure_hash(content)
+    ).order_by(ReflectionStructure.version.desc()).limit(1).scalar()
+
+
+def ensure_course_structure(course):
+    """
+    Id of the structure version matching the course's custom_structure, adding a version if it's new.
+
+    Returns None when the course has no custom structure. Switching back to an
+    earlier structure reuses its version rather than adding another.
+    """
+    structure_id = find_structure_id(course.id, course.custom_structure)
+    if structure_id or not course.custom_structure:
+        return structure_id
+
+    latest = db.session.query(func.max(ReflectionStructure.version)).filter(
+        ReflectionStructure.course_id == course.id
+    ).scalar()
+    structure = ReflectionStructure(
+        course_id=course.id,
+        version=(latest or 0) + 1,
+        content=course.custom_structure,
+        content_hash=structure_hash(course.custom_structure),
+        created_at=datetime.utcnow()
+    )
+    db.session.add(structure)
+    db.session.flush()
+    print(f"[SCHEDULE] Added structure version {structure.version} for course {course.id}")
+    return structure.id
+
+
+def load_structures(structure_ids):
+    """{id: content} for the given structure ids, in one query"""
+    structure_ids = {structure_id for structure_id in structure_ids if structure_id is not None}
+    if not structure_ids:
+        return {}
+    return dict(
+        db.session.query(ReflectionStructure.id, ReflectionStructure.content).filter(
+            ReflectionStructure.id.in_(structure_ids)
+        ).all()
+    )
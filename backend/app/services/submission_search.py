@@ -0,0 +1,93 @@
+import re
+from sqlalchemy import func, literal_column, table, column
+from ..models.models import db, Reflection, ReflectionSubmission, User
+from ..utils.listing import search_clause
+from ..utils.pagination import keyset_after
+
+# Text search configuration for the Postgres tsvector column
+SEARCH_CONFIG = 'english'
+
+# SQLite FTS5 index over reflection_submissions, kept in sync by triggers (migration 6)
+FTS_TABLE = 'reflection_submissions_fts'
+
+# Wraps matched terms in snippets; plain text, so the client never has to render HTML
+SNIPPET_START = '**'
+SNIPPET_END = '**'
+
+
+def _fts5_query(text):
+    """Quote each word so user input can't be parsed as FTS5 query syntax. Words are ANDed."""
+    return ' '.join(f'"{word}"' for word in re.findall(r'\w+', text))
+
+
+def _postgres_search(query, text):
+    vector = literal_column('reflection_submissions.search_vector')
+    tsquery = func.websearch_to_tsquery(SEARCH_CONFIG, text)
+    # Negated so that, like bm25(), lower sorts first
+    score = -func.ts_rank_cd(vector, tsquery)
+    snippet = func.ts_headline(
+        SEARCH_CONFIG,
+        func.coalesce(ReflectionSubmission.content, ''),
+        tsquery,
+        f'StartSel={SNIPPET_START}, StopSel={SNIPPET_END}, MaxFragments=2, MaxWords=20, MinWords=5'
+    )
+    return query.filter(vector.op('@@')(tsquery)), score, snippet
+
+
+def _sqlite_search(query, text):
+    fts = table(FTS_TABLE, column('rowid'))
+    fts_ref = literal_column(FTS_TABLE)
+    score = func.bm25(fts_ref)
+    snippet = func.snippet(fts_ref, -1, SNIPPET_START, SNIPPET_END, '…', 16)
+    query = query.join(fts, fts.c.rowid == ReflectionSubmission.id).filter(
+        fts_ref.op('MATCH')(_fts5_query(text))
+    )
+    return query, score, snippet
+
+
+def search_submissions(course_id, text, limit, cursor=None):
+    """
+    Ranked full-text search over the submitted reflections of a course.
+
+    Matches submission content and AI feedback, best match first. Pages with
+    a keyset cursor on (score, submission id). Returns (rows, has_more); each
+    row carries the score and a short snippet around the matched terms.
+    """
+    query = db.session.query(ReflectionSubmission.id).join(
+        Reflection, Reflection.id == ReflectionSubmission.reflection_id
+    ).join(
+        User, User.id == ReflectionSubmission.student_id
+    ).filter(
+        Reflection.course_id == course_id,
+        ReflectionSubmission.submitted_at.isnot(None)
+    )
+
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        query, score, snippet = _postgres_search(query, text)
+    elif dialect == 'sqlite':
+        if not _fts5_query(text):
+            return [], False
+        query, score, snippet = _sqlite_search(query, text)
+    else:
+        # No index to use; an unranked substring match keeps the endpoint working
+        query = query.filter(search_clause(text, ReflectionSubmission.content, ReflectionSubmission.ai_feedback))
+        score, snippet = literal_column('0.0'), func.substr(ReflectionSubmission.content, 1, 200)
+
+    query = query.with_entities(
+        ReflectionSubmission.id.label('submission_id'),
+        ReflectionSubmission.reflection_id,
+        Reflection.name.label('reflection_name'),
+        ReflectionSubmission.student_id,
+        User.name.label('student_name'),
+        ReflectionSubmission.submitted_at,
+        ReflectionSubmission.score,
+        score.label('rank'),
+        snippet.label('snippet')
+    )
+
+    sort_key = [score, ReflectionSubmission.id]
+    if cursor:
+        query = query.filter(keyset_after(sort_key, cursor))
+    rows = query.order_by(*sort_key).limit(limit + 1).all()
+    return rows[:limit], len(rows) > limit
@@ -0,0 +1,68 @@
+from sqlalchemy import update, delete, insert, select, func, case, or_
+from ..models.models import db, ReflectionStats, ReflectionSubmission, Reflection
+from ..utils.db_utils import insert_ignore
+
+
+def bump_reflection_stats(reflection_id, submitted=0, scored=0, last_submitted_at=None):
+    """
+    Apply counter deltas for a reflection inside the caller's transaction.
+
+    Call this next to the submission write it describes, so the counters
+    commit or roll back together with it.
+    """
+    table = ReflectionStats.__table__
+    values = {
+        'submitted_count': table.c.submitted_count + submitted,
+        'scored_count': table.c.scored_count + scored
+    }
+    if last_submitted_at is not None:
+        values['last_submitted_at'] = case(
+            (or_(table.c.last_submitted_at.is_(None), table.c.last_submitted_at < last_submitted_at), last_submitted_at),
+            else_=table.c.last_submitted_at
+        )
+
+    apply_deltas = update(table).where(table.c.reflection_id == reflection_id).values(**values)
+    if db.session.execute(apply_deltas).rowcount:
+        return
+
+    # First write for this reflection
+    created = db.session.execute(
+        insert_ignore(table, db.session.get_bind().dialect.name).values(
+            reflection_id=reflection_id,
+            submitted_count=max(submitted, 0),
+            scored_count=max(scored, 0),
+            last_submitted_at=last_submitted_at
+        )
+    ).rowcount
+    if not created:
+        # A concurrent transaction created the row first
+        db.session.execute(apply_deltas)
+
+
+def rebuild_reflection_stats(course_id=None):
+    """Recompute counters from reflection_submissions. Returns the number of rows written."""
+    table = ReflectionStats.__table__
+    submissions = ReflectionSubmission.__table__
+
+    aggregate = select(
+        submissions.c.reflection_id,
+        func.count(submissions.c.submitted_at),
+        func.count(submissions.c.score),
+        func.max(submissions.c.submitted_at)
+    ).group_by(submissions.c.reflection_id)
+
+    clear = delete(table)
+    if course_id is not None:
+        reflection_ids = select(Reflection.id).where(Reflection.course_id == course_id)
+        aggregate = aggregate.where(submissions.c.reflection_id.in_(reflection_ids))
+        clear = clear.where(table.c.reflection_id.in_(reflection_ids))
+
+    db.session.execute(clear)
+    written = db.session.execute(
+        insert(table).from_select(
+            ['reflection_id', 'submitted_count', 'scored_count', 'last_submitted_at'],
+            aggregate
+        )
+    ).rowcount
+    db.session.commit()
+    return written
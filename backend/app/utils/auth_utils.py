@@ -1,6 +1,91 @@
+import os
+import threading
+from collections import namedtuple
 from functools import wraps
-from flask import session, jsonify
-from ..models.models import User
+from cachetools import TTLCache
+from flask import session, jsonify, g
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+from ..models.models import db, User
+
+# What authorization and most routes need to know about the caller
+Identity = namedtuple('Identity', ['id', 'role', 'name', 'email'])
+
+# Per-process identity cache. Local writes invalidate it immediately; the TTL bounds
+# how long another worker process can serve a stale entry.
+_identity_cache = TTLCache(
+    maxsize=int(os.environ.get('IDENTITY_CACHE_SIZE', 4096)),
+    ttl=int(os.environ.get('IDENTITY_CACHE_TTL', 60))
+)
+_identity_lock = threading.Lock()
+
+
+def load_identity(user_id):
+    """Return the cached Identity for a user, loading it on a miss. None if the user doesn't exist."""
+    with _identity_lock:
+        identity = _identity_cache.get(user_id)
+    if identity is not None:
+        return identity
+
+    row = db.session.query(User.id, User.role, User.name, User.email).filter(User.id == user_id).first()
+    if not row:
+        return None
+
+    identity = Identity(row.id, row.role, row.name, row.email)
+    with _identity_lock:
+        _identity_cache[user_id] = identity
+    return identity
+
+
+def invalidate_identity(user_id):
+    with _identity_lock:
+        _identity_cache.pop(user_id, None)
+
+
+def current_user():
+    """The signed-in user's Identity, resolved at most once per request"""
+    if 'user_id' not in session:
+        return None
+    if 'identity' not in g:
+        g.identity = load_identity(session['user_id'])
+    return g.identity
+
+
+def login_user(user):
+    """Put the user's id and role in the signed session cookie"""
+    session['user_id'] = user.id
+    session['user_role'] = user.role
+
+
+def _session_role():
+    """Role from the signed session, backfilled for sessions created before it was stored"""
+    if 'user_role' not in session:
+        identity = current_user()
+        if not identity:
+            return None
+        session['user_role'] = identity.role
+    return session['user_role']
+
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _queue_identity_invalidation(mapper, connection, target):
+    # Defer until commit so a concurrent request can't re-cache the old row in between
+    sess = object_session(target)
+    if sess is not None:
+        sess.info.setdefault('stale_identities', set()).add(target.id)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_committed_identities(sess):
+    for user_id in sess.info.pop('stale_identities', ()):
+        invalidate_identity(user_id)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_identity_invalidations(sess):
+    sess.info.pop('stale_identities', None)
+
 
 def login_required(f):
     @wraps(f)
@@ -15,11 +100,10 @@ def teacher_required(f):
     def decorated_function(*args, **kwargs):
         if 'user_id' not in session:
             return jsonify({'error': 'Authentication required'}), 401
-        
-        user = User.query.get(session['user_id'])
-        if not user or user.role != 'teacher':
+
+        if _session_role() != 'teacher':
             return jsonify({'error': 'Teacher access required'}), 403
-        
+
         return f(*args, **kwargs)
     return decorated_function
 
@@ -28,10 +112,9 @@ def student_required(f):
     def decorated_function(*args, **kwargs):
         if 'user_id' not in session:
             return jsonify({'error': 'Authentication required'}), 401
-        
-        user = User.query.get(session['user_id'])
-        if not user or user.role != 'student':
+
+        if _session_role() != 'student':
             return jsonify({'error': 'Student access required'}), 403
-        
+
         return f(*args, **kwargs)
     return decorated_function
@@ -0,0 +1,72 @@
+import time
+from functools import wraps
+from flask import request, session, g, has_request_context
+from flask_sqlalchemy.session import Session
+
+# Flask session key holding the time until which this client's reads stay on the primary
+STICKY_KEY = '_primary_until'
+
+
+class RoutingSession(Session):
+    """
+    Session that sends a request's reads to the 'replica' bind when one is configured.
+
+    A request reads from the replica only if init_db_routing() marked it as
+    eligible: a GET/HEAD to a view without @use_primary, from a client that
+    hasn't written recently. Flushes, DML, SELECT ... FOR UPDATE and anything
+    after the session's first write always use the primary, as does all work
+    outside a request (feedback worker, CLI commands, migrations).
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and self._reads_from_replica(clause):
+            return self._db.engines['replica']
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def _reads_from_replica(self, clause):
+        if not has_request_context() or not g.get('_read_replica'):
+            return False
+        if self._flushing or _is_write(clause):
+            # Read-after-write: the rest of this request sees its own changes
+            g._read_replica = False
+            g._db_wrote = True
+            return False
+        return True
+
+
+def _is_write(clause):
+    if clause is None:
+        return False
+    if getattr(clause, 'is_dml', False):
+        return True
+    return getattr(clause, '_for_update_arg', None) is not None
+
+
+def use_primary(view):
+    """Always read from the primary in this view (GETs that write, or that must not see replica lag)"""
+    view._use_primary = True
+    return view
+
+
+def init_db_routing(app):
+    """Route eligible reads to the replica and keep clients that just wrote on the primary"""
+    sticky_seconds = app.config['REPLICA_STICKY_SECONDS']
+
+    @app.before_request
+    def _choose_bind():
+        if request.method not in ('GET', 'HEAD'):
+            return
+        view = app.view_functions.get(request.endpoint)
+        if view is None or getattr(view, '_use_primary', False):
+            return
+        if session.get(STICKY_KEY, 0) > time.time():
+            return
+        g._read_replica = True
+
+    @app.after_request
+    def _stick_to_primary(response):
+        # Writes from a GET are caught by RoutingSession; any other method may have written
+        if g.get('_db_wrote') or request.method not in ('GET', 'HEAD', 'OPTIONS'):
+            if 'user_id' in session:
+                session[STICKY_KEY] = time.time() + sticky_seconds
+        return response
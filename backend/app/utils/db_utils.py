@@ -0,0 +1,36 @@
+from sqlalchemy import insert
+from sqlalchemy.dialects import postgresql, sqlite
+
+
+def insert_ignore(table, dialect_name):
+    """
+    Build an INSERT that silently skips rows violating a unique constraint.
+
+    Postgres and SQLite both support ON CONFLICT DO NOTHING; other backends
+    get a plain INSERT and the caller is expected to handle IntegrityError.
+    """
+    if dialect_name == 'postgresql':
+        return postgresql.insert(table).on_conflict_do_nothing()
+    if dialect_name == 'sqlite':
+        return sqlite.insert(table).on_conflict_do_nothing()
+    return insert(table)
+
+
+def upsert(table, dialect_name, index_elements, update_columns):
+    """
+    Build an INSERT that updates `update_columns` instead when a row already
+    matches the unique `index_elements` (ON CONFLICT ... DO UPDATE).
+
+    The updated columns take the values the statement tried to insert.
+    Only Postgres and SQLite are supported.
+    """
+    if dialect_name == 'postgresql':
+        statement = postgresql.insert(table)
+    elif dialect_name == 'sqlite':
+        statement = sqlite.insert(table)
+    else:
+        raise NotImplementedError(f'Upsert is not supported on {dialect_name}')
+    return statement.on_conflict_do_update(
+        index_elements=index_elements,
+        set_={column: statement.excluded[column] for column in update_columns}
+    )
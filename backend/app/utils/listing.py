@@ -0,0 +1,120 @@
+from collections import namedtuple
+from datetime import date, datetime
+from sqlalchemy import Date, DateTime, func, or_
+from .pagination import encode_cursor, decode_cursor, keyset_after, parse_limit
+from .serialization import Serializer, iso
+
+# Query-string options shared by the list endpoints
+ListingArgs = namedtuple('ListingArgs', ['search', 'status', 'limit', 'cursor', 'fields'])
+
+# How a list endpoint exposes one field: the column to select and an optional formatter
+Field = namedtuple('Field', ['column', 'format'])
+
+
+def parse_listing_args(args, fields, default_limit=None):
+    """
+    Parse ?search=, ?status=, ?limit=, ?cursor= and ?fields= for a list endpoint.
+
+    `fields` is the endpoint's field spec; ?fields= picks a subset of it and
+    defaults to all of them. Raises ValueError for anything malformed.
+    """
+    search = (args.get('search') or '').strip().lower() or None
+    status = args.get('status')
+    if status == 'all':
+        status = None
+
+    limit = parse_limit(args.get('limit'), default=default_limit)
+    cursor = decode_cursor(args['cursor']) if args.get('cursor') else None
+
+    if args.get('fields'):
+        requested = [name.strip() for name in args['fields'].split(',') if name.strip()]
+        unknown = [name for name in requested if name not in fields]
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    else:
+        requested = list(fields)
+
+    return ListingArgs(search, status, limit, cursor, requested)
+
+
+def search_clause(term, *columns):
+    """
+    Case-insensitive substring match of `term` against any of `columns`.
+
+    Compiles to lower(column) LIKE '%term%', which the pg_trgm GIN indexes
+    from migration 5 serve on Postgres.
+    """
+    escaped = term.lower().replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    pattern = f'%{escaped}%'
+    return or_(*(func.lower(column).like(pattern, escape='\\') for column in columns))
+
+
+def select_fields(fields, spec, sort_key):
+    """Columns for the requested fields plus the sort key, labeled so rows can be rendered and paged"""
+    columns = [spec[name].column.label(name) for name in fields]
+    columns += [column.label(f'_key{i}') for i, column in enumerate(sort_key)]
+    return columns
+
+
+# Compiled row serializers, per field spec and field selection
+_row_serializers = {}
+
+
+def _row_serializer(fields, spec):
+    key = (id(spec), tuple(fields))
+    serializer = _row_serializers.get(key)
+    if serializer is None:
+        # Rows from select_fields() expose each field under its own label
+        serializer = _row_serializers[key] = Serializer(**{name: (name, spec[name].format) for name in fields})
+    return serializer
+
+
+def render(row, fields, spec):
+    return _row_serializer(fields, spec).dump(row)
+
+
+def render_many(rows, fields, spec):
+    return _row_serializer(fields, spec).dump_many(rows)
+
+
+def row_key(row, sort_key):
+    return [getattr(row, f'_key{i}') for i in range(len(sort_key))]
+
+
+def _coerce(column, value):
+    # Cursors round-trip through JSON, so temporal values come back as strings
+    if value is None or not isinstance(value, str):
+        return value
+    if isinstance(column.type, DateTime):
+        return datetime.fromisoformat(value)
+    if isinstance(column.type, Date):
+        return date.fromisoformat(value[:10])
+    return value
+
+
+def apply_keyset(query, sort_key, limit=None, cursor=None):
+    """
+    Order `query` by `sort_key`, resume after `cursor` and fetch one row past `limit`.
+
+    Raises ValueError if the cursor doesn't fit the sort key.
+    """
+    if cursor:
+        if len(cursor) != len(sort_key):
+            raise ValueError('Invalid cursor')
+        try:
+            values = [_coerce(column, value) for column, value in zip(sort_key, cursor)]
+        except ValueError:
+            raise ValueError('Invalid cursor')
+        query = query.filter(keyset_after(sort_key, values))
+    query = query.order_by(*sort_key)
+    return query.limit(limit + 1) if limit else query
+
+
+def split_page(items, limit, key):
+    """Trim the look-ahead row off a page. Returns (items, next_cursor)."""
+    if not limit:
+        return items, None
+    if len(items) <= limit:
+        return items, None
+    items = items[:limit]
+    return items, encode_cursor(key(items[-1]))
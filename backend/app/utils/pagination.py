@@ -0,0 +1,46 @@
+import json
+import base64
+from sqlalchemy import and_, or_
+
+
+def encode_cursor(values):
+    """Opaque cursor for the sort key of the last row on a page"""
+    raw = json.dumps(values, separators=(',', ':'), default=str).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Inverse of encode_cursor. Raises ValueError for malformed cursors."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except Exception:
+        raise ValueError('Invalid cursor')
+    if not isinstance(values, list):
+        raise ValueError('Invalid cursor')
+    return values
+
+
+def keyset_after(columns, values):
+    """
+    Filter for rows sorting strictly after `values` on ascending `columns`.
+
+    Expanded into OR/AND form rather than a row-value comparison so it works
+    on every backend we support.
+    """
+    clauses = []
+    for i, column in enumerate(columns):
+        equal_prefix = [columns[j] == values[j] for j in range(i)]
+        clauses.append(and_(*equal_prefix, column > values[i]))
+    return or_(*clauses)
+
+
+def parse_limit(value, default=None, maximum=500):
+    """Parse a ?limit= argument, clamped to 1..maximum. Returns default when absent."""
+    if value in (None, ''):
+        return default
+    try:
+        limit = int(value)
+    except (TypeError, ValueError):
+        raise ValueError('limit must be an integer')
+    return max(1, min(limit, maximum))
@@ -0,0 +1,123 @@
+import hashlib
+from itertools import chain
+from functools import wraps
+from flask import request, session, make_response
+from sqlalchemy import event, update, bindparam, func, and_, or_
+from sqlalchemy.orm import Session
+from ..models.models import db, ResourceVersion, Course, Enrollment, Reflection, ReflectionStructure, ReflectionSubmission, User
+from .db_utils import insert_ignore
+
+
+def _keys_for(obj):
+    """(kind, id) pairs whose cached representations change when `obj` is written"""
+    if isinstance(obj, Course):
+        # The teacher's course list shows course fields
+        return [('course', obj.id), ('user', obj.teacher_id)]
+    if isinstance(obj, (Reflection, ReflectionStructure)):
+        return [('course', obj.course_id)]
+    if isinstance(obj, ReflectionSubmission):
+        # Submissions only show up in the student's own views
+        return [('user', obj.student_id)]
+    if isinstance(obj, Enrollment):
+        return [('course', obj.course_id), ('user', obj.student_id)]
+    if isinstance(obj, User):
+        return [('user', obj.id)]
+    return []
+
+
+def bump_versions(connection, keys):
+    """
+    Increment the change counters for (kind, id) pairs inside the caller's transaction.
+
+    ORM writes are picked up automatically on flush; core INSERT/UPDATE/DELETE
+    statements bypass that and must call this next to the write.
+    """
+    keys = sorted({(kind, resource_id) for kind, resource_id in keys if resource_id is not None})
+    if not keys:
+        return
+    table = ResourceVersion.__table__
+    rows = [{'b_kind': kind, 'b_id': resource_id} for kind, resource_id in keys]
+    # Two statements however many keys: create missing counters, then increment all
+    connection.execute(
+        insert_ignore(table, connection.dialect.name).values(
+            kind=bindparam('b_kind'), resource_id=bindparam('b_id'), version=0
+        ),
+        rows
+    )
+    connection.execute(
+        update(table).where(
+            table.c.kind == bindparam('b_kind'),
+            table.c.resource_id == bindparam('b_id')
+        ).values(version=table.c.version + 1),
+        rows
+    )
+
+
+@event.listens_for(Session, 'after_flush')
+def _bump_flushed_versions(sess, flush_context):
+    keys = set()
+    for obj in chain(sess.new, sess.deleted):
+        keys.update(_keys_for(obj))
+    for obj in sess.dirty:
+        if sess.is_modified(obj, include_collections=False):
+            keys.update(_keys_for(obj))
+    if keys:
+        bump_versions(sess.connection(), keys)
+
+
+def current_versions(*keys):
+    """Versions of the given (kind, id) pairs, 0 for ones never written"""
+    table = ResourceVersion.__table__
+    found = dict(
+        ((row.kind, row.resource_id), row.version) for row in db.session.execute(
+            table.select().where(or_(*(
+                and_(table.c.kind == kind, table.c.resource_id == resource_id) for kind, resource_id in keys
+            )))
+        )
+    ) if keys else {}
+    return [found.get(key, 0) for key in keys]
+
+
+def enrolled_courses_version(student_id):
+    """
+    Combined version of every course a student is enrolled in.
+
+    Enrollment changes bump the student's own counter, so with that fixed the
+    set of courses is fixed and any course write strictly increases the sum.
+    """
+    table = ResourceVersion.__table__
+    count, total = db.session.query(
+        func.count(Enrollment.id),
+        func.coalesce(func.sum(table.c.version), 0)
+    ).select_from(Enrollment).outerjoin(
+        table, and_(table.c.kind == 'course', table.c.resource_id == Enrollment.course_id)
+    ).filter(Enrollment.student_id == student_id).one()
+    return [count, total]
+
+
+def conditional(versions, cache_control='private, no-cache'):
+    """
+    Answer conditional GETs from change counters before running the view.
+
+    `versions(**view_kwargs)` returns a list of values that change whenever
+    the response would; it should cost one small query. The ETag also covers
+    the path, query string and signed-in user, so it is only ever compared
+    against the same request. `cache_control` is sent with 200s and 304s.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            token = repr([request.full_path, session.get('user_id'), session.get('user_role'), versions(**kwargs)])
+            etag = hashlib.sha1(token.encode('utf-8')).hexdigest()
+
+            if request.if_none_match.contains_weak(etag):
+                response = make_response('', 304)
+            else:
+                response = make_response(f(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag, weak=True)
+            response.headers['Cache-Control'] = cache_control
+            return response
+        return decorated_function
+    return decorator
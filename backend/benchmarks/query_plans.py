@@ -0,0 +1,291 @@
+"""
+Query-plan benchmark for the hot route queries.
+
+Seeds a realistic dataset, then records the EXPLAIN plan and latency
+percentiles of each route's main query. Compare against a saved run to
+catch plan regressions (a query falling back to a full table scan) or
+latency regressions.
+
+Usage (from backend/):
+    python -m benchmarks.query_plans --output plans.json
+    python -m benchmarks.query_plans --baseline plans.json
+    BENCH_DATABASE_URL=postgresql://... python -m benchmarks.query_plans
+
+The database comes from --database-url or BENCH_DATABASE_URL, never from
+DATABASE_URL, so a benchmark run can't seed the app's own database; without
+either it seeds a temporary SQLite file. --keep-data skips seeding to re-run
+against a database an earlier run already filled.
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import statistics
+from datetime import datetime, timedelta
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Record EXPLAIN plans and latencies for route queries')
+    parser.add_argument('--database-url', default=os.environ.get('BENCH_DATABASE_URL'),
+                        help='Database to seed (defaults to a temporary SQLite file)')
+    parser.add_argument('--teachers', type=int, default=20)
+    parser.add_argument('--courses-per-teacher', type=int, default=3)
+    parser.add_argument('--students', type=int, default=2000)
+    parser.add_argument('--students-per-course', type=int, default=150)
+    parser.add_argument('--reflections-per-course', type=int, default=40)
+    parser.add_argument('--submission-rate', type=float, default=0.6, help='Share of past reflections submitted')
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--output', help='Write results as JSON to this file')
+    parser.add_argument('--baseline', help='Compare against a previous --output file')
+    parser.add_argument('--latency-threshold', type=float, default=2.0,
+                        help='Flag queries whose p50 grew by more than this factor')
+    parser.add_argument('--keep-data', action='store_true', help='Reuse existing data instead of seeding')
+    return parser.parse_args()
+
+
+def seed(db, models, args):
+    """Bulk insert a dataset shaped like a busy deployment"""
+    rng = random.Random(42)
+    now = datetime.utcnow()
+    start = (now - timedelta(days=120)).replace(hour=0, minute=0, second=0, microsecond=0)
+
+    users = [{
+        'email': f'teacher{i}@bench.test', 'name': f'Teacher {i}', 'google_id': f'bench_t{i}',
+        'role': 'teacher', 'created_at': now
+    } for i in range(args.teachers)]
+    users += [{
+        'email': f'student{i}@bench.test', 'name': f'Student {i:05d}', 'google_id': f'bench_s{i}',
+        'role': 'student', 'created_at': now
+    } for i in range(args.students)]
+    db.session.execute(models.User.__table__.insert(), users)
+
+    teacher_ids = [row.id for row in db.session.query(models.User.id).filter_by(role='teacher').order_by(models.User.id)]
+    student_ids = [row.id for row in db.session.query(models.User.id).filter_by(role='student').order_by(models.User.id)]
+
+    courses = []
+    for teacher_id in teacher_ids:
+        for j in range(args.courses_per_teacher):
+            courses.append({
+                'name': f'Course {teacher_id}-{j}', 'course_code': f'C{teacher_id}{j}', 'teacher_id': teacher_id,
+                'status': 'active' if j else 'archived', 'framework': '5 WHYs',
+                'start_date': start.date(), 'end_date': (start + timedelta(days=7 * args.reflections_per_course)).date(),
+                'created_at': now
+            })
+    db.session.execute(models.Course.__table__.insert(), courses)
+    course_ids = [row.id for row in db.session.query(models.Course.id).order_by(models.Course.id)]
+
+    enrollments = []
+    roster = {}
+    for course_id in course_ids:
+        roster[course_id] = rng.sample(student_ids, min(args.students_per_course, len(student_ids)))
+        enrollments += [{'student_id': s, 'course_id': course_id, 'enrolled_at': now} for s in roster[course_id]]
+    db.session.execute(models.Enrollment.__table__.insert(), enrollments)
+
+    reflections = []
+    for course_id in course_ids:
+        for n in range(args.reflections_per_course):
+            opens = start + timedelta(days=7 * n)
+            reflections.append({
+                'course_id': course_id, 'name': f'Reflection {opens.strftime("%d/%m")}', 'number': n + 1,
+                'description': '', 'start_date': opens, 'due_date': opens + timedelta(days=7), 'created_at': now
+            })
+    db.session.execute(models.Reflection.__table__.insert(), reflections)
+
+    submissions = []
+    content = json.dumps([{'label': 'What happened?', 'response': 'lorem ipsum ' * 40}])
+    for row in db.session.query(models.Reflection.id, models.Reflection.course_id, models.Reflection.start_date):
+        if row.start_date > now:
+            continue
+        for student_id in roster[row.course_id]:
+            if rng.random() < args.submission_rate:
+                submitted_at = row.start_date + timedelta(days=rng.randint(0, 6))
+                submissions.append({
+                    'reflection_id': row.id, 'student_id': student_id, 'content': content,
+                    'ai_feedback': 'Good work. ' * 30, 'score': rng.choice([None, 7.0, 8.5]),
+                    'display_feedback': False, 'submitted_at': submitted_at,
+                    'created_at': submitted_at, 'updated_at': submitted_at
+                })
+        if len(submissions) >= 5000:
+            db.session.execute(models.ReflectionSubmission.__table__.insert(), submissions)
+            submissions = []
+    if submissions:
+        db.session.execute(models.ReflectionSubmission.__table__.insert(), submissions)
+    db.session.commit()
+
+
+def build_queries(db, models):
+    """The main query of each hot route, parameterized with representative ids"""
+    from sqlalchemy import select, func, and_
+
+    User, Course, Enrollment = models.User, models.Course, models.Enrollment
+    Reflection, ReflectionSubmission = models.Reflection, models.ReflectionSubmission
+    ReflectionStats = models.ReflectionStats
+
+    # Pick the busiest course and a student enrolled in it
+    course_id, teacher_id = db.session.query(Course.id, Course.teacher_id).join(
+        Enrollment, Enrollment.course_id == Course.id
+    ).group_by(Course.id, Course.teacher_id).order_by(func.count().desc()).first()
+    student_id = db.session.query(Enrollment.student_id).filter_by(course_id=course_id).first()[0]
+    reflection_id = db.session.query(Reflection.id).filter(
+        Reflection.course_id == course_id, Reflection.start_date <= datetime.utcnow()
+    ).order_by(Reflection.start_date.desc()).first()[0]
+    now = datetime.utcnow()
+
+    return {
+        'courses.teacher_list': select(Course).where(Course.teacher_id == teacher_id, Course.status == 'active'),
+        'courses.student_list': select(Course).join(Enrollment, Enrollment.course_id == Course.id).where(
+            Enrollment.student_id == student_id),
+        'courses.reflection_dates': select(Reflection.start_date).where(
+            Reflection.course_id == course_id).order_by(Reflection.start_date),
+        'reflections.course_list': select(Reflection).where(
+            Reflection.course_id == course_id).order_by(
+            func.coalesce(Reflection.start_date, datetime.max), Reflection.id),
+        'reflections.student_submission': select(ReflectionSubmission).where(
+            ReflectionSubmission.reflection_id == reflection_id, ReflectionSubmission.student_id == student_id),
+        'reflections.teacher_submissions': select(
+            User.id, User.name, User.email, ReflectionSubmission.id, ReflectionSubmission.submitted_at,
+            ReflectionSubmission.score
+        ).select_from(Enrollment).join(User, User.id == Enrollment.student_id).outerjoin(
+            ReflectionSubmission,
+            and_(ReflectionSubmission.reflection_id == reflection_id,
+                 ReflectionSubmission.student_id == Enrollment.student_id)
+        ).where(Enrollment.course_id == course_id).order_by(User.name, User.id).limit(100),
+        'reflections.student_dashboard': select(
+            Reflection.id, Reflection.name, Reflection.due_date, Course.name, Course.course_code
+        ).select_from(Enrollment).join(Course, Course.id == Enrollment.course_id).join(
+            Reflection, Reflection.course_id == Course.id
+        ).outerjoin(
+            ReflectionSubmission,
+            and_(ReflectionSubmission.reflection_id == Reflection.id,
+                 ReflectionSubmission.student_id == student_id,
+                 ReflectionSubmission.submitted_at.isnot(None))
+        ).where(
+            Enrollment.student_id == student_id, ReflectionSubmission.id.is_(None), Reflection.due_date >= now
+        ).order_by(Reflection.due_date, Reflection.id),
+        'teacher.course_overview': select(
+            Reflection.id, Reflection.name, ReflectionStats.submitted_count, ReflectionStats.scored_count
+        ).outerjoin(ReflectionStats, ReflectionStats.reflection_id == Reflection.id).where(
+            Reflection.course_id == course_id).order_by(
+            func.coalesce(Reflection.start_date, datetime.max), Reflection.id),
+        'teacher.enrollment_count': select(func.count()).select_from(Enrollment).where(
+            Enrollment.course_id == course_id),
+        'students.course_roster': select(User.id, User.name, User.email, Enrollment.enrolled_at).join(
+            Enrollment, Enrollment.student_id == User.id).where(Enrollment.course_id == course_id),
+    }
+
+
+def explain(conn, statement):
+    compiled = statement.compile(dialect=conn.dialect)
+    params = compiled.construct_params()
+    if conn.dialect.name == 'sqlite':
+        positional = tuple(params[name] for name in compiled.positiontup)
+        rows = conn.exec_driver_sql('EXPLAIN QUERY PLAN ' + compiled.string, positional).fetchall()
+        return [row[-1] for row in rows]
+    if conn.dialect.name == 'postgresql':
+        rows = conn.exec_driver_sql('EXPLAIN ' + compiled.string, params).fetchall()
+        return [row[0] for row in rows]
+    return []
+
+
+def full_scans(plan):
+    """Plan lines that read a whole table"""
+    scans = []
+    for line in plan:
+        if line.startswith('SCAN ') and 'USING' not in line:
+            scans.append(line)
+        elif 'Seq Scan' in line:
+            scans.append(line.strip())
+    return scans
+
+
+def time_query(conn, statement, iterations):
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        conn.execute(statement).fetchall()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return {
+        'p50_ms': round(statistics.median(samples), 3),
+        'p95_ms': round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 3),
+        'max_ms': round(samples[-1], 3)
+    }
+
+
+def compare(results, baseline, threshold):
+    regressions = []
+    for name, result in results['queries'].items():
+        previous = baseline.get('queries', {}).get(name)
+        if not previous:
+            continue
+        new_scans = set(result['full_scans']) - set(previous['full_scans'])
+        if new_scans:
+            regressions.append(f'{name}: new full scans {sorted(new_scans)}')
+        if previous['p50_ms'] and result['p50_ms'] > previous['p50_ms'] * threshold:
+            regressions.append(f"{name}: p50 {previous['p50_ms']}ms -> {result['p50_ms']}ms")
+    return regressions
+
+
+def main():
+    args = parse_args()
+    if not args.database_url:
+        args.database_url = f'sqlite:///{tempfile.mkdtemp()}/bench.db'
+    os.environ['DATABASE_URL'] = args.database_url
+    os.environ['FEEDBACK_WORKER_AUTOSTART'] = 'false'
+
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+    from app import create_app
+    from app.models import models
+    from app.models.models import db
+    from app.services.submission_stats import rebuild_reflection_stats
+
+    app = create_app()
+    with app.app_context():
+        if not args.keep_data:
+            print(f'Seeding {args.database_url} ...')
+            started = time.perf_counter()
+            seed(db, models, args)
+            rebuild_reflection_stats()
+            print(f'Seeded in {time.perf_counter() - started:.1f}s')
+
+        # Fresh statistics so the planner sees the seeded distribution
+        if db.engine.dialect.name in ('postgresql', 'sqlite'):
+            with db.engine.begin() as conn:
+                conn.exec_driver_sql('ANALYZE')
+
+        results = {
+            'dialect': db.engine.dialect.name,
+            'recorded_at': datetime.utcnow().isoformat(),
+            'iterations': args.iterations,
+            'queries': {}
+        }
+        with db.engine.connect() as conn:
+            for name, statement in build_queries(db, models).items():
+                plan = explain(conn, statement)
+                result = {'plan': plan, 'full_scans': full_scans(plan)}
+                result.update(time_query(conn, statement, args.iterations))
+                results['queries'][name] = result
+                flag = '  FULL SCAN' if result['full_scans'] else ''
+                print(f"{name:<36} p50 {result['p50_ms']:>8.3f}ms  p95 {result['p95_ms']:>8.3f}ms{flag}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f'Wrote {args.output}')
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.latency_threshold)
+        for regression in regressions:
+            print(f'REGRESSION {regression}')
+        if regressions:
+            sys.exit(1)
+        print('No plan regressions')
+
+
+if __name__ == '__main__':
+    main()
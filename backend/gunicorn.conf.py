@@ -0,0 +1,60 @@
+"""
+Gunicorn settings for serving RJMS in production.
+
+    cd backend && gunicorn -c gunicorn.conf.py run:app
+
+The app is preloaded in the master, so migrations run once and workers fork
+with the code already imported. Each worker then drops the connections it
+inherited and starts its own feedback worker (see post_fork below).
+"""
+import multiprocessing
+import os
+
+bind = f"{os.environ.get('HOST', '0.0.0.0')}:{os.environ.get('PORT', 5001)}"
+
+# Workers and threads per worker
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+worker_class = 'gthread' if threads > 1 else 'sync'
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+
+# Recycle workers now and then so slow leaks can't accumulate
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 2000))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 200))
+
+preload_app = True
+
+accesslog = '-'
+errorlog = '-'
+loglevel = os.environ.get('GUNICORN_LOG_LEVEL', 'info')
+
+# Size each worker's DB pool for its request threads plus its feedback worker
+# threads, unless set explicitly. Read by create_app() when the app is preloaded.
+os.environ.setdefault('DB_POOL_SIZE', str(threads + int(os.environ.get('FEEDBACK_WORKERS', 4))))
+
+# Threads don't survive fork, so the master must not start the feedback worker;
+# each forked worker starts its own in post_fork. The original setting is kept
+# in the environment because SIGHUP re-reads this file in the same process.
+_feedback_autostart = os.environ.setdefault(
+    'GUNICORN_FEEDBACK_AUTOSTART', os.environ.get('FEEDBACK_WORKER_AUTOSTART', 'true')
+).lower() == 'true'
+os.environ['FEEDBACK_WORKER_AUTOSTART'] = 'false'
+
+
+def post_fork(server, worker):
+    from app.models.models import db
+
+    app = server.app.wsgi()
+    with app.app_context():
+        # Connections opened by the master (migrations, startup checks) must not
+        # be shared across processes; close=False leaves the master's sockets alone.
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+
+        if app.config['FEEDBACK_ASYNC'] and _feedback_autostart:
+            from app.services.feedback_jobs import init_feedback_worker
+            init_feedback_worker(app)
+
+    print(f'[SERVER] Worker {worker.pid} ready')
@@ -0,0 +1,86 @@
+import os
+import sys
+import tempfile
+import itertools
+from datetime import datetime, timedelta
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_tmp = tempfile.mkdtemp()
+os.environ['DATABASE_URL'] = f'sqlite:///{_tmp}/test.db'
+os.environ['IMAGE_STORE_PATH'] = f'{_tmp}/images'
+os.environ['FEEDBACK_WORKER_AUTOSTART'] = 'false'  # Tests run jobs directly
+
+from google.api_core import exceptions as api_exceptions
+from app import create_app
+from app.models.models import db, User, Course, Enrollment, Reflection
+from app.services import ai_feedback
+from app.services.gemini_client import GeminiClient
+
+_ids = itertools.count(1)
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeModel:
+    """Stands in for genai.GenerativeModel; set `fail` to make every call raise"""
+
+    def __init__(self):
+        self.calls = 0
+        self.fail = False
+
+    def generate_content(self, prompt, stream=False, **kwargs):
+        self.calls += 1
+        if self.fail:
+            raise api_exceptions.ServiceUnavailable('Gemini is down')
+        labels = [line[4:].strip() for line in prompt.splitlines() if line.startswith('### ')]
+        text = '\n'.join(f'### {label}\nGood {label}.' for label in labels) or f'Nice work {self.calls}'
+        return iter([FakeResponse(text)]) if stream else FakeResponse(text)
+
+
+@pytest.fixture(scope='session')
+def app():
+    return create_app()
+
+
+@pytest.fixture
+def gemini(monkeypatch):
+    """A fresh client (no retries, closed breaker) around a FakeModel"""
+    client = GeminiClient(ai_feedback.GEMINI_MODEL, max_retries=0)
+    client._model = FakeModel()
+    monkeypatch.setattr(ai_feedback, 'gemini', client)
+    return client._model
+
+
+@pytest.fixture
+def seed(app):
+    """A teacher's course with one enrolled student and an open reflection"""
+    n = next(_ids)
+    with app.app_context():
+        teacher = User(email=f'teacher{n}@example.com', name=f'Teacher {n}', google_id=f'gt{n}', role='teacher')
+        student = User(email=f'student{n}@example.com', name=f'Student {n}', google_id=f'gs{n}', role='student')
+        db.session.add_all([teacher, student])
+        db.session.flush()
+        course = Course(name=f'Course {n}', course_code=f'C{n}', teacher_id=teacher.id)
+        db.session.add(course)
+        db.session.flush()
+        db.session.add(Enrollment(student_id=student.id, course_id=course.id))
+        reflection = Reflection(
+            course_id=course.id, name='Week 1', number=1,
+            start_date=datetime.utcnow() - timedelta(days=1),
+            due_date=datetime.utcnow() + timedelta(days=7)
+        )
+        db.session.add(reflection)
+        db.session.commit()
+        return {'teacher_id': teacher.id, 'student_id': student.id, 'course_id': course.id, 'reflection_id': reflection.id}
+
+
+def login(client, user_id, role):
+    with client.session_transaction() as session:
+        session['user_id'] = user_id
+        session['user_role'] = role
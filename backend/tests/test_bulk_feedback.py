@@ -0,0 +1,43 @@
+from app.models.models import db, ReflectionSubmission, FeedbackBatch
+from app.services.feedback_jobs import claim_job, run_feedback_job
+from app.services.bulk_feedback import run_feedback_batch
+from conftest import login
+
+
+def _submit_with_feedback(app, seed, content):
+    client = app.test_client()
+    login(client, seed['student_id'], 'student')
+    job_id = client.post(
+        '/api/reflections/submit',
+        json={'reflection_id': seed['reflection_id'], 'content': content}
+    ).get_json()['feedback_job']['id']
+    with app.app_context():
+        assert claim_job(job_id)
+        run_feedback_job(job_id)
+        return db.session.query(ReflectionSubmission.ai_feedback).filter_by(student_id=seed['student_id']).scalar()
+
+
+def _run_batch(app, seed):
+    with app.app_context():
+        batch = FeedbackBatch(reflection_id=seed['reflection_id'], requested_by=seed['teacher_id'], force=True)
+        db.session.add(batch)
+        db.session.commit()
+        run_feedback_batch(app, batch.id, max_workers=2)
+        batch = db.session.get(FeedbackBatch, batch.id)
+        feedback = db.session.query(ReflectionSubmission.ai_feedback).filter_by(student_id=seed['student_id']).scalar()
+        return batch.completed, batch.failed, feedback
+
+
+def test_batch_regenerates_feedback(app, seed, gemini):
+    original = _submit_with_feedback(app, seed, 'Photosynthesis notes (batch success)')
+    completed, failed, feedback = _run_batch(app, seed)
+    assert (completed, failed) == (1, 0)
+    assert feedback.startswith('Nice work') and feedback != original
+
+
+def test_batch_keeps_feedback_when_gemini_fails(app, seed, gemini):
+    original = _submit_with_feedback(app, seed, 'Photosynthesis notes (batch failure)')
+    gemini.fail = True
+    completed, failed, feedback = _run_batch(app, seed)
+    assert (completed, failed) == (0, 1)
+    assert feedback == original
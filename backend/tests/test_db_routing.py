@@ -0,0 +1,84 @@
+import os
+import shutil
+import tempfile
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import create_app
+from app.models.models import db, User, Course, Enrollment, Reflection, SubmissionDraft
+from app.utils.db_routing import STICKY_KEY
+from conftest import login
+
+
+@pytest.fixture(scope='module')
+def replicated():
+    """An app whose replica is a snapshot of the primary, so replica reads can't see later writes"""
+    tmp = tempfile.mkdtemp()
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setenv('DATABASE_URL', f'sqlite:///{tmp}/primary.db')
+        mp.setenv('DATABASE_REPLICA_URL', f'sqlite:///{tmp}/replica.db')
+        app = create_app()
+
+    with app.app_context():
+        teacher = User(email='teacher@replica.test', name='Teacher', google_id='rt', role='teacher')
+        student = User(email='student@replica.test', name='Student', google_id='rs', role='student')
+        db.session.add_all([teacher, student])
+        db.session.flush()
+        course = Course(name='Snapshot', course_code='S1', teacher_id=teacher.id)
+        db.session.add(course)
+        db.session.flush()
+        db.session.add(Enrollment(student_id=student.id, course_id=course.id))
+        reflection = Reflection(course_id=course.id, name='Week 1', number=1, start_date=datetime.utcnow(),
+                                due_date=datetime.utcnow() + timedelta(days=7))
+        db.session.add(reflection)
+        db.session.commit()
+        ids = {'teacher_id': teacher.id, 'student_id': student.id, 'course_id': course.id, 'reflection_id': reflection.id}
+        for engine in db.engines.values():
+            engine.dispose()
+    shutil.copy(f'{tmp}/primary.db', f'{tmp}/replica.db')
+
+    with app.app_context():
+        # Only on the primary from here on
+        db.session.add(Course(name='Primary only', course_code='P1', teacher_id=ids['teacher_id']))
+        db.session.add(SubmissionDraft(reflection_id=ids['reflection_id'], student_id=ids['student_id'],
+                                       label='', response='Typed on the primary', updated_at=datetime.utcnow()))
+        db.session.commit()
+    yield app, ids
+    shutil.rmtree(tmp, ignore_errors=True)
+
+
+def _course_names(client):
+    return sorted(course['name'] for course in client.get('/api/courses').get_json()['courses'])
+
+
+def test_reads_go_to_the_replica(replicated):
+    app, ids = replicated
+    client = app.test_client()
+    login(client, ids['teacher_id'], 'teacher')
+    assert _course_names(client) == ['Snapshot']
+
+
+def test_use_primary_views_read_the_primary(replicated):
+    app, ids = replicated
+    client = app.test_client()
+    login(client, ids['student_id'], 'student')
+    draft = client.get(f"/api/reflections/{ids['reflection_id']}/draft").get_json()['draft']
+    assert draft == {'': 'Typed on the primary'}
+
+
+def test_reads_stick_to_the_primary_after_a_write(replicated):
+    app, ids = replicated
+    client = app.test_client()
+    login(client, ids['teacher_id'], 'teacher')
+    assert client.post('/api/courses', json={'name': 'Written', 'course_code': 'W1'}).status_code == 201
+
+    assert _course_names(client) == ['Primary only', 'Snapshot', 'Written']
+    with client.session_transaction() as session:
+        assert session[STICKY_KEY] > 0
+        session[STICKY_KEY] = 0
+    assert _course_names(client) == ['Snapshot']
+    # Other clients never wrote, so they keep reading the replica
+    other = app.test_client()
+    login(other, ids['teacher_id'], 'teacher')
+    assert _course_names(other) == ['Snapshot']
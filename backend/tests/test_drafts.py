@@ -0,0 +1,77 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.models.models import db, SubmissionDraft
+from app.services import drafts
+from app.services.drafts import DraftBuffer, load_draft
+
+
+@pytest.fixture
+def buffer(app, monkeypatch):
+    """A buffer whose flusher never fires on its own, installed as the process buffer"""
+    draft_buffer = DraftBuffer(app, interval=3600, max_pending=1000)
+    monkeypatch.setattr(drafts, '_buffer', draft_buffer)
+    return draft_buffer
+
+
+def _rows(app, seed):
+    with app.app_context():
+        return {
+            row.label: (row.response, row.updated_at) for row in
+            SubmissionDraft.query.filter_by(reflection_id=seed['reflection_id'], student_id=seed['student_id'])
+        }
+
+
+def _store(app, seed, label, response, updated_at):
+    with app.app_context():
+        db.session.add(SubmissionDraft(reflection_id=seed['reflection_id'], student_id=seed['student_id'],
+                                       label=label, response=response, updated_at=updated_at))
+        db.session.commit()
+
+
+def test_saves_coalesce_per_label(app, seed, buffer):
+    key = (seed['reflection_id'], seed['student_id'])
+    for text in ('I', 'I le', 'I learned'):
+        buffer.add(*key, {'What?': text})
+    buffer.add(*key, {'Why?': 'Because'})
+
+    assert {label: response for label, (response, _) in buffer.pending_for(*key).items()} == {'What?': 'I learned', 'Why?': 'Because'}
+    assert buffer._count == 2
+
+    buffer.flush()
+    assert {label: response for label, (response, _) in _rows(app, seed).items()} == {'What?': 'I learned', 'Why?': 'Because'}
+    assert buffer.pending_for(*key) == {} and buffer._count == 0
+
+
+def test_flush_never_replaces_a_newer_row(app, seed, buffer):
+    key = (seed['reflection_id'], seed['student_id'])
+    buffer.add(*key, {'Newer in db': 'stale', 'Older in db': 'fresh'})
+    now = datetime.utcnow()
+    # Written meanwhile by another process's buffer
+    _store(app, seed, 'Newer in db', 'from elsewhere', now + timedelta(minutes=1))
+    _store(app, seed, 'Older in db', 'old', now - timedelta(minutes=1))
+
+    buffer.flush()
+    rows = _rows(app, seed)
+    assert rows['Newer in db'][0] == 'from elsewhere'
+    assert rows['Older in db'][0] == 'fresh'
+
+
+def test_load_draft_merges_buffer_and_rows_after_since(app, seed, buffer):
+    key = (seed['reflection_id'], seed['student_id'])
+    now = datetime.utcnow()
+    since = now - timedelta(minutes=10)
+    _store(app, seed, 'Before submit', 'already submitted', now - timedelta(minutes=20))
+    _store(app, seed, 'Stored', 'in db', now - timedelta(minutes=5))
+    _store(app, seed, 'Db wins', 'newest', now + timedelta(minutes=5))
+    _store(app, seed, 'Buffer wins', 'old row', now - timedelta(minutes=5))
+    buffer.add(*key, {'Db wins': 'older change', 'Buffer wins': 'unflushed', 'Typed': 'new', 'Stored': None})
+
+    with app.app_context():
+        draft, updated_at = load_draft(*key, since=since)
+        everything, _ = load_draft(*key)
+
+    assert draft == {'Db wins': 'newest', 'Buffer wins': 'unflushed', 'Typed': 'new'}
+    assert updated_at == now + timedelta(minutes=5)
+    assert everything['Before submit'] == 'already submitted'
@@ -0,0 +1,32 @@
+from conftest import login
+
+
+def test_bulk_enroll_reports_malformed_rows_and_counts_new_users(app, seed):
+    client = app.test_client()
+    login(client, seed['teacher_id'], 'teacher')
+    new_email = f"new{seed['course_id']}@example.com"
+    response = client.post(f"/api/students/course/{seed['course_id']}/bulk", json={'students': [
+        'not an object',
+        {'name': 'Numbers', 'email': 42},
+        {'name': 'New Student', 'email': new_email},
+        {'name': 'Again', 'email': new_email},
+        {'email': 'not-an-email'},
+    ]})
+    assert response.status_code == 201
+    body = response.get_json()
+    assert [result['status'] for result in body['results']] == ['invalid', 'invalid', 'enrolled', 'duplicate', 'invalid']
+    assert body['summary']['created_users'] == 1
+    assert body['results'][2]['user_created'] is True
+
+    # Already exists now, so nothing is created the second time
+    again = client.post(f"/api/students/course/{seed['course_id']}/bulk", json={'students': [{'email': new_email}]}).get_json()
+    assert again['results'][0]['status'] == 'already_enrolled'
+    assert again['summary']['created_users'] == 0
+
+
+def test_bulk_enroll_needs_a_list(app, seed):
+    client = app.test_client()
+    login(client, seed['teacher_id'], 'teacher')
+    url = f"/api/students/course/{seed['course_id']}/bulk"
+    assert client.post(url, json={'students': {'email': 'a@example.com'}}).status_code == 400
+    assert client.post(url, json=['a@example.com']).status_code == 400
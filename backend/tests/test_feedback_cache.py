@@ -0,0 +1,21 @@
+from app.models.models import db, ReflectionSubmission, FeedbackCacheEntry
+from app.services.feedback_cache import make_cache_key
+from app.services.ai_feedback import GEMINI_MODEL
+from conftest import login
+
+
+def test_sync_submit_fills_database_cache(app, seed, gemini, monkeypatch, capsys):
+    monkeypatch.setitem(app.config, 'FEEDBACK_ASYNC', False)
+    content = 'Cached while the submit transaction is open'
+    client = app.test_client()
+    login(client, seed['student_id'], 'student')
+
+    response = client.post('/api/reflections/submit', json={'reflection_id': seed['reflection_id'], 'content': content})
+    assert response.status_code == 200
+    assert 'cache store failed' not in capsys.readouterr().out
+
+    with app.app_context():
+        entry = db.session.get(FeedbackCacheEntry, make_cache_key(content, None, GEMINI_MODEL))
+        submission = ReflectionSubmission.query.filter_by(student_id=seed['student_id']).one()
+        assert entry is not None
+        assert entry.feedback == submission.ai_feedback
@@ -0,0 +1,62 @@
+from app.models.models import db, ReflectionSubmission, FeedbackJob
+from app.services.feedback_jobs import enqueue_feedback_job, claim_job, run_feedback_job, FALLBACK_FEEDBACK
+from conftest import login
+
+
+def _submit(app, seed, content):
+    client = app.test_client()
+    login(client, seed['student_id'], 'student')
+    response = client.post('/api/reflections/submit', json={'reflection_id': seed['reflection_id'], 'content': content})
+    assert response.status_code == 202
+    return response.get_json()['feedback_job']['id']
+
+
+def _run(app, job_id, max_attempts=3):
+    with app.app_context():
+        assert claim_job(job_id)
+        run_feedback_job(job_id, max_attempts=max_attempts)
+        job = db.session.get(FeedbackJob, job_id)
+        submission = db.session.get(ReflectionSubmission, job.submission_id)
+        return job.status, job.attempts, job.error, submission.ai_feedback
+
+
+def _make_runnable(app, job_id):
+    with app.app_context():
+        job = db.session.get(FeedbackJob, job_id)
+        job.run_after = job.created_at
+        db.session.commit()
+
+
+def test_job_stores_generated_feedback(app, seed, gemini):
+    job_id = _submit(app, seed, 'I learned how enzymes work (job success)')
+    status, attempts, error, feedback = _run(app, job_id)
+    assert status == 'done'
+    assert feedback.startswith('Nice work')
+
+
+def test_failed_generation_is_retried_then_falls_back(app, seed, gemini):
+    gemini.fail = True
+    job_id = _submit(app, seed, 'I learned how enzymes work (job failure)')
+
+    status, attempts, error, feedback = _run(app, job_id, max_attempts=2)
+    assert (status, attempts) == ('pending', 1)
+    assert 'Gemini is down' in error
+    assert feedback is None
+
+    _make_runnable(app, job_id)
+    status, attempts, error, feedback = _run(app, job_id, max_attempts=2)
+    assert (status, attempts) == ('failed', 2)
+    assert feedback == FALLBACK_FEEDBACK
+    assert gemini.calls == 2
+
+
+def test_retry_after_failure_succeeds(app, seed, gemini):
+    gemini.fail = True
+    job_id = _submit(app, seed, 'I learned how enzymes work (job recovery)')
+    assert _run(app, job_id)[0] == 'pending'
+
+    gemini.fail = False
+    _make_runnable(app, job_id)
+    status, attempts, error, feedback = _run(app, job_id)
+    assert (status, attempts, error) == ('done', 2, None)
+    assert feedback.startswith('Nice work')
@@ -0,0 +1,68 @@
+import json
+
+import pytest
+
+from app.models.models import db, ReflectionSubmission, FeedbackJob
+from conftest import login
+
+
+@pytest.fixture
+def streaming(app, monkeypatch):
+    monkeypatch.setitem(app.config, 'FEEDBACK_STREAMING', True)
+    monkeypatch.setitem(app.config, 'FEEDBACK_STREAM_WAIT', 1)
+
+
+def _events(body):
+    events = []
+    for block in body.strip().split('\n\n'):
+        lines = dict(line.split(': ', 1) for line in block.split('\n'))
+        events.append((lines['event'], json.loads(lines['data'])))
+    return events
+
+
+def _submit(app, seed, content, display_feedback=False):
+    client = app.test_client()
+    login(client, seed['student_id'], 'student')
+    data = client.post(
+        '/api/reflections/submit',
+        json={'reflection_id': seed['reflection_id'], 'content': content, 'stream': True}
+    ).get_json()
+    if display_feedback:
+        with app.app_context():
+            submission = db.session.get(ReflectionSubmission, data['submission_id'])
+            submission.display_feedback = True
+            db.session.commit()
+    return client, data
+
+
+def test_hidden_feedback_is_not_streamed(app, seed, gemini, streaming):
+    client, data = _submit(app, seed, 'Stream me (hidden)')
+    events = _events(client.get(data['stream_url']).get_data(as_text=True))
+
+    assert [name for name, _ in events] == ['status', 'done']
+    assert events[-1][1]['feedback'] is None
+    with app.app_context():
+        # Still generated and stored, for the teacher to release
+        assert db.session.get(ReflectionSubmission, data['submission_id']).ai_feedback.startswith('Nice work')
+
+
+def test_enabled_feedback_is_streamed(app, seed, gemini, streaming):
+    client, data = _submit(app, seed, 'Stream me (visible)', display_feedback=True)
+    events = _events(client.get(data['stream_url']).get_data(as_text=True))
+
+    assert [name for name, _ in events] == ['chunk', 'done']
+    assert events[-1][1]['feedback'] == events[0][1]['text']
+
+
+def test_wait_for_worker_job_is_capped(app, seed, gemini, streaming):
+    client, data = _submit(app, seed, 'Stream me (worker)')
+    job_id = data['feedback_job']['id']
+    with app.app_context():
+        job = db.session.get(FeedbackJob, job_id)
+        job.status = 'running'
+        db.session.commit()
+
+    events = _events(client.get(data['stream_url']).get_data(as_text=True))
+    name, payload = events[-1]
+    assert name == 'error'
+    assert payload['poll_url'] == f"/api/reflections/feedback-jobs/{job_id}"
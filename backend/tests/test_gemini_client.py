@@ -0,0 +1,45 @@
+import pytest
+from google.api_core import exceptions as api_exceptions
+
+from app.services.gemini_client import GeminiClient, GeminiUnavailable
+
+
+class RaisingModel:
+    def __init__(self):
+        self.error = None
+
+    def generate_content(self, prompt, **kwargs):
+        raise self.error
+
+
+def test_non_retryable_errors_leave_the_breaker_failure_count_alone():
+    client = GeminiClient('test-model', max_retries=0, breaker_threshold=2, breaker_reset=60)
+    client._model = RaisingModel()
+
+    for error in (api_exceptions.ServiceUnavailable('down'), api_exceptions.InvalidArgument('bad prompt')):
+        client._model.error = error
+        with pytest.raises(type(error)):
+            client.generate('prompt')
+    assert client.breaker.state == 'closed' and client.breaker.failures == 1
+
+    client._model.error = api_exceptions.ServiceUnavailable('down')
+    with pytest.raises(api_exceptions.ServiceUnavailable):
+        client.generate('prompt')
+    assert client.breaker.state == 'open'
+    with pytest.raises(GeminiUnavailable):
+        client.generate('prompt')
+
+
+def test_non_retryable_error_frees_the_half_open_trial():
+    client = GeminiClient('test-model', max_retries=0, breaker_threshold=1, breaker_reset=0)
+    client._model = RaisingModel()
+    client._model.error = api_exceptions.ServiceUnavailable('down')
+    with pytest.raises(api_exceptions.ServiceUnavailable):
+        client.generate('prompt')
+
+    client._model.error = api_exceptions.InvalidArgument('bad prompt')
+    with pytest.raises(api_exceptions.InvalidArgument):
+        client.generate('prompt')
+    # Still half-open, and the next call gets to be the trial
+    assert client.breaker.state == 'half_open'
+    assert client.breaker.allow()
@@ -0,0 +1,41 @@
+import io
+import os
+
+from PIL import Image
+
+from app.services.image_store import save_image, image_path
+
+
+def _png(size):
+    output = io.BytesIO()
+    Image.new('RGB', (size, size), (200, 30, 30)).save(output, format='PNG')
+    return output.getvalue()
+
+
+def _served_size(client, url):
+    response = client.get(url)
+    assert response.status_code == 200
+    with Image.open(io.BytesIO(response.data)) as image:
+        return image.size
+
+
+def test_thumbnail_is_served_for_size_thumb(app):
+    with app.test_request_context():
+        url = save_image('image/png', _png(600))
+    client = app.test_client()
+
+    assert _served_size(client, url) == (600, 600)
+    thumb_size = app.config['THUMBNAIL_SIZE']
+    assert _served_size(client, f'{url}?size=thumb') == (thumb_size, thumb_size)
+
+
+def test_missing_thumbnail_is_generated_on_request(app):
+    with app.test_request_context():
+        url = save_image('image/png', _png(500))
+        digest = url.rsplit('/', 1)[1].split('.')[0]
+        thumb_path = image_path(digest, 'png', thumbnail=True)
+    os.remove(thumb_path)
+
+    thumb_size = app.config['THUMBNAIL_SIZE']
+    assert _served_size(app.test_client(), f'{url}?size=thumb') == (thumb_size, thumb_size)
+    assert os.path.exists(thumb_path)
@@ -0,0 +1,113 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+from app.models.models import db, Reflection, SubmissionDraft
+from conftest import login
+
+# Five weekly occurrences: 7, 14, 21, 28 January and 4 February 2030
+SCHEDULE = {'start_date': '2030-01-07', 'end_date': '2030-02-04', 'recurrence_days': 7, 'reflection_due_days': 3}
+
+
+def _clients(app, seed):
+    teacher, student = app.test_client(), app.test_client()
+    login(teacher, seed['teacher_id'], 'teacher')
+    login(student, seed['student_id'], 'student')
+    return teacher, student
+
+
+def _configure(teacher, seed, **settings):
+    response = teacher.put(f"/api/courses/{seed['course_id']}/configure", json=dict(SCHEDULE, **settings))
+    assert response.status_code == 200
+
+
+def _stored_dates(app, seed):
+    with app.app_context():
+        return sorted(
+            start_date.date().isoformat() for (start_date,) in
+            db.session.query(Reflection.start_date).filter(Reflection.course_id == seed['course_id'])
+            if start_date
+        )
+
+
+def test_lazy_course_lists_virtual_occurrences_across_pages(app, seed):
+    teacher, student = _clients(app, seed)
+    _configure(teacher, seed, lazy_reflections=True)
+    # The seeded reflection is unused, so switching to lazy mode prunes it
+    assert _stored_dates(app, seed) == []
+
+    url = f"/api/reflections/course/{seed['course_id']}"
+    seen, cursor = [], None
+    while True:
+        page = student.get(url, query_string={'limit': 2, **({'cursor': cursor} if cursor else {})}).get_json()
+        assert len(page['reflections']) <= 2
+        seen.extend(page['reflections'])
+        cursor = page['next_cursor']
+        if not cursor:
+            break
+
+    assert [item['occurrence_date'] for item in seen] == ['2030-01-07', '2030-01-14', '2030-01-21', '2030-01-28', '2030-02-04']
+    assert all(item['virtual'] and item['id'] is None for item in seen)
+
+
+def test_opening_an_occurrence_materializes_it_once(app, seed):
+    teacher, student = _clients(app, seed)
+    _configure(teacher, seed, lazy_reflections=True)
+    url = f"/api/reflections/course/{seed['course_id']}/occurrences/2030-01-14"
+
+    first = student.post(url)
+    second = student.post(url)
+    assert first.status_code == second.status_code == 200
+    assert first.get_json()['reflection_id'] == second.get_json()['reflection_id']
+    assert _stored_dates(app, seed) == ['2030-01-14']
+
+    listed = student.get(f"/api/reflections/course/{seed['course_id']}").get_json()['reflections']
+    opened = [item for item in listed if item['id'] == first.get_json()['reflection_id']]
+    assert len(listed) == 5 and len(opened) == 1 and not opened[0].get('virtual')
+
+
+def test_unscheduled_dates_are_rejected(app, seed):
+    teacher, student = _clients(app, seed)
+    _configure(teacher, seed, lazy_reflections=True)
+
+    response = student.post(f"/api/reflections/course/{seed['course_id']}/occurrences/2030-01-08")
+    assert response.status_code == 404
+    _configure(teacher, seed, lazy_reflections=True, recurrence_days=14)
+    response = student.post(f"/api/reflections/course/{seed['course_id']}/occurrences/2030-01-14")
+    assert response.status_code == 404
+    assert _stored_dates(app, seed) == []
+
+
+def test_occurrences_of_non_lazy_courses_cannot_be_opened(app, seed):
+    teacher, student = _clients(app, seed)
+    _configure(teacher, seed)
+    # The teacher then removes one of the generated dates
+    _configure(teacher, seed, selected_reflection_dates=['2030-01-07', '2030-01-14', '2030-01-21', '2030-02-04'])
+    assert '2030-01-28' not in _stored_dates(app, seed)
+
+    response = student.post(f"/api/reflections/course/{seed['course_id']}/occurrences/2030-01-28")
+    assert response.status_code == 409
+    assert '2030-01-28' not in _stored_dates(app, seed)
+
+
+def test_one_reflection_per_course_and_day(app, seed):
+    with app.app_context():
+        existing = db.session.get(Reflection, seed['reflection_id'])
+        db.session.add(Reflection(course_id=existing.course_id, name='Copy', start_date=existing.start_date))
+        with pytest.raises(IntegrityError):
+            db.session.commit()
+        db.session.rollback()
+
+
+def test_switching_to_lazy_keeps_reflections_with_drafts(app, seed):
+    teacher, _ = _clients(app, seed)
+    _configure(teacher, seed)
+    with app.app_context():
+        drafted = Reflection.query.filter_by(course_id=seed['course_id']).order_by(Reflection.start_date).first()
+        db.session.add(SubmissionDraft(reflection_id=drafted.id, student_id=seed['student_id'], label='', response='Half done', updated_at=datetime.utcnow()))
+        db.session.commit()
+        drafted_date = drafted.start_date.date().isoformat()
+
+    _configure(teacher, seed, lazy_reflections=True)
+    assert _stored_dates(app, seed) == [drafted_date]
@@ -0,0 +1,86 @@
+from datetime import datetime
+
+from app.models.models import db, User, Course, Enrollment, Reflection
+from conftest import login
+
+
+def _walk(client, url, key, **params):
+    """Every page of a list endpoint, following next_cursor"""
+    pages, cursor = [], None
+    while True:
+        response = client.get(url, query_string=dict(params, **({'cursor': cursor} if cursor else {})))
+        assert response.status_code == 200
+        body = response.get_json()
+        pages.append(body[key])
+        cursor = body['next_cursor']
+        if not cursor:
+            return pages
+
+
+def _teacher(app, seed):
+    client = app.test_client()
+    login(client, seed['teacher_id'], 'teacher')
+    return client
+
+
+def test_course_list_search_cursor_and_fields(app, seed):
+    with app.app_context():
+        for name in ('Biology', 'Biochemistry', 'Chemistry'):
+            db.session.add(Course(name=name, course_code=f"{name[:3].upper()}{seed['course_id']}", teacher_id=seed['teacher_id']))
+        db.session.commit()
+    client = _teacher(app, seed)
+
+    pages = _walk(client, '/api/courses', 'courses', limit=2)
+    assert [len(page) for page in pages] == [2, 2]
+    ids = [course['id'] for page in pages for course in page]
+    assert ids == sorted(ids) and len(set(ids)) == 4
+
+    found = client.get('/api/courses', query_string={'search': 'BIO', 'fields': 'name,course_code'}).get_json()['courses']
+    assert sorted(course['name'] for course in found) == ['Biochemistry', 'Biology']
+    assert all(set(course) == {'name', 'course_code'} for course in found)
+
+    assert client.get('/api/courses', query_string={'fields': 'name,secret'}).status_code == 400
+    assert client.get('/api/courses', query_string={'cursor': 'not-a-cursor'}).status_code == 400
+
+
+def test_reflection_list_pages_by_start_date_with_undated_last(app, seed):
+    with app.app_context():
+        for name, start in (('Later', datetime(2031, 1, 8)), ('Earlier', datetime(2020, 1, 8)), ('Loose A', None), ('Loose B', None)):
+            db.session.add(Reflection(course_id=seed['course_id'], name=name, start_date=start))
+        db.session.commit()
+    client = _teacher(app, seed)
+    url = f"/api/reflections/course/{seed['course_id']}"
+
+    pages = _walk(client, url, 'reflections', limit=2, fields='id,name,start_date')
+    names = [item['name'] for page in pages for item in page]
+    assert names == ['Earlier', 'Week 1', 'Later', 'Loose A', 'Loose B']
+    assert [len(page) for page in pages] == [2, 2, 1]
+    assert all(set(item) == {'id', 'name', 'start_date'} for page in pages for item in page)
+
+    found = client.get(url, query_string={'search': 'loose', 'limit': 1}).get_json()
+    assert [item['name'] for item in found['reflections']] == ['Loose A']
+    rest = client.get(url, query_string={'search': 'loose', 'limit': 1, 'cursor': found['next_cursor']}).get_json()
+    assert [item['name'] for item in rest['reflections']] == ['Loose B'] and rest['next_cursor'] is None
+
+
+def test_student_list_search_cursor_and_fields(app, seed):
+    with app.app_context():
+        for name in ('Ada Lovelace', 'Alan Turing', 'Grace Hopper'):
+            slug = f"{name.split()[0].lower()}{seed['course_id']}"
+            student = User(email=f'{slug}@example.com', name=name, google_id=f'g_{slug}', role='student')
+            db.session.add(student)
+            db.session.flush()
+            db.session.add(Enrollment(student_id=student.id, course_id=seed['course_id']))
+        db.session.commit()
+    client = _teacher(app, seed)
+    url = f"/api/students/course/{seed['course_id']}"
+
+    pages = _walk(client, url, 'students', limit=3, fields='name')
+    names = [student['name'] for page in pages for student in page]
+    assert names == sorted(names) and len(names) == 4
+    assert all(set(student) == {'name'} for page in pages for student in page)
+
+    found = client.get(url, query_string={'search': 'ACE', 'fields': 'name,email', 'limit': 1}).get_json()
+    assert found['students'] == [{'name': 'Ada Lovelace', 'email': f"ada{seed['course_id']}@example.com"}]
+    rest = _walk(client, url, 'students', search='ace', fields='name', limit=1, cursor=found['next_cursor'])
+    assert [student['name'] for page in rest for student in page] == ['Grace Hopper']
@@ -0,0 +1,23 @@
+import json
+
+import pytest
+
+from app.services.prompt_builder import parse_sections
+
+
+def test_structured_content_splits_into_sections():
+    content = json.dumps([{'label': 'What happened?', 'response': 'A lot'}, {'label': 'Why?', 'response': ''}])
+    assert parse_sections(content) == [('What happened?', 'A lot'), ('Why?', '')]
+
+
+@pytest.mark.parametrize('content', [
+    'Just some text',
+    json.dumps('A JSON string'),
+    json.dumps([]),
+    json.dumps([{'label': 'No response'}]),
+    json.dumps([{'label': 'Fine', 'response': 'Yes'}, 'stray item']),
+    json.dumps([{'label': 3, 'response': 'Numeric label'}]),
+    json.dumps([{'label': 'List answer', 'response': ['a', 'b']}]),
+])
+def test_anything_else_is_plain_text(content):
+    assert parse_sections(content) == [(None, content)]
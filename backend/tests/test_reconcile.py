@@ -0,0 +1,51 @@
+from datetime import datetime
+
+from app.models.models import db, Course, Reflection, ReflectionSubmission, SubmissionDraft
+from app.services.schedule import reconcile_reflections
+
+
+def _day(day):
+    return datetime(2030, 3, day)
+
+
+def _reflections(course_id):
+    return {r.start_date: r for r in Reflection.query.filter_by(course_id=course_id)}
+
+
+def test_reconcile_writes_only_what_changed(app, seed):
+    with app.app_context():
+        course = db.session.get(Course, seed['course_id'])
+        course.reflection_due_days = 3
+        first = reconcile_reflections(course, [_day(1), _day(8), _day(15), _day(22), _day(29)])
+        # The seeded reflection isn't on the schedule and nobody used it
+        assert first == {'created': 5, 'updated': 0, 'deleted': 1, 'kept_in_use': 0}
+
+        before = _reflections(course.id)
+        before[_day(8)].name = 'Renamed'
+        db.session.add(ReflectionSubmission(reflection_id=before[_day(15)].id, student_id=seed['student_id'], content='"Done"'))
+        db.session.add(SubmissionDraft(reflection_id=before[_day(22)].id, student_id=seed['student_id'], label='', response='Half', updated_at=datetime.utcnow()))
+        db.session.commit()
+        ids = {start: reflection.id for start, reflection in before.items()}
+
+        course = db.session.get(Course, seed['course_id'])
+        second = reconcile_reflections(course, [_day(1), _day(8), _day(12)])
+        assert second == {'created': 1, 'updated': 1, 'deleted': 1, 'kept_in_use': 2}
+
+        after = _reflections(course.id)
+        assert sorted(after) == [_day(1), _day(8), _day(12), _day(15), _day(22)]
+        # Matched rows keep their ids; the renamed row gets its generated name back
+        assert after[_day(1)].id == ids[_day(1)] and after[_day(8)].id == ids[_day(8)]
+        assert after[_day(8)].name == 'Reflection 08/03'
+        assert [after[start].number for start in (_day(1), _day(8), _day(12))] == [1, 2, 3]
+        assert after[_day(12)].due_date == datetime(2030, 3, 15)
+        # Rows with a submission or a draft survive leaving the schedule
+        assert after[_day(15)].id == ids[_day(15)] and after[_day(22)].id == ids[_day(22)]
+
+
+def test_reconcile_without_changes_writes_nothing(app, seed):
+    with app.app_context():
+        course = db.session.get(Course, seed['course_id'])
+        targets = [_day(2), _day(9)]
+        reconcile_reflections(course, targets)
+        course = db.session.get(Course, seed['course_id'])
+        assert reconcile_reflections(course, targets) == {'created': 0, 'updated': 0, 'deleted': 0, 'kept_in_use': 0}
@@ -0,0 +1,41 @@
+from app.models.models import db, ReflectionSubmission, ReflectionStats
+from conftest import login
+
+
+def _student(app, seed):
+    client = app.test_client()
+    login(client, seed['student_id'], 'student')
+    return client
+
+
+def test_opening_a_reflection_does_not_create_a_submission(app, seed):
+    client = _student(app, seed)
+    response = client.get(f"/api/reflections/{seed['reflection_id']}")
+    assert response.status_code == 200
+    assert response.get_json()['submission'] is None
+    with app.app_context():
+        assert ReflectionSubmission.query.filter_by(reflection_id=seed['reflection_id']).count() == 0
+
+
+def test_resubmitting_updates_the_same_row(app, seed, gemini):
+    client = _student(app, seed)
+    for content in ('First draft (upsert)', 'Second draft (upsert)'):
+        response = client.post('/api/reflections/submit', json={'reflection_id': seed['reflection_id'], 'content': content})
+        assert response.status_code == 202
+    with app.app_context():
+        rows = ReflectionSubmission.query.filter_by(reflection_id=seed['reflection_id']).all()
+        assert [row.content for row in rows] == ['Second draft (upsert)']
+        assert db.session.get(ReflectionStats, seed['reflection_id']).submitted_count == 1
+
+
+def test_submit_invalidates_course_reflections_etag(app, seed, gemini):
+    client = _student(app, seed)
+    url = f"/api/reflections/course/{seed['course_id']}"
+    etag = client.get(url).headers['ETag']
+    assert client.get(url, headers={'If-None-Match': etag}).status_code == 304
+
+    client.post('/api/reflections/submit', json={'reflection_id': seed['reflection_id'], 'content': 'Submitted (etag)'})
+
+    response = client.get(url, headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
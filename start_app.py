@@ -2,89 +2,187 @@
 """
 RJMS Application Launcher
 Starts Flask backend and Vue.js frontend
+
+    python start_app.py               # Flask dev server + Vite dev server
+    python start_app.py --production  # Gunicorn (multi-worker, preloaded) serving the built frontend
+
+In production mode, SIGHUP is forwarded to gunicorn, which re-reads its
+config and replaces workers gracefully without dropping requests.
 """
 
+import argparse
+import os
+import selectors
+import signal
 import subprocess
 import sys
 import time
-import signal
-import os
+import urllib.error
+import urllib.request
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+BACKEND_PORT = os.environ.get('PORT', '5001')
+HEALTH_URL = f'http://127.0.0.1:{BACKEND_PORT}/api/health'
+READY_TIMEOUT = float(os.environ.get('READY_TIMEOUT', 60))
 
 # Process references
 backend_process = None
 frontend_process = None
 
+
+def stop_processes():
+    for process in (frontend_process, backend_process):
+        if process and process.poll() is None:
+            process.terminate()
+    for process in (frontend_process, backend_process):
+        if process:
+            try:
+                process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+
 def signal_handler(sig, frame):
     """Handle shutdown signals gracefully"""
     print('\n\nShutting down services...')
-    if backend_process:
-        backend_process.terminate()
-    if frontend_process:
-        frontend_process.terminate()
+    stop_processes()
     sys.exit(0)
 
+
+def reload_handler(sig, frame):
+    """Ask gunicorn to reload its config and roll its workers"""
+    if backend_process and backend_process.poll() is None:
+        print('↻ Reloading backend workers...')
+        backend_process.send_signal(signal.SIGHUP)
+
+
 # Register signal handlers
 signal.signal(signal.SIGINT, signal_handler)
 signal.signal(signal.SIGTERM, signal_handler)
 
+
+class OutputMux:
+    """Relay child output line by line, prefixed per process, without blocking on any one of them"""
+
+    def __init__(self):
+        self.selector = selectors.DefaultSelector()
+        self.buffers = {}
+
+    def add(self, label, process):
+        os.set_blocking(process.stdout.fileno(), False)
+        self.selector.register(process.stdout, selectors.EVENT_READ, label)
+        self.buffers[label] = b''
+
+    def pump(self, timeout):
+        """Print whatever output is ready, waiting at most `timeout` seconds for some"""
+        if not self.selector.get_map():
+            time.sleep(timeout)
+            return
+        for key, _ in self.selector.select(timeout):
+            label = key.data
+            try:
+                chunk = os.read(key.fd, 65536)
+            except BlockingIOError:
+                continue
+            if not chunk:
+                # EOF: flush any partial line and stop watching this pipe
+                self.selector.unregister(key.fileobj)
+                chunk = b'\n' if self.buffers[label] else b''
+            *lines, self.buffers[label] = (self.buffers[label] + chunk).split(b'\n')
+            for line in lines:
+                print(f'[{label}] {line.decode("utf-8", "replace").rstrip()}', flush=True)
+
+
+def wait_until_ready(process, mux, timeout=READY_TIMEOUT):
+    """Poll the health check until it passes, relaying output meanwhile. Returns False if it never does."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            return False
+        try:
+            with urllib.request.urlopen(HEALTH_URL, timeout=2) as response:
+                if response.status == 200:
+                    return True
+        except (urllib.error.URLError, OSError):
+            pass
+        mux.pump(0.25)
+    return False
+
+
+def spawn(command, cwd, env=None):
+    return subprocess.Popen(
+        command,
+        cwd=cwd,
+        env=env,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT
+    )
+
+
 def main():
     global backend_process, frontend_process
-    
+
+    parser = argparse.ArgumentParser(description='Start RJMS')
+    parser.add_argument('--production', action='store_true',
+                        help='serve with gunicorn instead of the Flask and Vite dev servers')
+    production = parser.parse_args().production
+
     print('=' * 50)
-    print('Starting RJMS Application')
+    print('Starting RJMS Application' + (' (production)' if production else ''))
     print('=' * 50)
     print()
-    
+
+    mux = OutputMux()
+
     # Start Flask backend
-    print('▶ Starting Flask backend (port 5001)...')
     backend_env = os.environ.copy()
-    backend_env['PORT'] = '5001'
-    backend_process = subprocess.Popen(
-        ['python', 'run.py'],
-        cwd=os.path.join(os.path.dirname(__file__), 'backend'),
-        env=backend_env,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.STDOUT,
-        universal_newlines=True,
-        bufsize=1
-    )
-    
-    # Wait for backend to start
-    time.sleep(3)
-    
-    if backend_process.poll() is not None:
+    backend_env['PORT'] = BACKEND_PORT
+    backend_env['PYTHONUNBUFFERED'] = '1'
+    if production:
+        print(f'▶ Starting gunicorn (port {BACKEND_PORT})...')
+        command = [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'run:app']
+        signal.signal(signal.SIGHUP, reload_handler)
+    else:
+        print(f'▶ Starting Flask backend (port {BACKEND_PORT})...')
+        command = [sys.executable, 'run.py']
+    backend_process = spawn(command, os.path.join(ROOT, 'backend'), backend_env)
+    mux.add('Backend', backend_process)
+
+    # Wait for the backend (and its database) to answer the health check
+    if not wait_until_ready(backend_process, mux):
+        mux.pump(0)
         print('✗ Backend failed to start')
+        stop_processes()
         sys.exit(1)
-    
+
     print('✓ Backend started')
     print()
-    
-    # Start Vue.js frontend
-    print('▶ Starting Vue.js frontend (port 5000)...')
-    frontend_process = subprocess.Popen(
-        ['npm', '--prefix', 'frontend', 'run', 'dev'],
-        cwd=os.path.dirname(__file__),
-        stdout=subprocess.PIPE,
-        stderr=subprocess.STDOUT,
-        universal_newlines=True,
-        bufsize=1
-    )
-    
-    print('✓ Frontend starting...')
+
+    if production:
+        # Flask serves the built frontend from backend/static
+        frontend_url = f'http://localhost:{BACKEND_PORT}'
+    else:
+        # Start Vue.js frontend
+        print('▶ Starting Vue.js frontend (port 8080)...')
+        frontend_process = spawn(['npm', '--prefix', 'frontend', 'run', 'dev'], ROOT)
+        mux.add('Frontend', frontend_process)
+        print('✓ Frontend starting...')
+        frontend_url = 'http://localhost:8080'
+
     print()
     print('=' * 50)
     print('✓ RJMS is running!')
     print('=' * 50)
     print()
-    print('Backend API:  http://localhost:5001')
-    print('Frontend UI:  http://localhost:5000')
-    print()
-    print('Open the Webview tab to access the application')
+    print(f'Backend API:  http://localhost:{BACKEND_PORT}')
+    print(f'Frontend UI:  {frontend_url}')
     print()
+    if production:
+        print(f'Send SIGHUP to {os.getpid()} to reload workers gracefully')
     print('Press Ctrl+C to stop')
     print('=' * 50)
     print()
-    
+
     # Stream output from both processes
     try:
         while True:
@@ -92,36 +190,20 @@ def main():
             if backend_process.poll() is not None:
                 print('Backend process exited unexpectedly')
                 break
-            
-            if frontend_process.poll() is not None:
+
+            if frontend_process and frontend_process.poll() is not None:
                 print('Frontend process exited unexpectedly')
                 break
-            
-            # Read and print backend output
-            if backend_process.stdout:
-                line = backend_process.stdout.readline()
-                if line:
-                    print(f'[Backend] {line.strip()}')
-            
-            # Read and print frontend output
-            if frontend_process.stdout:
-                line = frontend_process.stdout.readline()
-                if line:
-                    print(f'[Frontend] {line.strip()}')
-            
-            time.sleep(0.1)
-    
+
+            mux.pump(0.5)
+
     except KeyboardInterrupt:
         signal_handler(None, None)
-    
+
     # Clean up
-    if backend_process:
-        backend_process.terminate()
-        backend_process.wait()
-    
-    if frontend_process:
-        frontend_process.terminate()
-        frontend_process.wait()
+    mux.pump(0)
+    stop_processes()
+
 
 if __name__ == '__main__':
     main()